@@ -5,14 +5,15 @@ Actualizado para usar SQLAlchemy con Neon PostgreSQL.
 from fastapi import APIRouter, HTTPException, Depends, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
 
 from app.models.schemas import AIConfigCreate, AIConfigUpdate, AIConfigResponse, AIProviderResponse
 from app.services.encryption import encryption_service
 from app.db.database import get_db
-from app.db.models import AIConfig, AIProviderCatalog, Profile
+from app.db.models import AIConfig, AIProviderCatalog
 from app.core.logger import logger
-from app.api.routes.auth import verify_firebase_token
+from app.api.routes.auth import get_optional_profile, get_profile
+from app.services.profiles import ProfileSnapshot, invalidate_profile
 
 router = APIRouter(prefix="/ai-configs", tags=["AI Configurations"])
 
@@ -77,55 +78,32 @@ async def get_provider(provider_name: str, db: AsyncSession = Depends(get_db)):
 # Configs
 @router.get("/", response_model=List[AIConfigResponse])
 async def list_configs(
-    firebase_user: dict = Depends(verify_firebase_token),
-    db: AsyncSession = Depends(get_db)
+    profile: Optional[ProfileSnapshot] = Depends(get_optional_profile)
 ):
     """Lista configuraciones del usuario."""
-    # Obtener profile del usuario
-    result = await db.execute(
-        select(Profile).where(Profile.firebase_uid == firebase_user["uid"])
-    )
-    profile = result.scalar_one_or_none()
-
     if not profile:
         return []
 
-    # Obtener configs
-    result = await db.execute(
-        select(AIConfig).where(AIConfig.profile_id == profile.id)
-    )
-    configs = result.scalars().all()
-
     return [
         {
             "id": str(c.id),
             "provider_name": c.provider_name,
             "selected_model": c.selected_model,
-            "custom_params": c.custom_params or {},
+            "custom_params": c.custom_params,
             "is_active": c.is_active,
             "has_api_key": bool(c.encrypted_key)
         }
-        for c in configs
+        for c in profile.configs
     ]
 
 
 @router.post("/", response_model=AIConfigResponse, status_code=status.HTTP_201_CREATED)
 async def create_config(
     config: AIConfigCreate,
-    firebase_user: dict = Depends(verify_firebase_token),
+    profile: ProfileSnapshot = Depends(get_profile),
     db: AsyncSession = Depends(get_db)
 ):
     """Crea configuración de IA."""
-    # Obtener profile
-    result = await db.execute(
-        select(Profile).where(Profile.firebase_uid == firebase_user["uid"])
-    )
-    profile = result.scalar_one_or_none()
-
-    if not profile:
-        raise HTTPException(
-            status_code=404, detail="Profile not found. Please sync first.")
-
     # Verificar si ya existe
     result = await db.execute(
         select(AIConfig).where(
@@ -152,6 +130,7 @@ async def create_config(
     db.add(new_config)
     await db.commit()
     await db.refresh(new_config)
+    invalidate_profile(profile.firebase_uid)
 
     return {
         "id": str(new_config.id),
@@ -167,19 +146,10 @@ async def create_config(
 async def update_config(
     provider_name: str,
     updates: AIConfigUpdate,
-    firebase_user: dict = Depends(verify_firebase_token),
+    profile: ProfileSnapshot = Depends(get_profile),
     db: AsyncSession = Depends(get_db)
 ):
     """Actualiza configuración de IA."""
-    # Obtener profile
-    result = await db.execute(
-        select(Profile).where(Profile.firebase_uid == firebase_user["uid"])
-    )
-    profile = result.scalar_one_or_none()
-
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
-
     # Obtener config existente
     result = await db.execute(
         select(AIConfig).where(
@@ -195,6 +165,7 @@ async def update_config(
     # Actualizar campos
     if updates.api_key:
         config.encrypted_key = encryption_service.encrypt(updates.api_key)
+        encryption_service.invalidate(str(config.id))
     if updates.selected_model:
         config.selected_model = updates.selected_model
     if updates.custom_params is not None:
@@ -204,6 +175,7 @@ async def update_config(
 
     await db.commit()
     await db.refresh(config)
+    invalidate_profile(profile.firebase_uid)
 
     return {
         "id": str(config.id),
@@ -218,19 +190,10 @@ async def update_config(
 @router.delete("/{provider_name}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_config(
     provider_name: str,
-    firebase_user: dict = Depends(verify_firebase_token),
+    profile: ProfileSnapshot = Depends(get_profile),
     db: AsyncSession = Depends(get_db)
 ):
     """Elimina configuración de IA."""
-    # Obtener profile
-    result = await db.execute(
-        select(Profile).where(Profile.firebase_uid == firebase_user["uid"])
-    )
-    profile = result.scalar_one_or_none()
-
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
-
     # Obtener config
     result = await db.execute(
         select(AIConfig).where(
@@ -245,3 +208,5 @@ async def delete_config(
 
     await db.delete(config)
     await db.commit()
+    invalidate_profile(profile.firebase_uid)
+    encryption_service.invalidate(str(config.id))
@@ -1,20 +1,34 @@
 """
 Rutas de autenticación - sincronización Firebase <-> Neon PostgreSQL
 """
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from pydantic import BaseModel
 from typing import Optional
+import base64
+import hashlib
+import json
+import time
 import httpx
 
 from app.db.database import get_db
 from app.db.models import Profile
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.logger import logger
+from app.services.firebase_auth import InvalidFirebaseToken, firebase_verifier
+from app.services.profiles import ProfileSnapshot, invalidate_profile, load_profile
+from app.services.rate_limiter import rate_limiter
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+# Tokens ya verificados: sha256(token) -> datos del usuario
+token_cache: TTLCache[dict] = TTLCache(
+    max_size=settings.auth_cache_size,
+    default_ttl=settings.auth_cache_ttl
+)
+
 
 class UserProfile(BaseModel):
     """Respuesta del perfil de usuario."""
@@ -34,19 +48,19 @@ class SyncUserRequest(BaseModel):
     avatar_url: Optional[str] = None
 
 
-async def verify_firebase_token(authorization: str = Header(...)) -> dict:
-    """
-    Verifica el token de Firebase usando la API REST.
-    Retorna la información del usuario si el token es válido.
-    """
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=401, detail="Invalid authorization header")
+def _token_seconds_left(token: str) -> float:
+    """Segundos hasta el claim exp del JWT (0 si no se puede leer)."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"]) - time.time()
+    except (IndexError, KeyError, TypeError, ValueError):
+        return 0.0
 
-    token = authorization.replace("Bearer ", "")
 
-    # Verificar token con Firebase
-    # Usamos la API REST de Firebase para verificar el token
+async def _verify_with_rest(token: str) -> dict:
+    """Verifica el token con la API REST de Identity Toolkit."""
     verify_url = f"https://identitytoolkit.googleapis.com/v1/accounts:lookup?key={settings.firebase_api_key}"
 
     async with httpx.AsyncClient() as client:
@@ -82,6 +96,93 @@ async def verify_firebase_token(authorization: str = Header(...)) -> dict:
                 status_code=500, detail="Error verifying authentication")
 
 
+async def _verify_locally(token: str) -> dict:
+    """Verifica firma y claims del token sin salir a la red."""
+    try:
+        claims = await firebase_verifier.verify(token)
+    except InvalidFirebaseToken as e:
+        logger.warning(f"Firebase token rejected: {e}")
+        raise HTTPException(
+            status_code=401, detail="Invalid or expired token")
+    except (httpx.HTTPError, RuntimeError) as e:
+        logger.error(f"Error verifying Firebase token: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error verifying authentication")
+
+    return {
+        "uid": claims["sub"],
+        "email": claims.get("email"),
+        "display_name": claims.get("name"),
+        "avatar_url": claims.get("picture")
+    }
+
+
+async def verify_firebase_token(authorization: str = Header(...)) -> dict:
+    """
+    Verifica el token de Firebase (API REST o firma local según
+    FIREBASE_AUTH_MODE). Retorna la información del usuario si es válido.
+    Los tokens ya verificados se sirven desde caché hasta su expiración.
+    """
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(
+            status_code=401, detail="Invalid authorization header")
+
+    token = authorization.replace("Bearer ", "")
+
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    cached_user = token_cache.get(cache_key)
+    if cached_user is not None:
+        return cached_user
+
+    if settings.firebase_auth_mode == "local":
+        firebase_user = await _verify_locally(token)
+    else:
+        firebase_user = await _verify_with_rest(token)
+
+    token_cache.set(cache_key, firebase_user, ttl=_token_seconds_left(token))
+    return firebase_user
+
+
+async def check_user_rate_limit(
+    request: Request,
+    firebase_user: dict = Depends(verify_firebase_token)
+):
+    """Aplica el límite por usuario (RATE_LIMIT_REQUESTS / RATE_LIMIT_WINDOW)."""
+    result = await rate_limiter.hit(
+        f"user:{firebase_user['uid']}",
+        settings.rate_limit_requests,
+        settings.rate_limit_window
+    )
+    if result is None:
+        return
+
+    request.state.rate_limit = result
+    if not result.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers=result.headers()
+        )
+
+
+async def get_optional_profile(
+    firebase_user: dict = Depends(verify_firebase_token),
+    db: AsyncSession = Depends(get_db)
+) -> Optional[ProfileSnapshot]:
+    """Perfil del usuario autenticado (con sus configs) o None si no existe."""
+    return await load_profile(db, firebase_user["uid"])
+
+
+async def get_profile(
+    profile: Optional[ProfileSnapshot] = Depends(get_optional_profile)
+) -> ProfileSnapshot:
+    """Perfil del usuario autenticado; 404 si aún no se ha sincronizado."""
+    if profile is None:
+        raise HTTPException(
+            status_code=404, detail="Profile not found. Please sync first.")
+    return profile
+
+
 @router.post("/sync", response_model=UserProfile)
 async def sync_user_profile(
     firebase_user: dict = Depends(verify_firebase_token),
@@ -125,6 +226,7 @@ async def sync_user_profile(
 
         await db.commit()
         await db.refresh(profile)
+        invalidate_profile(profile.firebase_uid)
 
         return UserProfile(
             id=str(profile.id),
@@ -143,27 +245,15 @@ async def sync_user_profile(
 
 
 @router.get("/me", response_model=UserProfile)
-async def get_current_user(
-    firebase_user: dict = Depends(verify_firebase_token),
-    db: AsyncSession = Depends(get_db)
-):
+async def get_current_user(profile: ProfileSnapshot = Depends(get_profile)):
     """
     Obtiene el perfil del usuario autenticado.
     """
-    result = await db.execute(
-        select(Profile).where(Profile.firebase_uid == firebase_user["uid"])
-    )
-    profile = result.scalar_one_or_none()
-
-    if not profile:
-        raise HTTPException(
-            status_code=404, detail="Profile not found. Please sync first.")
-
     return UserProfile(
         id=str(profile.id),
         firebase_uid=profile.firebase_uid,
         email=profile.email,
         display_name=profile.display_name,
         avatar_url=profile.avatar_url,
-        ui_config=profile.ui_config or {}
+        ui_config=profile.ui_config
     )
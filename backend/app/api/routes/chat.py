@@ -1,24 +1,291 @@
 """
 Endpoints para el chat con IA.
 """
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, tuple_, update
 from pydantic import BaseModel
-from typing import List, Optional
-import json
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple, Union
+import asyncio
 import uuid
 
 from app.db.database import get_db
-from app.db.models import Profile, AIConfig, Chat, Message
-from app.services.ai_service import ai_service
+from app.db.models import Chat, Message
+from app.services.ai_service import ProviderTarget, ai_service
+from app.services.compaction import compactor
+from app.services.context import assemble_context, context_limit
 from app.services.encryption import encryption_service
-from app.api.routes.auth import verify_firebase_token
+from app.services.errors import AIServiceError
+from app.services.generation_pool import HIGH, NORMAL, generation_pool
+from app.services.live_streams import LiveStream, live_streams, sse_data
+from app.services.message_writer import (
+    COMPLETE, FAILED, STREAMING, TRUNCATED, StreamingMessageWriter
+)
+from app.services.pagination import decode_cursor, encode_cursor
+from app.services.profiles import ProfileSnapshot
+from app.services.rate_limiter import rate_limiter
+from app.services.streaming import coalesce, stream_stats
+from app.services.tokenizer import tokenizer
+from app.services.transcripts import stream_transcript
+from app.api.routes.auth import check_user_rate_limit, get_optional_profile, get_profile
+from app.core.config import settings
 from app.core.logger import logger
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+}
+
+
+async def _stream_into(
+    live: LiveStream,
+    writer: StreamingMessageWriter,
+    stream: AsyncGenerator[str, None],
+    chat_id: str,
+    target: ProviderTarget,
+    messages: List[Dict[str, str]]
+):
+    """Publica los fragmentos del proveedor para los clientes y los persiste."""
+    live.content = lambda: writer.content
+
+    def tokens_used() -> int:
+        # El stream no trae `usage`: prompt + respuesta contados aquí
+        return (tokenizer.count_messages(messages, target.provider, target.model)
+                + tokenizer.count(writer.content, target.provider, target.model))
+
+    try:
+        # Varios deltas por frame (ver app/services/streaming.py)
+        async for text in coalesce(stream):
+            writer.append(text)
+            live.publish(text)
+    except asyncio.CancelledError:
+        # Se corta el upstream y se guarda lo recibido
+        stream_stats.cancelled += 1
+        stream_stats.truncated_chars += writer.chars
+        try:
+            await writer.finish(TRUNCATED, tokens_used=tokens_used())
+        finally:
+            live.close({"error": "Stream cancelled", "status": TRUNCATED})
+        raise
+    except Exception as e:
+        logger.error(f"Streaming error: {e}")
+        await writer.finish(TRUNCATED, tokens_used=tokens_used())
+        live.close({"error": str(e), "status": TRUNCATED})
+        return
+
+    # Guardar respuesta completa
+    await writer.finish(
+        COMPLETE,
+        tokens_used=tokens_used(),
+        provider_name=target.provider,
+        model_id=target.model
+    )
+    live.close({
+        "done": True,
+        "chat_id": chat_id,
+        "message_id": live.message_id,
+        "provider": target.provider,
+        "model": target.model,
+        "status": COMPLETE
+    })
+
+
+def _decode_cursor(cursor: str):
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _usage_value(usage: Dict[str, Any], *keys: str) -> int:
+    """Primer contador presente en el `usage` (cada proveedor usa sus nombres)."""
+    for key in keys:
+        value = usage.get(key)
+        if isinstance(value, int):
+            return value
+    return 0
+
+
+def provider_targets(profile: ProfileSnapshot, provider: str, model: str) -> List[ProviderTarget]:
+    """Proveedor pedido + fallbacks configurados, con las API keys descifradas."""
+    chain = profile.fallback_chain(provider, model)
+
+    if not chain:
+        raise HTTPException(
+            status_code=400,
+            detail=f"No API key configured for {provider}. Please add your API key in Settings."
+        )
+
+    try:
+        return [
+            ProviderTarget(
+                provider=config.provider_name,
+                model=chain_model,
+                api_key=encryption_service.decrypt_cached(
+                    str(config.id), config.encrypted_key)
+            )
+            for config, chain_model in chain
+        ]
+    except Exception as e:
+        logger.error(f"Error decrypting API key: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error with API key encryption")
+
+
+async def open_chat(
+    db: AsyncSession,
+    profile: ProfileSnapshot,
+    chat_id: Optional[Union[str, uuid.UUID]],
+    first_message: str,
+    provider: str,
+    model: str
+) -> Chat:
+    """Chat existente del usuario (404 si no es suyo) o uno nuevo."""
+    if chat_id:
+        result = await db.execute(
+            select(Chat).where(
+                Chat.id == (chat_id if isinstance(chat_id, uuid.UUID) else uuid.UUID(chat_id)),
+                Chat.profile_id == profile.id
+            )
+        )
+        chat = result.scalar_one_or_none()
+        if not chat:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        return chat
+
+    chat = Chat(
+        profile_id=profile.id,
+        title=first_message[:50] + "..." if len(first_message) > 50 else first_message,
+        provider_name=provider,
+        model_id=model
+    )
+    db.add(chat)
+    await db.flush()
+    return chat
+
+
+async def start_turn(
+    db: AsyncSession,
+    profile: ProfileSnapshot,
+    request: "ChatRequest"
+) -> Tuple[Chat, List[Dict[str, str]], bool]:
+    """
+    Abre el chat, añade a la sesión el mensaje del usuario y devuelve los
+    mensajes para el proveedor: los que envía el cliente (`messages`) o el
+    contexto armado desde la base de datos (`message`), y si conviene
+    compactar el chat (historial sin resumir largo). Antes de llamar al
+    proveedor se cuentan los tokens del prompt: 413 si superan el límite del
+    modelo y 429 si agotan el cupo de tokens del usuario. La compactación la
+    programa quien llama, después de confirmar el turno: un turno rechazado
+    no debe lanzar un resumen de pago.
+    """
+    if request.message is None and not request.messages:
+        raise HTTPException(status_code=422, detail="Either messages or message is required")
+    if request.message is not None and request.messages:
+        raise HTTPException(status_code=422, detail="Send either messages or message, not both")
+
+    first_message = request.message if request.message is not None else request.messages[0].content
+    chat = await open_chat(
+        db, profile, request.chat_id, first_message, request.provider, request.model)
+
+    compact = False
+    if request.message is None:
+        content = request.messages[-1].content
+        messages_for_ai = [{"role": m.role, "content": m.content}
+                           for m in request.messages]
+    else:
+        content = request.message
+        new_chat = not chat.message_count
+        context = await assemble_context(
+            db, chat.id, content, request.provider, request.model,
+            system=request.system, load_history=not new_chat)
+        messages_for_ai = context.messages
+        compact = context.pending_tokens >= settings.compaction_threshold_tokens
+        if new_chat and request.system is not None:
+            db.add(Message(chat_id=chat.id, role="system", content=request.system))
+
+    prompt_tokens = tokenizer.count_messages(messages_for_ai, request.provider, request.model)
+    limit = context_limit(request.model)
+    if limit and prompt_tokens > limit:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Prompt too long for {request.model}: {prompt_tokens} tokens (limit {limit})"
+        )
+    result = await rate_limiter.hit(
+        f"tokens:{profile.firebase_uid}",
+        settings.rate_limit_tokens,
+        settings.rate_limit_window,
+        cost=prompt_tokens
+    )
+    if result is not None and not result.allowed:
+        raise HTTPException(
+            status_code=429, detail="Token rate limit exceeded", headers=result.headers())
+
+    # Guardar mensaje del usuario
+    db.add(Message(chat_id=chat.id, role="user", content=content))
+    return chat, messages_for_ai, compact
+
+
+async def queue_generation(
+    db: AsyncSession,
+    chat: Chat,
+    profile: ProfileSnapshot,
+    targets: List[ProviderTarget],
+    messages_for_ai: List[Dict[str, str]],
+    hedge: bool,
+    priority: int,
+    cancel_on_detach: bool
+) -> LiveStream:
+    """
+    Confirma lo pendiente en la sesión (mensaje del usuario) junto con un
+    placeholder de la respuesta y encola la generación en el pool.
+    """
+    generation_pool.check()
+
+    chat_id = str(chat.id)
+    requested = targets[0]
+    assistant_message = Message(
+        chat_id=chat.id,
+        role="assistant",
+        content="",
+        provider_name=requested.provider,
+        model_id=requested.model,
+        status=STREAMING
+    )
+    db.add(assistant_message)
+    chat.message_count += 2
+    await db.commit()
+    writer = StreamingMessageWriter(assistant_message.id)
+
+    async def generate(live: LiveStream):
+        if live.cancel_requested:
+            # Cancelada mientras esperaba en la cola
+            await writer.finish(TRUNCATED)
+            live.close({"error": "Stream cancelled", "status": TRUNCATED})
+            return
+        try:
+            target, stream = await ai_service.chat_completion_with_fallback(
+                targets,
+                messages_for_ai,
+                stream=True,
+                hedge=hedge
+            )
+        except AIServiceError as e:
+            logger.warning(f"Background generation rejected: {e}")
+            await writer.finish(FAILED)
+            live.close({"error": str(e), "status": FAILED})
+            return
+        await _stream_into(live, writer, stream, chat_id, target, messages_for_ai)
+
+    live = live_streams.open(
+        str(assistant_message.id), chat_id, profile.id, cancel_on_detach=cancel_on_detach)
+    generation_pool.submit(lambda: live_streams.run(live, generate), priority=priority)
+    return live
+
 
 class ChatMessage(BaseModel):
     role: str
@@ -28,9 +295,20 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     provider: str
     model: str
-    messages: List[ChatMessage]
+    # Conversación completa enviada por el cliente...
+    messages: Optional[List[ChatMessage]] = None
+    # ...o solo el mensaje nuevo: el contexto se arma con lo guardado en el chat
+    message: Optional[str] = None
+    # Modo `message`: prompt de sistema fijo al inicio del contexto (se guarda
+    # en chats nuevos; en los existentes sustituye al guardado en este turno)
+    system: Optional[str] = None
     chat_id: Optional[str] = None
     stream: bool = False
+    # Streaming: si el primer token tarda, competir con el primer fallback
+    hedge: bool = False
+    # Generar en el pool de workers; sin stream se responde 202 y se consulta
+    # GET /chat/{chat_id}/messages/{message_id}
+    background: bool = False
 
 
 class ChatResponse(BaseModel):
@@ -49,157 +327,149 @@ class ChatSummary(BaseModel):
     updated_at: str
 
 
-@router.post("/completions")
+@router.post("/completions", dependencies=[Depends(check_user_rate_limit)])
 async def chat_completions(
     request: ChatRequest,
-    firebase_user: dict = Depends(verify_firebase_token),
+    profile: ProfileSnapshot = Depends(get_profile),
     db: AsyncSession = Depends(get_db)
 ):
     """Envía un mensaje al chat y obtiene respuesta de la IA."""
 
-    # Obtener profile
-    result = await db.execute(
-        select(Profile).where(Profile.firebase_uid == firebase_user["uid"])
-    )
-    profile = result.scalar_one_or_none()
+    targets = provider_targets(profile, request.provider, request.model)
 
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
+    chat, messages_for_ai, compact = await start_turn(db, profile, request)
+    chat_id = str(chat.id)
 
-    # Obtener API key del usuario para el proveedor
-    result = await db.execute(
-        select(AIConfig).where(
-            AIConfig.profile_id == profile.id,
-            AIConfig.provider_name == request.provider,
-            AIConfig.is_active == True
-        )
-    )
-    ai_config = result.scalar_one_or_none()
-
-    if not ai_config:
-        raise HTTPException(
-            status_code=400,
-            detail=f"No API key configured for {request.provider}. Please add your API key in Settings."
-        )
-
-    # Desencriptar API key
-    try:
-        api_key = encryption_service.decrypt(ai_config.encrypted_key)
-    except Exception as e:
-        logger.error(f"Error decrypting API key: {e}")
-        raise HTTPException(
-            status_code=500, detail="Error with API key encryption")
-
-    # Obtener o crear chat
-    chat_id = request.chat_id
-    if chat_id:
-        result = await db.execute(
-            select(Chat).where(
-                Chat.id == uuid.UUID(chat_id),
-                Chat.profile_id == profile.id
+    if request.background:
+        # Generación en el pool de workers: el cliente la sigue por SSE o
+        # consulta el mensaje; no depende de esta petición
+        try:
+            live = await queue_generation(
+                db, chat, profile, targets, messages_for_ai,
+                hedge=request.hedge,
+                priority=HIGH if request.stream else NORMAL,
+                cancel_on_detach=False
             )
+        except AIServiceError as e:
+            await db.rollback()
+            raise HTTPException(
+                status_code=e.status_code, detail=str(e), headers=e.headers())
+        if compact:
+            compactor.schedule(chat.id, targets)
+        message_id = live.message_id
+
+        headers = {"X-Chat-Id": chat_id, "X-Message-Id": message_id}
+        if request.stream:
+            return StreamingResponse(
+                live.subscribe(),
+                media_type="text/event-stream",
+                headers={**SSE_HEADERS, **headers}
+            )
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"chat_id": chat_id, "message_id": message_id, "status": STREAMING},
+            headers=headers
         )
-        chat = result.scalar_one_or_none()
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-    else:
-        # Crear nuevo chat
-        chat = Chat(
-            profile_id=profile.id,
-            title=request.messages[0].content[:50] + "..." if len(
-                request.messages[0].content) > 50 else request.messages[0].content,
-            provider_name=request.provider,
-            model_id=request.model
-        )
-        db.add(chat)
-        await db.flush()
-        chat_id = str(chat.id)
-
-    # Guardar mensaje del usuario
-    user_message = Message(
-        chat_id=chat.id,
-        role="user",
-        content=request.messages[-1].content
-    )
-    db.add(user_message)
-
-    # Convertir mensajes para el servicio de IA
-    messages_for_ai = [{"role": m.role, "content": m.content}
-                       for m in request.messages]
 
     if request.stream:
         # Respuesta en streaming
-        async def generate():
-            full_response = ""
-            try:
-                async for chunk in ai_service.chat_completion(
-                    provider=request.provider,
-                    model=request.model,
-                    messages=messages_for_ai,
-                    api_key=api_key,
-                    stream=True
-                ):
-                    full_response += chunk
-                    yield f"data: {json.dumps({'content': chunk, 'chat_id': chat_id})}\n\n"
-
-                # Guardar respuesta completa
-                assistant_message = Message(
-                    chat_id=chat.id,
-                    role="assistant",
-                    content=full_response
-                )
-                db.add(assistant_message)
-
-                # Actualizar contador de mensajes
-                chat.message_count += 2
-                await db.commit()
-
-                yield f"data: {json.dumps({'done': True, 'chat_id': chat_id, 'message_id': str(assistant_message.id)})}\n\n"
-
-            except Exception as e:
-                logger.error(f"Streaming error: {e}")
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-
+        try:
+            target, stream = await ai_service.chat_completion_with_fallback(
+                targets,
+                messages_for_ai,
+                stream=True,
+                hedge=request.hedge
+            )
+        except AIServiceError as e:
+            await db.rollback()
+            raise HTTPException(
+                status_code=e.status_code, detail=str(e), headers=e.headers())
+
+        # Guardar ya el mensaje del usuario y un placeholder de la respuesta,
+        # que se irá completando desde el stream
+        assistant_message = Message(
+            chat_id=chat.id,
+            role="assistant",
+            content="",
+            provider_name=target.provider,
+            model_id=target.model,
+            status=STREAMING
+        )
+        db.add(assistant_message)
+        chat.message_count += 2
+        try:
+            await db.commit()
+        except Exception:
+            await stream.aclose()
+            raise
+        if compact:
+            compactor.schedule(chat.id, targets)
+        writer = StreamingMessageWriter(assistant_message.id)
+        message_id = str(assistant_message.id)
+
+        # La generación va en su propia tarea: sigue si el cliente pierde la
+        # conexión y se cancela si nadie vuelve en stream_detach_timeout
+        live = live_streams.open(message_id, chat_id, profile.id)
+        live_streams.launch(
+            live, lambda live: _stream_into(live, writer, stream, chat_id, target, messages_for_ai))
         return StreamingResponse(
-            generate(),
+            live.subscribe(),
             media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"
-            }
+            # El id del mensaje permite reanudar antes de recibir el frame final
+            headers={**SSE_HEADERS, "X-Chat-Id": chat_id, "X-Message-Id": message_id}
         )
     else:
         # Respuesta normal
         try:
-            response = await ai_service.chat_completion(
-                provider=request.provider,
-                model=request.model,
-                messages=messages_for_ai,
-                api_key=api_key,
+            target, response = await ai_service.chat_completion_with_fallback(
+                targets,
+                messages_for_ai,
                 stream=False
             )
 
+            usage = response.get("usage") or {}
+            prompt_tokens = _usage_value(usage, "prompt_tokens", "input_tokens", "promptTokenCount")
+            if prompt_tokens:
+                tokenizer.calibrate(target.provider, target.model, messages_for_ai, prompt_tokens)
+            total_tokens = _usage_value(usage, "total_tokens", "totalTokenCount") or (
+                prompt_tokens + _usage_value(usage, "completion_tokens", "output_tokens"))
+            if not total_tokens:
+                # Proveedor sin `usage`: estimación local
+                total_tokens = (
+                    tokenizer.count_messages(messages_for_ai, target.provider, target.model)
+                    + tokenizer.count(response["content"], target.provider, target.model))
+
             # Guardar respuesta
             assistant_message = Message(
                 chat_id=chat.id,
                 role="assistant",
                 content=response["content"],
-                tokens_used=response.get("usage", {}).get("total_tokens", 0)
+                tokens_used=total_tokens,
+                provider_name=target.provider,
+                model_id=target.model
             )
             db.add(assistant_message)
 
             # Actualizar contador de mensajes
             chat.message_count += 2
             await db.commit()
+            if compact:
+                compactor.schedule(chat.id, targets)
 
             return {
                 "content": response["content"],
                 "chat_id": chat_id,
                 "message_id": str(assistant_message.id),
+                "provider": target.provider,
+                "model": target.model,
                 "usage": response.get("usage", {})
             }
 
+        except AIServiceError as e:
+            logger.warning(f"Chat completion rejected: {e}")
+            await db.rollback()
+            raise HTTPException(
+                status_code=e.status_code, detail=str(e), headers=e.headers())
         except Exception as e:
             logger.error(f"Chat completion error: {e}")
             await db.rollback()
@@ -208,26 +478,38 @@ async def chat_completions(
 
 @router.get("/history", response_model=List[ChatSummary])
 async def get_chat_history(
-    firebase_user: dict = Depends(verify_firebase_token),
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    profile: Optional[ProfileSnapshot] = Depends(get_optional_profile),
     db: AsyncSession = Depends(get_db)
 ):
-    """Obtiene el historial de chats del usuario."""
-
-    result = await db.execute(
-        select(Profile).where(Profile.firebase_uid == firebase_user["uid"])
-    )
-    profile = result.scalar_one_or_none()
+    """
+    Obtiene el historial de chats del usuario, del más reciente al más
+    antiguo. Si hay más, la cabecera X-Next-Cursor trae el `cursor` de la
+    página siguiente.
+    """
 
     if not profile:
         return []
 
-    result = await db.execute(
-        select(Chat)
+    query = (
+        select(
+            Chat.id, Chat.title, Chat.provider_name, Chat.model_id,
+            Chat.message_count, Chat.created_at, Chat.updated_at
+        )
         .where(Chat.profile_id == profile.id)
-        .order_by(Chat.updated_at.desc())
-        .limit(50)
+        .order_by(Chat.updated_at.desc(), Chat.id.desc())
+        .limit(limit + 1)
     )
-    chats = result.scalars().all()
+    if cursor:
+        updated_at, chat_id = _decode_cursor(cursor)
+        query = query.where(tuple_(Chat.updated_at, Chat.id) < (updated_at, chat_id))
+    rows = (await db.execute(query)).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].updated_at, rows[-1].id)
 
     return [
         {
@@ -239,45 +521,54 @@ async def get_chat_history(
             "created_at": chat.created_at.isoformat(),
             "updated_at": chat.updated_at.isoformat()
         }
-        for chat in chats
+        for chat in rows
     ]
 
 
 @router.get("/{chat_id}/messages")
 async def get_chat_messages(
     chat_id: str,
-    firebase_user: dict = Depends(verify_firebase_token),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    profile: ProfileSnapshot = Depends(get_profile),
     db: AsyncSession = Depends(get_db)
 ):
-    """Obtiene los mensajes de un chat específico."""
-
-    result = await db.execute(
-        select(Profile).where(Profile.firebase_uid == firebase_user["uid"])
-    )
-    profile = result.scalar_one_or_none()
-
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
+    """
+    Obtiene los mensajes de un chat: los `limit` más recientes en orden
+    cronológico y, si hay anteriores, `next_cursor` para pedirlos.
+    """
 
     # Verificar que el chat pertenece al usuario
     result = await db.execute(
-        select(Chat).where(
+        select(Chat.id, Chat.title, Chat.provider_name, Chat.model_id).where(
             Chat.id == uuid.UUID(chat_id),
             Chat.profile_id == profile.id
         )
     )
-    chat = result.scalar_one_or_none()
+    chat = result.one_or_none()
 
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    # Obtener mensajes
-    result = await db.execute(
-        select(Message)
+    # Obtener mensajes (solo columnas, una página por el índice del chat)
+    query = (
+        select(
+            Message.id, Message.role, Message.content, Message.provider_name,
+            Message.model_id, Message.status, Message.created_at
+        )
         .where(Message.chat_id == chat.id)
-        .order_by(Message.created_at.asc())
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit + 1)
     )
-    messages = result.scalars().all()
+    if cursor:
+        created_at, message_id = _decode_cursor(cursor)
+        query = query.where(tuple_(Message.created_at, Message.id) < (created_at, message_id))
+    messages = (await db.execute(query)).all()
+
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1].created_at, messages[-1].id)
 
     return {
         "chat": {
@@ -291,28 +582,150 @@ async def get_chat_messages(
                 "id": str(msg.id),
                 "role": msg.role,
                 "content": msg.content,
+                "provider_name": msg.provider_name,
+                "model_id": msg.model_id,
+                "status": msg.status,
                 "created_at": msg.created_at.isoformat()
             }
-            for msg in messages
-        ]
+            for msg in reversed(messages)
+        ],
+        "next_cursor": next_cursor
     }
 
 
-@router.delete("/{chat_id}")
-async def delete_chat(
+@router.get("/{chat_id}/transcript")
+async def get_chat_transcript(
     chat_id: str,
-    firebase_user: dict = Depends(verify_firebase_token),
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    profile: ProfileSnapshot = Depends(get_profile),
     db: AsyncSession = Depends(get_db)
 ):
-    """Elimina un chat."""
+    """
+    Transcripción completa de un chat en streaming: un JSON como el de
+    /messages (sin paginar) o NDJSON con un mensaje por línea.
+    """
 
     result = await db.execute(
-        select(Profile).where(Profile.firebase_uid == firebase_user["uid"])
+        select(Chat.id, Chat.title, Chat.provider_name, Chat.model_id).where(
+            Chat.id == uuid.UUID(chat_id),
+            Chat.profile_id == profile.id
+        )
     )
-    profile = result.scalar_one_or_none()
+    chat = result.one_or_none()
 
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    ndjson = output == "ndjson"
+    return StreamingResponse(
+        stream_transcript(
+            {
+                "id": str(chat.id),
+                "title": chat.title,
+                "provider_name": chat.provider_name,
+                "model_id": chat.model_id
+            },
+            chat.id,
+            ndjson
+        ),
+        media_type="application/x-ndjson" if ndjson else "application/json"
+    )
+
+
+async def _get_assistant_message(
+    db: AsyncSession,
+    chat_id: str,
+    message_id: str,
+    profile: ProfileSnapshot
+) -> Message:
+    """Respuesta del asistente de un chat del usuario (404 si no existe)."""
+    result = await db.execute(
+        select(Message)
+        .join(Chat, Chat.id == Message.chat_id)
+        .where(
+            Message.id == uuid.UUID(message_id),
+            Message.role == "assistant",
+            Chat.id == uuid.UUID(chat_id),
+            Chat.profile_id == profile.id
+        )
+    )
+    message = result.scalar_one_or_none()
+
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return message
+
+
+@router.get("/{chat_id}/messages/{message_id}")
+async def get_chat_message(
+    chat_id: str,
+    message_id: str,
+    profile: ProfileSnapshot = Depends(get_profile),
+    db: AsyncSession = Depends(get_db)
+):
+    """Estado y contenido de una respuesta (para consultar generaciones en segundo plano)."""
+
+    message = await _get_assistant_message(db, chat_id, message_id, profile)
+    return {
+        "id": str(message.id),
+        "chat_id": chat_id,
+        "role": message.role,
+        "content": message.content,
+        "provider_name": message.provider_name,
+        "model_id": message.model_id,
+        "status": message.status,
+        "created_at": message.created_at.isoformat()
+    }
+
+
+@router.get("/{chat_id}/stream/{message_id}")
+async def resume_stream(
+    chat_id: str,
+    message_id: str,
+    last_event_id: Optional[str] = Header(None),
+    profile: ProfileSnapshot = Depends(get_profile),
+    db: AsyncSession = Depends(get_db)
+):
+    """Reanuda el stream de una respuesta desde Last-Event-ID."""
+
+    try:
+        after = int(last_event_id) if last_event_id else -1
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    live = live_streams.get(message_id)
+    if (
+        live is not None
+        and live.chat_id == chat_id
+        and live.profile_id == profile.id
+        and live.can_resume(after)
+    ):
+        return StreamingResponse(
+            live.subscribe(after), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    # Generación ya desalojada o en otra instancia: lo guardado en la base de datos
+    message = await _get_assistant_message(db, chat_id, message_id, profile)
+    frames = [
+        sse_data({"reset": True, "content": message.content, "chat_id": chat_id}),
+        sse_data({
+            "done": message.status != STREAMING,
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "provider": message.provider_name,
+            "model": message.model_id,
+            "status": message.status
+        })
+    ]
+    return StreamingResponse(iter(frames), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.delete("/{chat_id}")
+async def delete_chat(
+    chat_id: str,
+    profile: ProfileSnapshot = Depends(get_profile),
+    db: AsyncSession = Depends(get_db)
+):
+    """Elimina un chat."""
 
     result = await db.execute(
         select(Chat).where(
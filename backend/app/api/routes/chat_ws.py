@@ -0,0 +1,314 @@
+"""
+Chat por WebSocket: una conexión, autenticada una sola vez, transporta
+varias conversaciones a la vez identificadas por message_id.
+
+Mensajes del cliente (JSON, en frames de texto o binarios):
+  {"type": "auth", "token": "..."}         siempre el primero
+  {"type": "chat", "ref": "c1", "provider": "...", "model": "...",
+   "messages": [...] o "message": "...", "chat_id": "..."?, "hedge": false?}
+  {"type": "resume", "chat_id": "...", "message_id": "...", "last_seq": 41}
+  {"type": "cancel", "message_id": "..."}
+  {"type": "ping"}
+
+Mensajes del servidor (JSON UTF-8 compacto en frames binarios):
+  ready, start (ref -> chat_id/message_id), delta (message_id, seq,
+  content), reset, done, error y pong.
+"""
+import asyncio
+import uuid
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket
+from pydantic import ValidationError
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.routes.auth import verify_firebase_token
+from app.api.routes.chat import ChatRequest, provider_targets, queue_generation, start_turn
+from app.core import json_codec
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import db
+from app.services.compaction import compactor
+from app.services.errors import AIServiceError
+from app.services.generation_pool import HIGH
+from app.services.live_streams import CONTENT, FINAL, LiveStream, live_streams
+from app.services.profiles import load_profile
+from app.services.rate_limiter import rate_limiter
+
+router = APIRouter(prefix="/chat", tags=["Chat"])
+
+# Cierre por autenticación inválida (policy violation)
+WS_POLICY_VIOLATION = 1008
+
+
+class WSChatRequest(ChatRequest):
+    # Validado aquí: un id mal formado es un 422 y no tumba la conexión
+    chat_id: Optional[uuid.UUID] = None
+    # Identificador del cliente para asociar la respuesta `start`
+    ref: Optional[str] = None
+
+
+class DeltaEncoder:
+    """Frames `delta` con el prefijo (tipo y message_id) precalculado."""
+
+    def __init__(self, message_id: str):
+        self._prefix = b'{"type":"delta","message_id":' + json_codec.dumps(message_id) + b',"seq":'
+
+    def encode(self, seq: int, text: str) -> bytes:
+        return self._prefix + b"%d" % seq + b',"content":' + json_codec.dumps(text) + b"}"
+
+
+class ChatConnection:
+    """
+    Estado de una conexión. Los frames pasan por una cola acotada hacia un
+    único emisor: si el cliente lee despacio, los reenviadores se bloquean y
+    LiveStream agrupa lo pendiente en frames mayores, sin frenar al proveedor.
+    """
+
+    def __init__(self, websocket: WebSocket, uid: str, profile_id: uuid.UUID):
+        self.websocket = websocket
+        self.uid = uid
+        self.profile_id = profile_id
+        self.outbox: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=settings.ws_send_queue)
+        self.forwarders: Dict[str, asyncio.Task] = {}
+
+    async def send(self, payload: Dict[str, Any]):
+        await self.outbox.put(json_codec.dumps(payload))
+
+    async def error(self, status: int, detail: str, **extra: Any):
+        await self.send({"type": "error", "status": status, "detail": detail, **extra})
+
+    async def sender(self):
+        try:
+            while True:
+                frame = await self.outbox.get()
+                await self.websocket.send_bytes(frame)
+        except Exception as e:
+            logger.info("WebSocket send failed for %s: %s", self.uid, e)
+            # Descartar lo que quede para no bloquear a nadie hasta el cierre
+            while True:
+                await self.outbox.get()
+
+    async def handle(self, message: Dict[str, Any]):
+        kind = message.get("type")
+        if kind == "chat":
+            await self.start_chat(message)
+        elif kind == "resume":
+            await self.resume(message)
+        elif kind == "cancel":
+            live = live_streams.get(str(message.get("message_id")))
+            if live is not None and live.profile_id == self.profile_id:
+                live.cancel()
+        elif kind == "auth":
+            # Renovación del token en conexiones largas; debe ser el mismo usuario
+            user = await verify_firebase_token(f"Bearer {message.get('token', '')}")
+            if user["uid"] != self.uid:
+                raise HTTPException(status_code=401, detail="Token belongs to another user")
+        elif kind == "ping":
+            await self.send({"type": "pong"})
+        else:
+            await self.error(400, f"Unknown message type: {kind}")
+
+    async def start_chat(self, message: Dict[str, Any]):
+        ref = message.get("ref")
+        try:
+            request = WSChatRequest.model_validate(message)
+        except ValidationError as e:
+            await self.error(422, str(e), ref=ref)
+            return
+
+        if len(self.forwarders) >= settings.ws_max_streams:
+            await self.error(429, "Too many concurrent streams on this connection", ref=ref)
+            return
+
+        # Mismo límite por usuario que POST /chat/completions
+        result = await rate_limiter.hit(
+            f"user:{self.uid}",
+            settings.rate_limit_requests,
+            settings.rate_limit_window
+        )
+        if result is not None and not result.allowed:
+            await self.error(429, "Rate limit exceeded", ref=ref,
+                             retry_after=result.headers().get("Retry-After"))
+            return
+
+        session = await db.get_session()
+        try:
+            # Desde la caché salvo que cambien las configs
+            profile = await load_profile(session, self.uid)
+            if profile is None:
+                raise HTTPException(status_code=404, detail="Profile not found. Please sync first.")
+
+            targets = provider_targets(profile, request.provider, request.model)
+            chat, messages_for_ai, compact = await start_turn(session, profile, request)
+            live = await queue_generation(
+                session, chat, profile, targets, messages_for_ai,
+                hedge=request.hedge,
+                priority=HIGH,
+                cancel_on_detach=True
+            )
+        except HTTPException as e:
+            await session.rollback()
+            await self.error(e.status_code, str(e.detail), ref=ref)
+            return
+        except AIServiceError as e:
+            await session.rollback()
+            await self.error(e.status_code, str(e), ref=ref)
+            return
+        except ValueError as e:
+            await session.rollback()
+            await self.error(400, str(e), ref=ref)
+            return
+        except Exception:
+            # Un fallo de este turno (p.ej. la base de datos) no cierra los demás streams
+            logger.exception("WebSocket chat turn failed for %s", self.uid)
+            await session.rollback()
+            await self.error(500, "Internal server error", ref=ref)
+            return
+        finally:
+            await session.close()
+
+        if compact:
+            compactor.schedule(chat.id, targets)
+        await self.send({
+            "type": "start",
+            "ref": ref,
+            "chat_id": live.chat_id,
+            "message_id": live.message_id
+        })
+        self.follow(live, -1)
+
+    async def resume(self, message: Dict[str, Any]):
+        message_id = str(message.get("message_id"))
+        live = live_streams.get(message_id)
+        last_seq = message.get("last_seq", -1)
+        if (
+            live is None
+            or live.chat_id != message.get("chat_id")
+            or live.profile_id != self.profile_id
+            or not isinstance(last_seq, int)
+            or not live.can_resume(last_seq)
+        ):
+            # Terminada hace tiempo o en otra instancia: GET /chat/{chat_id}/messages/{message_id}
+            await self.error(404, "Stream not available", message_id=message_id)
+            return
+        if message_id not in self.forwarders:
+            self.follow(live, last_seq)
+
+    def follow(self, live: LiveStream, last_seq: int):
+        task = asyncio.create_task(self._forward(live, last_seq))
+        self.forwarders[live.message_id] = task
+        task.add_done_callback(lambda _: self.forwarders.pop(live.message_id, None))
+
+    async def _forward(self, live: LiveStream, last_seq: int):
+        deltas = DeltaEncoder(live.message_id)
+        events = live.follow(last_seq)
+        try:
+            async for kind, seq, payload in events:
+                if kind == CONTENT:
+                    await self.outbox.put(deltas.encode(seq, payload))
+                elif kind == FINAL:
+                    await self.send({
+                        "type": "done" if payload.get("done") else "error",
+                        "message_id": live.message_id,
+                        **payload
+                    })
+                else:
+                    await self.send({
+                        "type": "reset",
+                        "message_id": live.message_id,
+                        "seq": seq,
+                        "content": payload
+                    })
+        finally:
+            await events.aclose()
+
+    async def close(self):
+        for task in list(self.forwarders.values()):
+            task.cancel()
+        await asyncio.gather(*self.forwarders.values(), return_exceptions=True)
+
+
+async def _load_profile_id(firebase_uid: str) -> Optional[uuid.UUID]:
+    session = await db.get_session()
+    try:
+        profile = await load_profile(session, firebase_uid)
+    finally:
+        await session.close()
+    return profile.id if profile is not None else None
+
+
+async def _authenticate(websocket: WebSocket) -> Optional[dict]:
+    """
+    Token en el primer mensaje {"type": "auth"}. No se acepta en la query
+    string: quedaría en los logs de acceso de uvicorn y de los proxies.
+    """
+    try:
+        first = await asyncio.wait_for(websocket.receive(), settings.ws_auth_timeout)
+    except asyncio.TimeoutError:
+        return None
+    data = first.get("bytes") or first.get("text")
+    if not data:
+        return None
+    try:
+        message = json_codec.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(message, dict) or message.get("type") != "auth":
+        return None
+    token = message.get("token", "")
+    try:
+        return await verify_firebase_token(f"Bearer {token}")
+    except HTTPException:
+        return None
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """Varias conversaciones en streaming sobre una sola conexión."""
+    await websocket.accept()
+
+    firebase_user = await _authenticate(websocket)
+    if firebase_user is None:
+        await websocket.close(code=WS_POLICY_VIOLATION, reason="Invalid or missing token")
+        return
+
+    profile_id = await _load_profile_id(firebase_user["uid"])
+    if profile_id is None:
+        await websocket.close(code=WS_POLICY_VIOLATION, reason="Profile not found. Please sync first.")
+        return
+
+    connection = ChatConnection(websocket, firebase_user["uid"], profile_id)
+    sender = asyncio.create_task(connection.sender())
+    await connection.send({"type": "ready", "uid": firebase_user["uid"]})
+
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+            data = frame.get("bytes") or frame.get("text")
+            try:
+                message = json_codec.loads(data or b"")
+            except ValueError:
+                await connection.error(400, "Invalid JSON")
+                continue
+            if not isinstance(message, dict):
+                await connection.error(400, "Expected a JSON object")
+                continue
+            try:
+                await connection.handle(message)
+            except HTTPException as e:
+                await websocket.close(code=WS_POLICY_VIOLATION, reason=str(e.detail))
+                break
+            except Exception:
+                logger.exception("WebSocket message failed for %s", firebase_user["uid"])
+                await connection.error(500, "Internal server error", ref=message.get("ref"))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Las generaciones siguen stream_detach_timeout por si el cliente vuelve
+        await connection.close()
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        logger.info("WebSocket closed for %s", firebase_user["uid"])
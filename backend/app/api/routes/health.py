@@ -6,6 +6,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
 from app.db.database import get_db
+from app.services.ai_service import ai_service
+from app.services.compaction import compactor
+from app.services.encryption import encryption_service
+from app.services.generation_pool import generation_pool
+from app.services.profiles import profile_cache
+from app.services.rate_limiter import rate_limiter
+from app.services.live_streams import live_streams
+from app.services.streaming import stream_stats
+from app.services.tokenizer import tokenizer
+from app.api.routes.auth import token_cache
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
@@ -16,6 +26,70 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@router.get("/pools")
+async def pool_stats():
+    """Uso de los pools HTTP hacia los proveedores de IA."""
+    return ai_service.pool_stats()
+
+
+@router.get("/admission")
+async def admission_stats():
+    """Concurrencia, profundidad de cola y tiempos de espera por proveedor."""
+    return ai_service.admission.stats()
+
+
+@router.get("/circuits")
+async def circuit_stats():
+    """Estado de los circuit breakers por proveedor/modelo."""
+    return ai_service.circuits.stats()
+
+
+@router.get("/hedging")
+async def hedging_stats():
+    """TTFT por proveedor, retraso de hedging y coste de los hedges."""
+    return ai_service.hedging.stats()
+
+
+@router.get("/streams")
+async def streaming_stats():
+    """Frames SSE enviados, cancelaciones y generaciones reanudables en memoria."""
+    return {**stream_stats.stats(), "live": live_streams.stats()}
+
+
+@router.get("/generation")
+async def generation_stats():
+    """Workers, colas por prioridad y esperas del pool de generación."""
+    return generation_pool.stats()
+
+
+@router.get("/compaction")
+async def compaction_stats():
+    """Compactaciones de chats en curso, hechas y tokens resumidos."""
+    return compactor.stats()
+
+
+@router.get("/tokenizer")
+async def tokenizer_stats():
+    """Conteo de tokens: BPE cargados, calibración de la heurística y caché."""
+    return tokenizer.stats()
+
+
+@router.get("/caches")
+async def cache_stats():
+    """Aciertos/fallos de las cachés en memoria."""
+    return {
+        "auth_tokens": token_cache.stats(),
+        "profiles": profile_cache.stats(),
+        "api_keys": encryption_service.cache_stats()
+    }
+
+
+@router.get("/rate-limits")
+async def rate_limit_stats():
+    """Peticiones admitidas/rechazadas por el rate limiter."""
+    return rate_limiter.stats()
+
+
 @router.post("/init-providers")
 async def init_providers(db: AsyncSession = Depends(get_db)):
     """Inicializa los proveedores de IA en la base de datos."""
@@ -54,5 +128,6 @@ async def init_providers(db: AsyncSession = Depends(get_db)):
 
     await db.execute(text(providers_sql))
     await db.commit()
+    await ai_service.load_catalog(db)
 
     return {"status": "ok", "message": "Providers initialized successfully"}
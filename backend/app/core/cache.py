@@ -0,0 +1,94 @@
+"""
+Caché en memoria con TTL por entrada y expulsión LRU.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Caché LRU acotada en tamaño, con expiración por entrada."""
+
+    def __init__(
+        self,
+        max_size: int,
+        default_ttl: float,
+        on_evict: Optional[Callable[[Hashable, V], None]] = None
+    ):
+        """
+        Args:
+            max_size: Número máximo de entradas antes de expulsar la menos usada
+            default_ttl: Segundos de vida si no se indica otro en set()
+            on_evict: Callback opcional al descartar una entrada
+        """
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._on_evict = on_evict
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Retorna el valor si existe y no ha expirado."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._discard(key)
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None):
+        """Guarda un valor; el ttl se acota a default_ttl y si es <= 0 no se almacena."""
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+
+        if key in self._data:
+            self._discard(key)
+        self._data[key] = (time.monotonic() + ttl, value)
+
+        while len(self._data) > self.max_size:
+            oldest = next(iter(self._data))
+            self._discard(oldest)
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        """Invalida una entrada."""
+        if key in self._data:
+            self._discard(key)
+
+    def clear(self):
+        """Vacía la caché."""
+        for key in list(self._data):
+            self._discard(key)
+
+    def _discard(self, key: Hashable):
+        _, value = self._data.pop(key)
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos/fallos para monitoreo."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
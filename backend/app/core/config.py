@@ -2,7 +2,7 @@
 Configuración centralizada usando Pydantic Settings.
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 from functools import lru_cache
 
 
@@ -16,21 +16,179 @@ class Settings(BaseSettings):
 
     # Security
     master_key: str = ""
+    # Claves anteriores (separadas por coma) aceptadas solo para descifrar
+    # durante una rotación de MASTER_KEY
+    master_key_previous: str = ""
     secret_key: str = "dev-secret-key"
+    # Caché de API keys descifradas (segundos / entradas)
+    key_cache_ttl: int = 300
+    key_cache_size: int = 1000
 
     # Database (Neon PostgreSQL)
     database_url: str = ""
+    # Conexiones del pool: DB_POOL_SIZE fijas más DB_MAX_OVERFLOW bajo demanda
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
 
     # Firebase (for token verification)
     firebase_project_id: str = ""
     firebase_api_key: str = ""
+    # "rest" (Identity Toolkit) o "local" (firma RS256 con certificados de Google)
+    firebase_auth_mode: str = "rest"
+    firebase_certs_url: str = (
+        "https://www.googleapis.com/robot/v1/metadata/x509/"
+        "securetoken@system.gserviceaccount.com"
+    )
+    firebase_clock_skew: int = 30
+
+    # Caché de tokens verificados (el TTL nunca supera el exp del token)
+    auth_cache_size: int = 10000
+    auth_cache_ttl: int = 300
+
+    # Caché de perfiles + configs de IA por firebase_uid
+    profile_cache_size: int = 5000
+    profile_cache_ttl: int = 30
 
     # CORS
     allowed_origins: str = "http://localhost:3000,http://localhost:5173"
 
     # Rate Limiting
+    rate_limit_enabled: bool = True
+    # Por usuario (firebase uid) en /chat/completions
     rate_limit_requests: int = 100
     rate_limit_window: int = 86400  # 24 horas
+    # Tokens de entrada estimados por usuario y RATE_LIMIT_WINDOW (0 = sin límite)
+    rate_limit_tokens: int = 0
+    # Por IP en todas las rutas /api
+    rate_limit_ip_requests: int = 300
+    rate_limit_ip_window: int = 60
+    # Cabecera con la IP real del cliente puesta por el proxy ("" = peer del socket)
+    rate_limit_ip_header: str = "fly-client-ip"
+    # "memory" (por proceso) o "redis" (compartido entre máquinas)
+    rate_limit_backend: str = "memory"
+    rate_limit_redis_url: str = ""
+    # Segundos por conexión o comando a Redis; al vencer se deja pasar (fail open)
+    rate_limit_redis_timeout: float = 0.1
+    rate_limit_max_keys: int = 100000
+
+    # AI providers - pool HTTP compartido por proveedor
+    ai_http_timeout: float = 120.0
+    ai_http_connect_timeout: float = 10.0
+    ai_http_max_connections: int = 50
+    ai_http_max_keepalive_connections: int = 20
+    ai_http_keepalive_expiry: float = 60.0
+    ai_http2: bool = True
+
+    # AI providers - control de admisión (concurrencia y colas)
+    ai_max_concurrency_per_provider: int = 32
+    # Overrides por proveedor, p.ej. AI_PROVIDER_CONCURRENCY='{"groq": 8}'
+    ai_provider_concurrency: Dict[str, int] = {}
+    ai_max_queue_per_provider: int = 64
+    ai_max_concurrency_per_key: int = 4
+    ai_max_queue_per_key: int = 8
+    ai_queue_timeout: float = 15.0
+
+    # AI providers - reintentos con backoff exponencial y jitter
+    ai_retry_max_attempts: int = 3
+    ai_retry_base_delay: float = 0.5
+    ai_retry_max_delay: float = 8.0
+    # Tiempo total máximo (s) dedicado a reintentar una misma llamada
+    ai_retry_budget: float = 20.0
+
+    # AI providers - circuit breaker por (proveedor, modelo)
+    ai_circuit_enabled: bool = True
+    ai_circuit_window: float = 60.0
+    ai_circuit_min_calls: int = 10
+    ai_circuit_failure_rate: float = 0.5
+    # Llamadas más lentas que esto (s hasta el primer fragmento en streaming)
+    ai_circuit_slow_call: float = 30.0
+    ai_circuit_slow_rate: float = 0.8
+    ai_circuit_open_seconds: float = 30.0
+    ai_circuit_half_open_calls: int = 1
+    ai_circuit_max_keys: int = 1000
+
+    # AI providers - hedging de streams (opt-in por petición)
+    # Retraso = percentil del TTFT reciente del proveedor, acotado
+    ai_hedge_percentile: float = 0.95
+    ai_hedge_min_delay: float = 0.25
+    ai_hedge_max_delay: float = 5.0
+    # Retraso mientras no haya ai_hedge_min_samples observaciones
+    ai_hedge_default_delay: float = 2.0
+    ai_hedge_min_samples: int = 20
+    ai_ttft_window: int = 200
+
+    # Streaming al cliente - agrupación de deltas en frames SSE
+    # Ventana (ms) desde el último frame; 0 = un frame por delta
+    stream_coalesce_ms: float = 30.0
+    # Tamaño (caracteres) que fuerza el envío antes de cumplirse la ventana
+    stream_coalesce_bytes: int = 1024
+    # Guardado incremental de la respuesta (lo que ocurra antes)
+    stream_checkpoint_seconds: float = 2.0
+    stream_checkpoint_chars: int = 2000
+    # Mensajes que siguen en 'streaming' pasado este tiempo (s) se dan por truncados
+    stream_abandoned_after: float = 900.0
+    # Reanudación con Last-Event-ID: caracteres retenidos por generación,
+    # tiempo que se conserva al terminar y espera a que vuelva un cliente
+    # desconectado antes de cancelar el upstream (0 = cancelar en el acto)
+    stream_resume_buffer_chars: int = 65536
+    stream_resume_grace: float = 60.0
+    stream_detach_timeout: float = 10.0
+
+    # Generaciones en segundo plano (ChatRequest.background). Cada worker
+    # puede ocupar una conexión (checkpoints de message_writer): debe quedar
+    # por debajo de db_pool_size + db_max_overflow para que las peticiones
+    # interactivas no esperen conexión detrás de los workers
+    generation_workers: int = 10
+    generation_max_queue: int = 256
+
+    # Contexto armado en el servidor (ChatRequest.message): presupuesto de
+    # tokens de entrada por modelo, p.ej. CONTEXT_MODEL_BUDGETS='{"gpt-4o": 100000}'
+    context_token_budget: int = 8000
+    context_model_budgets: Dict[str, int] = {}
+    # Filas leídas como máximo por turno
+    context_max_rows: int = 200
+    # Límite de tokens del prompt (413 si se supera; 0 = sin comprobar),
+    # p.ej. CONTEXT_MODEL_LIMITS='{"gpt-4": 8192}'
+    context_limit: int = 0
+    context_model_limits: Dict[str, int] = {}
+
+    # Conteo de tokens: BPE de tiktoken si está instalado (vocabularios en
+    # TIKTOKEN_CACHE_DIR) y caché de conteos de textos largos
+    tokenizer_bpe: bool = True
+    tokenizer_cache_size: int = 50000
+    tokenizer_cache_ttl: int = 3600
+    tokenizer_cache_min_chars: int = 256
+    # Peso de cada `usage` al recalibrar la heurística (media móvil)
+    tokenizer_calibration_rate: float = 0.1
+
+    # Compactación: resumir los turnos antiguos cuando el historial posterior
+    # al último resumen supera el umbral, conservando los más recientes
+    compaction_enabled: bool = True
+    compaction_threshold_tokens: int = 6000
+    compaction_keep_tokens: int = 2000
+    compaction_min_tokens: int = 1000
+    compaction_summary_tokens: int = 800
+    compaction_max_rows: int = 400
+    compaction_max_concurrent: int = 4
+    # Modelo barato por proveedor, p.ej. COMPACTION_MODELS='{"openai": "gpt-4o-mini"}'
+    compaction_models: Dict[str, str] = {}
+
+    # Filas por lote al exportar un chat completo (/chat/{chat_id}/transcript)
+    transcript_batch_rows: int = 500
+
+    # Chat por WebSocket (/chat/ws)
+    ws_auth_timeout: float = 10.0
+    # Streams simultáneos por conexión y frames en cola hacia el cliente
+    ws_max_streams: int = 8
+    ws_send_queue: int = 64
+
+    # Sustituye la base_url de un proveedor, p.ej. '{"openai": "http://localhost:9911/v1"}'
+    ai_base_urls: Dict[str, str] = {}
+
+    @property
+    def previous_master_keys(self) -> List[str]:
+        """Convierte string de claves anteriores a lista."""
+        return [k.strip() for k in self.master_key_previous.split(",") if k.strip()]
 
     @property
     def cors_origins(self) -> List[str]:
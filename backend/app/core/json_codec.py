@@ -0,0 +1,31 @@
+"""
+JSON rápido con orjson si está instalado; si no, módulo json estándar.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+ORJSON_AVAILABLE = orjson is not None
+
+_decoder = json.JSONDecoder()
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decodifica JSON; lanza ValueError si no es válido."""
+    if orjson is not None:
+        return orjson.loads(data)
+    # Decodificar UTF-8 directamente evita la detección de encoding de json.loads
+    if not isinstance(data, str):
+        data = bytes(data).decode("utf-8")
+    return _decoder.decode(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Codifica a JSON compacto en UTF-8."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
@@ -0,0 +1,87 @@
+"""
+Métricas en memoria para monitoreo (expuestas en /health).
+"""
+import math
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Sequence
+
+# Buckets por defecto en segundos (latencias y tiempos de espera)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Histograma de buckets fijos; memoria constante."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Cota superior del bucket que contiene el cuantil q (inf si pasa del último)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def _bounded_quantile(self, q: float) -> Optional[float]:
+        # JSON no admite inf: más allá del último bucket no hay cota (null)
+        value = self.quantile(q)
+        return None if math.isinf(value) else value
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = {}
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            cumulative[f"le_{bound}"] = seen
+        cumulative["le_inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self._bounded_quantile(0.5),
+            "p95": self._bounded_quantile(0.95),
+            "p99": self._bounded_quantile(0.99),
+            "buckets": cumulative
+        }
+
+
+class RollingWindow:
+    """Últimas N observaciones, para cuantiles que siguen la carga actual."""
+
+    def __init__(self, size: int):
+        self.values: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def observe(self, value: float):
+        self.values.append(value)
+
+    def quantile(self, q: float) -> float:
+        """Cuantil q (nearest-rank) de la ventana; 0 si está vacía."""
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        index = min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": len(self.values),
+            "p50": round(self.quantile(0.5), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "p99": round(self.quantile(0.99), 4)
+        }
@@ -44,8 +44,8 @@ class Database:
             self._engine = create_async_engine(
                 db_url,
                 echo=settings.debug,
-                pool_size=5,
-                max_overflow=10
+                pool_size=settings.db_pool_size,
+                max_overflow=settings.db_max_overflow
             )
 
             self._session_factory = async_sessionmaker(
@@ -2,7 +2,7 @@
 Modelos SQLAlchemy para la base de datos.
 """
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, Text, ForeignKey, Integer, JSON
+from sqlalchemy import Column, String, Boolean, DateTime, Text, ForeignKey, Integer, JSON, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -98,6 +98,14 @@ class Chat(Base):
     profile = relationship("Profile", back_populates="chats")
     messages = relationship(
         "Message", back_populates="chat", cascade="all, delete-orphan")
+    checkpoints = relationship(
+        "ChatCheckpoint", back_populates="chat", cascade="all, delete-orphan")
+
+    # Páginas por keyset (updated_at, id) de GET /chat/history, descendente
+    # como en la migración 009
+    __table_args__ = (
+        Index("idx_chats_profile_updated_id", profile_id, updated_at.desc(), id.desc()),
+    )
 
 
 class Message(Base):
@@ -110,8 +118,47 @@ class Message(Base):
     role = Column(String(20), nullable=False)  # user, assistant, system
     content = Column(Text, nullable=False)
     tokens_used = Column(Integer, default=0)
+    # Proveedor/modelo que generó la respuesta (puede ser un fallback)
+    provider_name = Column(String(50))
+    model_id = Column(String(100))
+    # streaming (en curso) | complete | truncated (cortada a mitad del stream)
+    # | failed (generación en segundo plano rechazada por el proveedor)
+    status = Column(String(20), nullable=False, default="complete")
 
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relaciones
     chat = relationship("Chat", back_populates="messages")
+
+    # Últimos mensajes de un chat (contexto armado en el servidor) y páginas
+    # por keyset (created_at, id) de GET /chat/{chat_id}/messages
+    __table_args__ = (
+        Index("idx_messages_chat_created_id", "chat_id", "created_at", "id"),
+    )
+
+
+class ChatCheckpoint(Base):
+    """Resumen de los mensajes de un chat hasta covered_until (compactación)."""
+    __tablename__ = "chat_checkpoints"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    chat_id = Column(UUID(as_uuid=True), ForeignKey(
+        "chats.id", ondelete="CASCADE"), nullable=False)
+    summary = Column(Text, nullable=False)
+    # created_at del último mensaje resumido; el contexto sigue desde ahí
+    covered_until = Column(DateTime, nullable=False)
+    messages_covered = Column(Integer, nullable=False, default=0)
+    tokens = Column(Integer, default=0)
+    # Modelo que generó el resumen
+    provider_name = Column(String(50))
+    model_id = Column(String(100))
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relaciones
+    chat = relationship("Chat", back_populates="checkpoints")
+
+    # Un resumen por tramo: dos compactaciones del mismo tramo no se duplican
+    __table_args__ = (
+        UniqueConstraint("chat_id", "covered_until", name="uq_chat_checkpoints_chat_covered"),
+    )
@@ -6,18 +6,68 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from sqlalchemy.exc import SQLAlchemyError
 
 from app.core.config import settings
 from app.core.logger import logger
-from app.api.routes import health, ai_configs, auth, chat
+from app.api.routes import health, ai_configs, auth, chat, chat_ws
+from app.db.database import db
+from app.services.ai_service import ai_service
+from app.services.encryption import encryption_service
+from app.services.firebase_auth import firebase_verifier
+from app.services.generation_pool import generation_pool
+from app.services.message_writer import close_abandoned_streams
+from app.services.rate_limiter import RateLimitMiddleware, rate_limiter
+from app.services.tokenizer import tokenizer
+
+
+async def load_provider_catalog():
+    """Registra los endpoints OpenAI-compatibles definidos en el catálogo."""
+    if not db.is_configured:
+        return
+    try:
+        session = await db.get_session()
+        try:
+            await ai_service.load_catalog(session)
+        finally:
+            await session.close()
+    except (SQLAlchemyError, OSError, RuntimeError) as e:
+        # Sin catálogo siguen funcionando los proveedores integrados
+        logger.error("Could not load provider catalog: %s", e)
+
+
+async def close_stale_messages():
+    """Da por truncadas las respuestas que quedaron a medias en otro arranque."""
+    if not db.is_configured:
+        return
+    try:
+        session = await db.get_session()
+        try:
+            closed = await close_abandoned_streams(session)
+        finally:
+            await session.close()
+        if closed:
+            logger.info("Marked %d abandoned streamed messages as truncated", closed)
+    except (SQLAlchemyError, OSError, RuntimeError) as e:
+        logger.error("Could not close abandoned streamed messages: %s", e)
 
 
 @asynccontextmanager
 async def lifespan(_application: FastAPI):
     """Ciclo de vida de la aplicación."""
     logger.info("Starting %s v%s", settings.app_name, settings.app_version)
+    await ai_service.startup()
+    await load_provider_catalog()
+    await close_stale_messages()
+    await tokenizer.startup()
+    generation_pool.start()
     yield
     logger.info("Shutting down")
+    await generation_pool.stop()
+    await ai_service.shutdown()
+    await firebase_verifier.aclose()
+    encryption_service.clear_cache()
+    await rate_limiter.backend.close()
 
 
 app = FastAPI(
@@ -28,6 +78,9 @@ app = FastAPI(
     redoc_url="/redoc" if settings.debug else None,
 )
 
+# Rate limiting (dentro de CORS para que los 429 lleven cabeceras CORS)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # CORS - Allow all origins
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +88,15 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "Retry-After",
+        "X-RateLimit-Limit",
+        "X-RateLimit-Remaining",
+        "X-RateLimit-Reset",
+        "X-Chat-Id",
+        "X-Message-Id",
+        "X-Next-Cursor"
+    ],
 )
 
 
@@ -53,6 +115,7 @@ app.include_router(health.router, prefix="/api/v1")
 app.include_router(ai_configs.router, prefix="/api/v1")
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(chat.router, prefix="/api/v1")
+app.include_router(chat_ws.router, prefix="/api/v1")
 
 
 @app.get("/")
@@ -0,0 +1,153 @@
+"""
+Control de admisión hacia los proveedores de IA: límite de concurrencia por
+proveedor y por API key, con colas de espera acotadas y descarte de carga.
+"""
+import asyncio
+import hashlib
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Tuple
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+from app.services.errors import ProviderOverloadedError
+
+
+class Gate:
+    """Semáforo con cola FIFO acotada; el hueco se entrega al siguiente en espera."""
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self.waiters
+
+    def has_room(self) -> bool:
+        """True si una petición nueva entraría o podría encolarse."""
+        return self.active < self.limit or len(self.waiters) < self.max_queue
+
+    async def acquire(self, timeout: float):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            raise ProviderOverloadedError("Provider queue is full", retry_after=1)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # El hueco llegó justo al expirar: se devuelve
+                self.release()
+            else:
+                waiter.cancel()
+                self.waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise ProviderOverloadedError(
+                    "Timed out waiting for provider capacity", retry_after=timeout) from e
+            raise
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                # El hueco pasa directamente al siguiente (active no cambia)
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    """Gates por proveedor y por (proveedor, API key), con métricas de espera."""
+
+    def __init__(self):
+        self._provider_gates: Dict[str, Gate] = {}
+        self._key_gates: Dict[Tuple[str, str], Gate] = {}
+        self._wait_times: Dict[str, Histogram] = {}
+        self._rejected: Dict[str, int] = {}
+
+    def _provider_gate(self, provider: str) -> Gate:
+        gate = self._provider_gates.get(provider)
+        if gate is None:
+            limit = settings.ai_provider_concurrency.get(
+                provider, settings.ai_max_concurrency_per_provider)
+            gate = Gate(limit, settings.ai_max_queue_per_provider)
+            self._provider_gates[provider] = gate
+            self._wait_times[provider] = Histogram()
+            self._rejected[provider] = 0
+        return gate
+
+    def _key_gate(self, provider: str, api_key: str) -> Tuple[Tuple[str, str], Gate]:
+        # Solo se guarda un hash de la key, nunca el texto plano
+        key = (provider, hashlib.sha256(api_key.encode()).hexdigest()[:16])
+        gate = self._key_gates.get(key)
+        if gate is None:
+            gate = Gate(settings.ai_max_concurrency_per_key,
+                        settings.ai_max_queue_per_key)
+            self._key_gates[key] = gate
+        return key, gate
+
+    def check(self, provider: str, api_key: str):
+        """Rechaza de inmediato (503) si las colas ya están llenas."""
+        gate_key, key_gate = self._key_gate(provider, api_key)
+        has_room = self._provider_gate(provider).has_room() and key_gate.has_room()
+        self._discard_idle(gate_key, key_gate)
+        if not has_room:
+            self._rejected[provider] += 1
+            raise ProviderOverloadedError("Provider queue is full", retry_after=1)
+
+    @asynccontextmanager
+    async def slot(self, provider: str, api_key: str) -> AsyncIterator[None]:
+        """Reserva un hueco (API key y luego proveedor) durante la llamada."""
+        provider_gate = self._provider_gate(provider)
+        gate_key, key_gate = self._key_gate(provider, api_key)
+        timeout = settings.ai_queue_timeout
+        started = time.monotonic()
+
+        try:
+            await key_gate.acquire(timeout)
+            try:
+                remaining = max(0.0, timeout - (time.monotonic() - started))
+                await provider_gate.acquire(remaining)
+            except BaseException:
+                key_gate.release()
+                raise
+        except BaseException as e:
+            if isinstance(e, ProviderOverloadedError):
+                self._rejected[provider] += 1
+            self._discard_idle(gate_key, key_gate)
+            raise
+
+        self._wait_times[provider].observe(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            provider_gate.release()
+            key_gate.release()
+            self._discard_idle(gate_key, key_gate)
+
+    def _discard_idle(self, gate_key: Tuple[str, str], gate: Gate):
+        if gate.idle and self._key_gates.get(gate_key) is gate:
+            del self._key_gates[gate_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Profundidad de colas, concurrencia e histogramas de espera."""
+        return {
+            provider: {
+                "limit": gate.limit,
+                "active": gate.active,
+                "queue_depth": len(gate.waiters),
+                "max_queue": gate.max_queue,
+                "rejected": self._rejected[provider],
+                "wait_seconds": self._wait_times[provider].snapshot()
+            }
+            for provider, gate in self._provider_gates.items()
+        }
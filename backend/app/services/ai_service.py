@@ -1,40 +1,147 @@
 """
 Servicio para interactuar con múltiples proveedores de IA.
-Soporta OpenAI, Anthropic, Google, Mistral, Cohere, Groq y OpenRouter.
+Soporta OpenAI, Anthropic, Google, Mistral, Cohere, Groq, OpenRouter y
+cualquier endpoint compatible con OpenAI registrado en el catálogo.
 """
+import asyncio
 import httpx
-import json
-from typing import AsyncGenerator, List, Dict, Any
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import AsyncGenerator, AsyncIterator, Awaitable, List, Dict, Any, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.core.logger import logger
+from app.db.models import AIProviderCatalog
+from app.services.admission import AdmissionController
+from app.services.circuit_breaker import CircuitBreaker, CircuitBreakers, is_upstream_failure
+from app.services.errors import AIServiceError, ProviderHTTPError
+from app.services.hedging import HedgeTracker
+from app.services.providers import default_registry
+from app.services.retry import RetryPolicy, retry_after_from_headers
+from app.services.sse import iter_events
+from app.services.tokenizer import tokenizer
+
+# HTTP/2 requiere el extra httpx[http2] (paquete h2)
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+
+@dataclass(frozen=True)
+class ProviderTarget:
+    """Proveedor, modelo y API key de un eslabón de la cadena de fallback."""
+    provider: str
+    model: str
+    api_key: str
 
 
 class AIService:
     """Servicio unificado para múltiples proveedores de IA."""
 
     def __init__(self):
-        self.providers = {
-            "openai": {
-                "base_url": "https://api.openai.com/v1",
-            },
-            "anthropic": {
-                "base_url": "https://api.anthropic.com/v1",
-            },
-            "google": {
-                "base_url": "https://generativelanguage.googleapis.com/v1beta",
-            },
-            "mistral": {
-                "base_url": "https://api.mistral.ai/v1",
-            },
-            "cohere": {
-                "base_url": "https://api.cohere.ai/v2",
-            },
-            "groq": {
-                "base_url": "https://api.groq.com/openai/v1",
-            },
-            "openrouter": {
-                "base_url": "https://openrouter.ai/api/v1",
+        self.registry = default_registry()
+        # Un cliente persistente por proveedor (keep-alive, TLS reutilizado)
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._pool_counters: Dict[str, Dict[str, int]] = {}
+        self.admission = AdmissionController()
+        self.retry = RetryPolicy()
+        self.circuits = CircuitBreakers()
+        self.hedging = HedgeTracker()
+
+    # ==================== Pool HTTP ====================
+    def _build_client(self) -> httpx.AsyncClient:
+        """Crea un cliente HTTP con límites de conexión configurables."""
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.ai_http_timeout,
+                connect=settings.ai_http_connect_timeout
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.ai_http_max_connections,
+                max_keepalive_connections=settings.ai_http_max_keepalive_connections,
+                keepalive_expiry=settings.ai_http_keepalive_expiry
+            ),
+            http2=settings.ai_http2 and HTTP2_AVAILABLE
+        )
+
+    def _get_client(self, provider: str) -> httpx.AsyncClient:
+        """Retorna el cliente del proveedor, creándolo si no existe."""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._build_client()
+            self._clients[provider] = client
+            self._pool_counters.setdefault(provider, {
+                "requests": 0,
+                "in_flight": 0,
+                "peak_in_flight": 0,
+                "errors": 0
+            })
+        return client
+
+    @asynccontextmanager
+    async def _pooled(self, provider: str) -> AsyncIterator[httpx.AsyncClient]:
+        """Presta el cliente del proveedor contabilizando su uso."""
+        client = self._get_client(provider)
+        counters = self._pool_counters[provider]
+        counters["requests"] += 1
+        counters["in_flight"] += 1
+        counters["peak_in_flight"] = max(
+            counters["peak_in_flight"], counters["in_flight"])
+        try:
+            yield client
+        except Exception:
+            counters["errors"] += 1
+            raise
+        finally:
+            counters["in_flight"] -= 1
+
+    @staticmethod
+    def _http_error(message: str, response: httpx.Response) -> ProviderHTTPError:
+        """Error de una respuesta no 200 con la espera que pide el proveedor."""
+        return ProviderHTTPError(
+            message,
+            status=response.status_code,
+            headers=response.headers,
+            retry_after=retry_after_from_headers(response.headers)
+        )
+
+    async def startup(self):
+        """Abre los clientes de todos los proveedores."""
+        for provider in self.registry:
+            self._get_client(provider)
+        logger.info(
+            "AI HTTP pools ready (%d providers, http2=%s)",
+            len(self._clients), settings.ai_http2 and HTTP2_AVAILABLE
+        )
+
+    async def load_catalog(self, session: AsyncSession) -> List[str]:
+        """Registra los proveedores OpenAI-compatibles de ai_providers_catalog."""
+        result = await session.execute(select(AIProviderCatalog))
+        return self.registry.register_catalog(result.scalars().all())
+
+    async def shutdown(self):
+        """Cierra los clientes y sus conexiones."""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+        logger.info("AI HTTP pools closed")
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Contadores de uso del pool por proveedor."""
+        stats = {}
+        for provider, counters in self._pool_counters.items():
+            client = self._clients.get(provider)
+            # httpx no expone el pool públicamente; se lee del transport
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", []))
+            stats[provider] = {
+                **counters,
+                "connections": len(connections),
+                "idle_connections": sum(1 for c in connections if c.is_idle()),
+                "closed": client is None or client.is_closed
             }
-        }
+        return stats
 
     async def chat_completion(
         self,
@@ -47,678 +154,334 @@ class AIService:
     ):
         """
         Envía mensajes a un proveedor de IA y obtiene respuesta.
+        Con stream=True retorna un generador asíncrono de fragmentos.
+        Lanza ProviderOverloadedError (503) si no hay capacidad y
+        CircuitOpenError (503) si el proveedor/modelo está fallando.
+        Los errores transitorios se reintentan (en streaming, solo antes
+        del primer fragmento).
         """
-        if provider not in self.providers:
+        if provider not in self.registry:
             raise ValueError(f"Provider '{provider}' not supported")
 
+        # Descarte inmediato si el circuito está abierto o las colas llenas
+        breaker = self.circuits.get(provider, model)
+        if settings.ai_circuit_enabled:
+            breaker.check()
+        self.admission.check(provider, api_key)
+
+        # Admisión por intento: las esperas entre reintentos no ocupan hueco
         if stream:
-            if provider == "openai":
-                return self._openai_stream(model, messages, api_key, **kwargs)
-            elif provider == "anthropic":
-                return self._anthropic_stream(model, messages, api_key, **kwargs)
-            elif provider == "google":
-                return self._google_stream(model, messages, api_key, **kwargs)
-            elif provider == "mistral":
-                return self._mistral_stream(model, messages, api_key, **kwargs)
-            elif provider == "cohere":
-                return self._cohere_stream(model, messages, api_key, **kwargs)
-            elif provider == "groq":
-                return self._groq_stream(model, messages, api_key, **kwargs)
-            elif provider == "openrouter":
-                return self._openrouter_stream(model, messages, api_key, **kwargs)
-        else:
-            if provider == "openai":
-                return await self._openai_chat(model, messages, api_key, **kwargs)
-            elif provider == "anthropic":
-                return await self._anthropic_chat(model, messages, api_key, **kwargs)
-            elif provider == "google":
-                return await self._google_chat(model, messages, api_key, **kwargs)
-            elif provider == "mistral":
-                return await self._mistral_chat(model, messages, api_key, **kwargs)
-            elif provider == "cohere":
-                return await self._cohere_chat(model, messages, api_key, **kwargs)
-            elif provider == "groq":
-                return await self._groq_chat(model, messages, api_key, **kwargs)
-            elif provider == "openrouter":
-                return await self._openrouter_chat(model, messages, api_key, **kwargs)
-
-        raise ValueError(f"Provider '{provider}' not implemented")
-
-    # ==================== OpenAI ====================
-    async def _openai_chat(
+            return self.retry.stream(provider, lambda: self._admitted_stream(
+                provider, api_key,
+                self._guarded_stream(
+                    provider,
+                    breaker,
+                    self._stream(provider, model, messages, api_key, **kwargs)
+                )
+            ))
+
+        async def attempt() -> Dict[str, Any]:
+            async with self.admission.slot(provider, api_key):
+                return await self._guarded_chat(
+                    breaker,
+                    self._chat(provider, model, messages, api_key, **kwargs)
+                )
+
+        return await self.retry.run(provider, attempt)
+
+    async def chat_completion_with_fallback(
         self,
-        model: str,
+        targets: Sequence[ProviderTarget],
         messages: List[Dict[str, str]],
-        api_key: str,
+        stream: bool = False,
+        hedge: bool = False,
         **kwargs
-    ) -> Dict[str, Any]:
-        """Chat con OpenAI (sin streaming)."""
-        url = f"{self.providers['openai']['base_url']}/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": False
-        }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                logger.error(f"OpenAI error: {response.text}")
-                raise Exception(
-                    f"OpenAI API error: {response.status_code} - {response.text}")
-
-            data = response.json()
-            return {
-                "content": data["choices"][0]["message"]["content"],
-                "usage": data.get("usage", {})
-            }
-
-    async def _openai_stream(
+    ) -> Tuple[ProviderTarget, Any]:
+        """
+        Prueba los targets en orden hasta que uno responda.
+        Retorna el target que respondió y su resultado; en streaming solo se
+        cambia de proveedor antes del primer fragmento.
+        Con hedge=True (solo streaming) los dos primeros targets compiten.
+        """
+        if stream and hedge and len(targets) > 1:
+            try:
+                return await self._hedged_stream(targets[0], targets[1], messages, **kwargs)
+            except AIServiceError as e:
+                if len(targets) == 2 or not self._can_fail_over(e):
+                    raise
+                logger.warning("Hedged providers failed (%s), falling back", e)
+                targets = targets[2:]
+
+        for index, target in enumerate(targets):
+            try:
+                result = await self.chat_completion(
+                    provider=target.provider,
+                    model=target.model,
+                    messages=messages,
+                    api_key=target.api_key,
+                    stream=stream,
+                    **kwargs
+                )
+                if stream:
+                    result = await self._prime_stream(result)
+                return target, result
+            except AIServiceError as e:
+                if index == len(targets) - 1 or not self._can_fail_over(e):
+                    raise
+                following = targets[index + 1]
+                logger.warning(
+                    "%s/%s failed (%s), falling back to %s/%s",
+                    target.provider, target.model, e,
+                    following.provider, following.model)
+
+        raise ValueError("No provider targets given")
+
+    async def _hedged_stream(
         self,
-        model: str,
+        primary: ProviderTarget,
+        secondary: ProviderTarget,
         messages: List[Dict[str, str]],
-        api_key: str,
         **kwargs
-    ) -> AsyncGenerator[str, None]:
-        """Chat con OpenAI (streaming)."""
-        url = f"{self.providers['openai']['base_url']}/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": True
+    ) -> Tuple[ProviderTarget, AsyncGenerator[str, None]]:
+        """
+        Abre el stream en `primary` y, si el primer fragmento no llega en el
+        retraso de hedging (o primary falla), también en `secondary`.
+        Gana el primero que produzca un fragmento; el otro se cancela.
+        """
+        async def open_stream(target: ProviderTarget) -> AsyncGenerator[str, None]:
+            stream = await self.chat_completion(
+                provider=target.provider,
+                model=target.model,
+                messages=messages,
+                api_key=target.api_key,
+                stream=True,
+                **kwargs
+            )
+            return await self._prime_stream(stream)
+
+        tasks: Dict[asyncio.Task, ProviderTarget] = {
+            asyncio.create_task(open_stream(primary)): primary
         }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream("POST", url, json=payload, headers=headers) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"OpenAI error: {error_text}")
-                    raise Exception(
-                        f"OpenAI API error: {response.status_code}")
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            content = chunk.get("choices", [{}])[0].get(
-                                "delta", {}).get("content", "")
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
-
-    # ==================== Anthropic ====================
-    async def _anthropic_chat(
+        hedge_at = time.monotonic() + self.hedging.delay(primary.provider)
+        launched = racing = False
+        last_error: Optional[AIServiceError] = None
+        try:
+            while tasks:
+                timeout = None if launched else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    target = tasks.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if racing:
+                            if target is primary:
+                                self.hedging.primary_wins += 1
+                            else:
+                                self.hedging.hedge_wins += 1
+                        return target, task.result()
+                    if not isinstance(error, AIServiceError) or not self._can_fail_over(error):
+                        raise error
+                    last_error = error
+
+                if not launched and (not done or not tasks):
+                    # Primer token tardío (hedge) o primary caído (fallback)
+                    launched = True
+                    racing = not done
+                    if racing:
+                        self.hedging.launched += 1
+                        logger.info(
+                            "Hedging %s/%s with %s/%s",
+                            primary.provider, primary.model,
+                            secondary.provider, secondary.model)
+                    tasks[asyncio.create_task(open_stream(secondary))] = secondary
+            raise last_error
+        finally:
+            if tasks:
+                await self._cancel_losers(tasks, messages)
+
+    async def _cancel_losers(
         self,
-        model: str,
-        messages: List[Dict[str, str]],
-        api_key: str,
-        **kwargs
-    ) -> Dict[str, Any]:
-        """Chat con Anthropic Claude (sin streaming)."""
-        url = f"{self.providers['anthropic']['base_url']}/messages"
-
-        headers = {
-            "x-api-key": api_key,
-            "Content-Type": "application/json",
-            "anthropic-version": "2023-06-01"
-        }
-
-        system_message = None
-        anthropic_messages = []
-
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                anthropic_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-
-        payload = {
-            "model": model,
-            "messages": anthropic_messages,
-            "max_tokens": kwargs.get("max_tokens", 4096)
-        }
-
-        if system_message:
-            payload["system"] = system_message
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                logger.error(f"Anthropic error: {response.text}")
-                raise Exception(
-                    f"Anthropic API error: {response.status_code} - {response.text}")
-
-            data = response.json()
-            return {
-                "content": data["content"][0]["text"],
-                "usage": data.get("usage", {})
-            }
-
-    async def _anthropic_stream(
+        tasks: Dict[asyncio.Task, ProviderTarget],
+        messages: List[Dict[str, str]]
+    ):
+        """Cancela las peticiones perdedoras y contabiliza su coste."""
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if not isinstance(result, BaseException):
+                await result.aclose()
+        self.hedging.wasted_tokens += sum(
+            tokenizer.count_messages(messages, target.provider, target.model)
+            for target in tasks.values())
+
+    @staticmethod
+    def _can_fail_over(error: AIServiceError) -> bool:
+        # Una petición inválida fallaría igual con otro proveedor
+        return not (isinstance(error, ProviderHTTPError) and error.status in (400, 413, 422))
+
+    async def _prime_stream(self, stream: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+        """Espera el primer fragmento para que un fallo inicial sea una excepción."""
+        try:
+            first: Optional[str] = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            await stream.aclose()
+            raise
+        return self._resume_stream(first, stream)
+
+    async def _resume_stream(
         self,
-        model: str,
-        messages: List[Dict[str, str]],
-        api_key: str,
-        **kwargs
+        first: Optional[str],
+        stream: AsyncGenerator[str, None]
     ) -> AsyncGenerator[str, None]:
-        """Chat con Anthropic Claude (streaming)."""
-        url = f"{self.providers['anthropic']['base_url']}/messages"
-
-        headers = {
-            "x-api-key": api_key,
-            "Content-Type": "application/json",
-            "anthropic-version": "2023-06-01"
-        }
-
-        system_message = None
-        anthropic_messages = []
-
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                anthropic_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-
-        payload = {
-            "model": model,
-            "messages": anthropic_messages,
-            "max_tokens": kwargs.get("max_tokens", 4096),
-            "stream": True
-        }
-
-        if system_message:
-            payload["system"] = system_message
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream("POST", url, json=payload, headers=headers) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"Anthropic error: {error_text}")
-                    raise Exception(
-                        f"Anthropic API error: {response.status_code}")
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        try:
-                            chunk = json.loads(data)
-                            if chunk.get("type") == "content_block_delta":
-                                content = chunk.get(
-                                    "delta", {}).get("text", "")
-                                if content:
-                                    yield content
-                        except json.JSONDecodeError:
-                            continue
-
-    # ==================== Google ====================
-    async def _google_chat(
+        try:
+            if first is not None:
+                yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _guarded_chat(
         self,
-        model: str,
-        messages: List[Dict[str, str]],
-        api_key: str,
-        **kwargs
+        breaker: CircuitBreaker,
+        call: Awaitable[Dict[str, Any]]
     ) -> Dict[str, Any]:
-        """Chat con Google Gemini (sin streaming)."""
-        url = f"{self.providers['google']['base_url']}/models/{model}:generateContent?key={api_key}"
-
-        headers = {"Content-Type": "application/json"}
-
-        google_contents = []
-        system_instruction = None
-
-        for msg in messages:
-            if msg["role"] == "system":
-                system_instruction = msg["content"]
-            else:
-                role = "user" if msg["role"] == "user" else "model"
-                google_contents.append({
-                    "role": role,
-                    "parts": [{"text": msg["content"]}]
-                })
-
-        payload = {
-            "contents": google_contents,
-            "generationConfig": {
-                "maxOutputTokens": kwargs.get("max_tokens", 4096),
-                "temperature": kwargs.get("temperature", 0.7)
-            }
-        }
-
-        if system_instruction:
-            payload["systemInstruction"] = {
-                "parts": [{"text": system_instruction}]}
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                logger.error(f"Google error: {response.text}")
-                raise Exception(
-                    f"Google API error: {response.status_code} - {response.text}")
-
-            data = response.json()
-            content = data["candidates"][0]["content"]["parts"][0]["text"]
-            return {
-                "content": content,
-                "usage": data.get("usageMetadata", {})
-            }
-
-    async def _google_stream(
+        """Ejecuta un intento registrando su resultado en el circuit breaker."""
+        if not settings.ai_circuit_enabled:
+            return await call
+
+        try:
+            breaker.acquire()
+        except BaseException:
+            call.close()
+            raise
+
+        started = time.monotonic()
+        try:
+            result = await call
+        except Exception as e:
+            breaker.record(is_upstream_failure(e), time.monotonic() - started)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+
+        breaker.record(False, time.monotonic() - started)
+        return result
+
+    async def _guarded_stream(
         self,
-        model: str,
-        messages: List[Dict[str, str]],
-        api_key: str,
-        **kwargs
+        provider: str,
+        breaker: CircuitBreaker,
+        stream: AsyncGenerator[str, None]
     ) -> AsyncGenerator[str, None]:
-        """Chat con Google Gemini (streaming)."""
-        url = f"{self.providers['google']['base_url']}/models/{model}:streamGenerateContent?key={api_key}&alt=sse"
-
-        headers = {"Content-Type": "application/json"}
-
-        google_contents = []
-        system_instruction = None
-
-        for msg in messages:
-            if msg["role"] == "system":
-                system_instruction = msg["content"]
-            else:
-                role = "user" if msg["role"] == "user" else "model"
-                google_contents.append({
-                    "role": role,
-                    "parts": [{"text": msg["content"]}]
-                })
-
-        payload = {
-            "contents": google_contents,
-            "generationConfig": {
-                "maxOutputTokens": kwargs.get("max_tokens", 4096),
-                "temperature": kwargs.get("temperature", 0.7)
-            }
-        }
-
-        if system_instruction:
-            payload["systemInstruction"] = {
-                "parts": [{"text": system_instruction}]}
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream("POST", url, json=payload, headers=headers) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"Google error: {error_text}")
-                    raise Exception(
-                        f"Google API error: {response.status_code}")
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        try:
-                            chunk = json.loads(data)
-                            parts = chunk.get("candidates", [{}])[0].get(
-                                "content", {}).get("parts", [])
-                            for part in parts:
-                                text = part.get("text", "")
-                                if text:
-                                    yield text
-                        except json.JSONDecodeError:
-                            continue
-
-    # ==================== Mistral ====================
-    async def _mistral_chat(
-        self,
-        model: str,
-        messages: List[Dict[str, str]],
-        api_key: str,
-        **kwargs
-    ) -> Dict[str, Any]:
-        """Chat con Mistral (sin streaming)."""
-        url = f"{self.providers['mistral']['base_url']}/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": False
-        }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                logger.error(f"Mistral error: {response.text}")
-                raise Exception(
-                    f"Mistral API error: {response.status_code} - {response.text}")
-
-            data = response.json()
-            return {
-                "content": data["choices"][0]["message"]["content"],
-                "usage": data.get("usage", {})
-            }
-
-    async def _mistral_stream(
+        """
+        Como _guarded_chat para streaming: la latencia que cuenta es la del
+        primer fragmento, que también alimenta el TTFT del hedging.
+        """
+        circuit = breaker if settings.ai_circuit_enabled else None
+        if circuit is not None:
+            circuit.acquire()
+        started = time.monotonic()
+        recorded = False
+        try:
+            async for chunk in stream:
+                if not recorded:
+                    recorded = True
+                    ttft = time.monotonic() - started
+                    self.hedging.observe_ttft(provider, ttft)
+                    if circuit is not None:
+                        circuit.record(False, ttft)
+                yield chunk
+            if not recorded:
+                recorded = True
+                if circuit is not None:
+                    circuit.record(False, time.monotonic() - started)
+        except Exception as e:
+            if not recorded:
+                recorded = True
+                if circuit is not None:
+                    circuit.record(is_upstream_failure(e), time.monotonic() - started)
+            raise
+        finally:
+            if not recorded and circuit is not None:
+                circuit.release()
+            await stream.aclose()
+
+    async def _admitted_stream(
         self,
-        model: str,
-        messages: List[Dict[str, str]],
+        provider: str,
         api_key: str,
-        **kwargs
+        stream: AsyncGenerator[str, None]
     ) -> AsyncGenerator[str, None]:
-        """Chat con Mistral (streaming)."""
-        url = f"{self.providers['mistral']['base_url']}/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": True
-        }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream("POST", url, json=payload, headers=headers) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"Mistral error: {error_text}")
-                    raise Exception(
-                        f"Mistral API error: {response.status_code}")
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            content = chunk.get("choices", [{}])[0].get(
-                                "delta", {}).get("content", "")
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
-
-    # ==================== Cohere ====================
-    async def _cohere_chat(
+        """Mantiene el hueco de admisión mientras dura el streaming."""
+        async with self.admission.slot(provider, api_key):
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+
+    async def _chat(
         self,
+        provider: str,
         model: str,
         messages: List[Dict[str, str]],
         api_key: str,
         **kwargs
     ) -> Dict[str, Any]:
-        """Chat con Cohere (sin streaming)."""
-        url = f"{self.providers['cohere']['base_url']}/chat"
+        """Chat sin streaming a través del adaptador del proveedor."""
+        adapter = self.registry.get(provider)
+        request = adapter.build_request(model, messages, api_key, stream=False, **kwargs)
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        # Cohere usa formato diferente
-        cohere_messages = []
-        for msg in messages:
-            role = "assistant" if msg["role"] == "assistant" else msg["role"]
-            if role == "system":
-                role = "system"
-            cohere_messages.append({
-                "role": role,
-                "content": msg["content"]
-            })
-
-        payload = {
-            "model": model,
-            "messages": cohere_messages,
-            "stream": False
-        }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
+        async with self._pooled(provider) as client:
+            response = await client.post(request.url, json=request.payload, headers=request.headers)
             if response.status_code != 200:
-                logger.error(f"Cohere error: {response.text}")
-                raise Exception(
-                    f"Cohere API error: {response.status_code} - {response.text}")
+                logger.error(f"{adapter.display_name} error: {response.text}")
+                raise self._http_error(
+                    f"{adapter.display_name} API error: {response.status_code} - {response.text}", response)
 
             data = response.json()
-            content = data.get("message", {}).get(
-                "content", [{}])[0].get("text", "")
             return {
-                "content": content,
-                "usage": data.get("usage", {})
+                "content": adapter.parse_response(data),
+                "usage": adapter.parse_usage(data)
             }
 
-    async def _cohere_stream(
+    async def _stream(
         self,
+        provider: str,
         model: str,
         messages: List[Dict[str, str]],
         api_key: str,
         **kwargs
     ) -> AsyncGenerator[str, None]:
-        """Chat con Cohere (streaming)."""
-        url = f"{self.providers['cohere']['base_url']}/chat"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        cohere_messages = []
-        for msg in messages:
-            role = "assistant" if msg["role"] == "assistant" else msg["role"]
-            if role == "system":
-                role = "system"
-            cohere_messages.append({
-                "role": role,
-                "content": msg["content"]
-            })
-
-        payload = {
-            "model": model,
-            "messages": cohere_messages,
-            "stream": True
-        }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream("POST", url, json=payload, headers=headers) as response:
+        """Chat en streaming a través del adaptador del proveedor."""
+        adapter = self.registry.get(provider)
+        request = adapter.build_request(model, messages, api_key, stream=True, **kwargs)
+
+        async with self._pooled(provider) as client:
+            async with client.stream(
+                "POST", request.url, json=request.payload, headers=request.headers
+            ) as response:
                 if response.status_code != 200:
                     error_text = await response.aread()
-                    logger.error(f"Cohere error: {error_text}")
-                    raise Exception(
-                        f"Cohere API error: {response.status_code}")
-
-                async for line in response.aiter_lines():
-                    if not line:
+                    logger.error(f"{adapter.display_name} error: {error_text}")
+                    raise self._http_error(
+                        f"{adapter.display_name} API error: {response.status_code}", response)
+
+                # Se consume hasta EOF (también tras [DONE]) para devolver
+                # la conexión al pool
+                async for event in iter_events(response.aiter_bytes()):
+                    payload = adapter.decode_event(event)
+                    if payload is None:
                         continue
-                    try:
-                        chunk = json.loads(line)
-                        if chunk.get("type") == "content-delta":
-                            content = chunk.get("delta", {}).get(
-                                "message", {}).get("content", {}).get("text", "")
-                            if content:
-                                yield content
-                    except json.JSONDecodeError:
-                        continue
-
-    # ==================== Groq ====================
-    async def _groq_chat(
-        self,
-        model: str,
-        messages: List[Dict[str, str]],
-        api_key: str,
-        **kwargs
-    ) -> Dict[str, Any]:
-        """Chat con Groq (sin streaming). Usa formato OpenAI."""
-        url = f"{self.providers['groq']['base_url']}/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": False
-        }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                logger.error(f"Groq error: {response.text}")
-                raise Exception(
-                    f"Groq API error: {response.status_code} - {response.text}")
-
-            data = response.json()
-            return {
-                "content": data["choices"][0]["message"]["content"],
-                "usage": data.get("usage", {})
-            }
-
-    async def _groq_stream(
-        self,
-        model: str,
-        messages: List[Dict[str, str]],
-        api_key: str,
-        **kwargs
-    ) -> AsyncGenerator[str, None]:
-        """Chat con Groq (streaming). Usa formato OpenAI."""
-        url = f"{self.providers['groq']['base_url']}/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": True
-        }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream("POST", url, json=payload, headers=headers) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"Groq error: {error_text}")
-                    raise Exception(f"Groq API error: {response.status_code}")
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            content = chunk.get("choices", [{}])[0].get(
-                                "delta", {}).get("content", "")
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
-
-    # ==================== OpenRouter ====================
-    async def _openrouter_chat(
-        self,
-        model: str,
-        messages: List[Dict[str, str]],
-        api_key: str,
-        **kwargs
-    ) -> Dict[str, Any]:
-        """Chat con OpenRouter (sin streaming). Usa formato OpenAI."""
-        url = f"{self.providers['openrouter']['base_url']}/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://sonorakit.dev",
-            "X-Title": "SonoraKit"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": False
-        }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            if response.status_code != 200:
-                logger.error(f"OpenRouter error: {response.text}")
-                raise Exception(
-                    f"OpenRouter API error: {response.status_code} - {response.text}")
-
-            data = response.json()
-            return {
-                "content": data["choices"][0]["message"]["content"],
-                "usage": data.get("usage", {})
-            }
-
-    async def _openrouter_stream(
-        self,
-        model: str,
-        messages: List[Dict[str, str]],
-        api_key: str,
-        **kwargs
-    ) -> AsyncGenerator[str, None]:
-        """Chat con OpenRouter (streaming). Usa formato OpenAI."""
-        url = f"{self.providers['openrouter']['base_url']}/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://sonorakit.dev",
-            "X-Title": "SonoraKit"
-        }
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": True
-        }
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream("POST", url, json=payload, headers=headers) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"OpenRouter error: {error_text}")
-                    raise Exception(
-                        f"OpenRouter API error: {response.status_code}")
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            content = chunk.get("choices", [{}])[0].get(
-                                "delta", {}).get("content", "")
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
+                    content = adapter.parse_stream_event(payload)
+                    if content:
+                        yield content
 
 
 # Singleton
@@ -0,0 +1,165 @@
+"""
+Circuit breaker por (proveedor, modelo): deja de llamar a un upstream caído
+durante un tiempo en lugar de esperar al timeout en cada petición.
+"""
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.services.errors import CircuitOpenError, ProviderHTTPError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Solo cuentan los fallos del proveedor (5xx, 529, timeouts, conexión);
+    un 429 o un 4xx dependen de la API key o de la petición.
+    """
+    if isinstance(error, ProviderHTTPError):
+        return error.status >= 500 or error.status == 408
+    return isinstance(error, httpx.TransportError)
+
+
+class CircuitBreaker:
+    """
+    closed: las llamadas pasan y se mide la tasa de error y de lentitud en
+    una ventana deslizante. open: se rechazan sin llamar durante
+    open_seconds. half_open: se deja pasar un número limitado de sondas;
+    si todas van bien se cierra, si alguna falla se vuelve a abrir.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        # (timestamp, fallida, lenta)
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self._probes = 0
+        self._probe_successes = 0
+
+    def _prune(self, now: float):
+        limit = now - settings.ai_circuit_window
+        while self._outcomes and self._outcomes[0][0] < limit:
+            _, failed, slow = self._outcomes.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _reset_window(self):
+        self._outcomes.clear()
+        self._failures = self._slow = 0
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        self._reset_window()
+
+    def _retry_in(self, now: float) -> float:
+        return max(0.0, self.opened_at + settings.ai_circuit_open_seconds - now)
+
+    def check(self):
+        """Lanza CircuitOpenError si ahora no se admitiría una llamada."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if self._retry_in(now) > 0:
+                self.rejected += 1
+                raise CircuitOpenError(
+                    f"{self.name} is temporarily unavailable",
+                    retry_after=self._retry_in(now))
+            self.state = HALF_OPEN
+            self._probes = self._probe_successes = 0
+
+        if self.state == HALF_OPEN and self._probes >= settings.ai_circuit_half_open_calls:
+            self.rejected += 1
+            raise CircuitOpenError(
+                f"{self.name} is recovering", retry_after=1)
+
+    def acquire(self):
+        """Admite una llamada (reserva una sonda si está semiabierto)."""
+        self.check()
+        if self.state == HALF_OPEN:
+            self._probes += 1
+
+    def release(self):
+        """La llamada terminó sin resultado útil (p.ej. cancelada)."""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record(self, failed: bool, duration: float):
+        """Registra el resultado de una llamada admitida con acquire()."""
+        now = time.monotonic()
+        slow = duration >= settings.ai_circuit_slow_call
+
+        if self.state == HALF_OPEN:
+            if failed or slow:
+                self._open(now)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= settings.ai_circuit_half_open_calls:
+                self.state = CLOSED
+                self._reset_window()
+            return
+
+        if self.state == OPEN:
+            # Llamada que empezó antes de abrirse el circuito
+            return
+
+        self._outcomes.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+        self._prune(now)
+
+        calls = len(self._outcomes)
+        if calls < settings.ai_circuit_min_calls:
+            return
+        if (
+            self._failures / calls >= settings.ai_circuit_failure_rate
+            or self._slow / calls >= settings.ai_circuit_slow_rate
+        ):
+            self._open(now)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._prune(now)
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "calls": calls,
+            "failure_rate": round(self._failures / calls, 3) if calls else 0.0,
+            "slow_rate": round(self._slow / calls, 3) if calls else 0.0,
+            "retry_in": round(self._retry_in(now), 1) if self.state == OPEN else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class CircuitBreakers:
+    """Breakers por (proveedor, modelo), con LRU para acotar la memoria."""
+
+    def __init__(self):
+        self._breakers: "OrderedDict[Tuple[str, str], CircuitBreaker]" = OrderedDict()
+
+    def get(self, provider: str, model: str) -> CircuitBreaker:
+        key = (provider, model)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(f"{provider}/{model}")
+            self._breakers[key] = breaker
+            while len(self._breakers) > settings.ai_circuit_max_keys:
+                self._breakers.popitem(last=False)
+        else:
+            self._breakers.move_to_end(key)
+        return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {breaker.name: breaker.stats() for breaker in self._breakers.values()}
@@ -0,0 +1,188 @@
+"""
+Compactación de chats largos: cuando el historial posterior al último
+resumen supera compaction_threshold_tokens, un trabajo de baja prioridad en
+el pool de generación resume los mensajes antiguos con un modelo barato y
+guarda el resultado como ChatCheckpoint. El contexto usa ese resumen en
+lugar de los mensajes, así el prompt no crece con el chat.
+"""
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import db
+from app.db.models import ChatCheckpoint, Message
+from app.services.ai_service import ProviderTarget, ai_service
+from app.services.context import history_query, latest_checkpoint
+from app.services.errors import AIServiceError, GenerationQueueFullError
+from app.services.generation_pool import LOW, generation_pool
+from app.services.tokenizer import MESSAGE_OVERHEAD, tokenizer
+
+SUMMARY_PROMPT = (
+    "Resume la conversación siguiente para que un asistente pueda continuarla. "
+    "Conserva hechos, decisiones, datos concretos, preferencias del usuario y "
+    "preguntas pendientes; omite saludos y repeticiones. Escribe el resumen en "
+    "el idioma de la conversación, sin introducciones."
+)
+
+
+def summary_targets(targets: List[ProviderTarget]) -> List[ProviderTarget]:
+    """Los targets del chat con el modelo barato de cada proveedor (COMPACTION_MODELS)."""
+    return [
+        ProviderTarget(
+            provider=target.provider,
+            model=settings.compaction_models.get(target.provider, target.model),
+            api_key=target.api_key
+        )
+        for target in targets
+    ]
+
+
+class Compactor:
+    """
+    Programa y ejecuta compactaciones. Como mucho una por chat y
+    compaction_max_concurrent en total por proceso; lo que no cabe se
+    descarta y se vuelve a pedir en el siguiente turno. La restricción
+    única (chat_id, covered_until) evita resúmenes duplicados entre procesos.
+    """
+
+    def __init__(self):
+        self._running: Set[uuid.UUID] = set()
+        self.scheduled = 0
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.summarised_messages = 0
+        self.summarised_tokens = 0
+        self.summary_tokens = 0
+
+    def schedule(self, chat_id: uuid.UUID, targets: List[ProviderTarget]) -> bool:
+        """Encola la compactación del chat si no hay una en curso y hay sitio."""
+        if not settings.compaction_enabled or chat_id in self._running:
+            return False
+        if len(self._running) >= settings.compaction_max_concurrent:
+            self.skipped += 1
+            return False
+        try:
+            generation_pool.check()
+        except GenerationQueueFullError:
+            self.skipped += 1
+            return False
+
+        self._running.add(chat_id)
+        self.scheduled += 1
+
+        async def job():
+            try:
+                await self.compact(chat_id, summary_targets(targets))
+            finally:
+                self._running.discard(chat_id)
+
+        generation_pool.submit(job, priority=LOW)
+        return True
+
+    async def compact(self, chat_id: uuid.UUID, targets: List[ProviderTarget]) -> Optional[ChatCheckpoint]:
+        """
+        Resume los turnos posteriores al último resumen salvo los más
+        recientes (compaction_keep_tokens). Sin efecto si no hay bastante que
+        resumir, de modo que repetirla es inocua.
+        """
+        session = await db.get_session()
+        try:
+            previous = await latest_checkpoint(session, chat_id)
+            after = previous.covered_until if previous is not None else None
+            result = await session.execute(
+                history_query(chat_id, after)
+                .order_by(Message.created_at.asc())
+                .limit(settings.compaction_max_rows)
+            )
+            rows = [row for row in result if row.content]
+            provider, model = targets[0].provider, targets[0].model
+            counts = [
+                tokens + MESSAGE_OVERHEAD
+                for tokens in tokenizer.count_many([row.content for row in rows], provider, model)
+            ]
+
+            # Se conservan sin resumir los turnos más recientes
+            keep = 0
+            split = len(rows)
+            while split > 0 and keep + counts[split - 1] <= settings.compaction_keep_tokens:
+                split -= 1
+                keep += counts[split]
+            older = rows[:split]
+            older_tokens = sum(counts[:split])
+            if not older or older_tokens < settings.compaction_min_tokens:
+                return None
+
+            transcript = "\n\n".join(f"{row.role}: {row.content}" for row in older)
+            if previous is not None:
+                transcript = f"Resumen anterior:\n{previous.summary}\n\n{transcript}"
+
+            try:
+                target, response = await ai_service.chat_completion_with_fallback(
+                    targets,
+                    [
+                        {"role": "system", "content": SUMMARY_PROMPT},
+                        {"role": "user", "content": transcript}
+                    ],
+                    stream=False,
+                    max_tokens=settings.compaction_summary_tokens
+                )
+            except AIServiceError as e:
+                self.failed += 1
+                logger.warning("Compaction of chat %s failed: %s", chat_id, e)
+                return None
+
+            summary = (response.get("content") or "").strip()
+            if not summary:
+                self.failed += 1
+                return None
+
+            checkpoint = ChatCheckpoint(
+                chat_id=chat_id,
+                summary=summary,
+                covered_until=older[-1].created_at,
+                messages_covered=(previous.messages_covered if previous is not None else 0) + len(older),
+                tokens=tokenizer.count(summary, target.provider, target.model),
+                provider_name=target.provider,
+                model_id=target.model
+            )
+            session.add(checkpoint)
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Otro proceso ya resumió este mismo tramo
+                await session.rollback()
+                self.duplicates += 1
+                return None
+
+            self.completed += 1
+            self.summarised_messages += len(older)
+            self.summarised_tokens += older_tokens
+            self.summary_tokens += checkpoint.tokens
+            logger.info("Compacted %d messages of chat %s (%d -> %d tokens)",
+                        len(older), chat_id, older_tokens, checkpoint.tokens)
+            return checkpoint
+        finally:
+            await session.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.compaction_enabled,
+            "running": len(self._running),
+            "max_concurrent": settings.compaction_max_concurrent,
+            "scheduled": self.scheduled,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "summarised_messages": self.summarised_messages,
+            "summarised_tokens": self.summarised_tokens,
+            "summary_tokens": self.summary_tokens
+        }
+
+
+compactor = Compactor()
@@ -0,0 +1,135 @@
+"""
+Contexto de la conversación armado en el servidor: el cliente envía solo el
+mensaje nuevo y el chat_id, y aquí se leen los últimos mensajes guardados
+hasta llenar el presupuesto de tokens del modelo (ventana deslizante con el
+prompt de sistema y el último resumen de compactación fijos al inicio).
+"""
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import ChatCheckpoint, Message
+from app.services.message_writer import FAILED, STREAMING
+from app.services.tokenizer import MESSAGE_OVERHEAD, tokenizer
+
+
+def token_budget(model: str) -> int:
+    """Presupuesto de tokens de entrada del modelo (override o valor por defecto)."""
+    return settings.context_model_budgets.get(model, settings.context_token_budget)
+
+
+def context_limit(model: str) -> int:
+    """Tokens máximos del prompt para el modelo (0 = sin límite)."""
+    return settings.context_model_limits.get(model, settings.context_limit)
+
+
+def summary_message(summary: str) -> Dict[str, str]:
+    return {"role": "system", "content": f"Resumen de la conversación anterior:\n{summary}"}
+
+
+def history_query(chat_id: uuid.UUID, after: Optional[datetime] = None) -> Select:
+    """
+    Rol, contenido y fecha de los turnos del chat posteriores a `after`,
+    sin ordenar. Ni respuestas en curso ni rechazadas (sin contenido útil).
+    """
+    query = select(Message.role, Message.content, Message.created_at).where(
+        Message.chat_id == chat_id,
+        Message.role != "system",
+        Message.status.notin_((STREAMING, FAILED))
+    )
+    if after is not None:
+        query = query.where(Message.created_at > after)
+    return query
+
+
+async def pinned_system_prompt(session: AsyncSession, chat_id: uuid.UUID) -> Optional[str]:
+    """Primer mensaje de sistema guardado en el chat, si lo hay."""
+    result = await session.execute(
+        select(Message.content)
+        .where(Message.chat_id == chat_id, Message.role == "system")
+        .order_by(Message.created_at.asc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def latest_checkpoint(session: AsyncSession, chat_id: uuid.UUID) -> Optional[ChatCheckpoint]:
+    """Resumen más reciente del chat (el que cubre más mensajes)."""
+    result = await session.execute(
+        select(ChatCheckpoint)
+        .where(ChatCheckpoint.chat_id == chat_id)
+        .order_by(ChatCheckpoint.covered_until.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+class ConversationContext:
+    """Mensajes para el proveedor y tokens del historial sin compactar."""
+
+    def __init__(self, messages: List[Dict[str, str]], pending_tokens: int = 0):
+        self.messages = messages
+        # Turnos guardados posteriores al último resumen (leídos en este turno)
+        self.pending_tokens = pending_tokens
+
+
+async def assemble_context(
+    session: AsyncSession,
+    chat_id: uuid.UUID,
+    new_message: str,
+    provider: str,
+    model: str,
+    system: Optional[str] = None,
+    load_history: bool = True
+) -> ConversationContext:
+    """
+    Sistema, último resumen, los turnos posteriores más recientes que caben
+    en el presupuesto y el mensaje nuevo. Se leen como mucho
+    context_max_rows filas, de la más nueva a la más antigua, por el índice
+    (chat_id, created_at); solo se cargan rol y contenido.
+    """
+    if not load_history:
+        pinned = [{"role": "system", "content": system}] if system is not None else []
+        return ConversationContext(pinned + [{"role": "user", "content": new_message}])
+
+    if system is None:
+        system = await pinned_system_prompt(session, chat_id)
+    checkpoint = await latest_checkpoint(session, chat_id)
+
+    pinned = [{"role": "system", "content": system}] if system is not None else []
+    if checkpoint is not None:
+        pinned.append(summary_message(checkpoint.summary))
+
+    budget = token_budget(model) - tokenizer.count_messages(
+        pinned + [{"content": new_message}], provider, model)
+
+    history: List[Dict[str, str]] = []
+    pending = 0
+    result = await session.execute(
+        history_query(chat_id, checkpoint.covered_until if checkpoint is not None else None)
+        .order_by(Message.created_at.desc())
+        .limit(settings.context_max_rows)
+    )
+    rows = [(role, content) for role, content, _ in result if content]
+    # Todo el historial leído se cuenta en un solo lote
+    counts = tokenizer.count_many([content for _, content in rows], provider, model)
+    for (role, content), tokens in zip(rows, counts):
+        tokens += MESSAGE_OVERHEAD
+        pending += tokens
+        if tokens <= budget:
+            budget -= tokens
+            history.append({"role": role, "content": content})
+        else:
+            # Ventana completa; el resto solo cuenta para la compactación
+            budget = 0
+    history.reverse()
+    # La ventana empieza en un turno del usuario (algunos proveedores lo exigen)
+    while history and history[0]["role"] != "user":
+        history.pop(0)
+
+    return ConversationContext(
+        pinned + history + [{"role": "user", "content": new_message}], pending)
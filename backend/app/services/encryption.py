@@ -1,23 +1,49 @@
 """
 Servicio de cifrado usando Fernet (AES-128).
 """
-from cryptography.fernet import Fernet, InvalidToken
-from typing import Optional
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import hashlib
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.logger import logger
 
 
+def _build_multifernet(master_key: str, previous_keys: Sequence[str]) -> MultiFernet:
+    """MultiFernet con la clave principal primero y las anteriores detrás."""
+    return MultiFernet([Fernet(k.encode()) for k in (master_key, *previous_keys)])
+
+
+def _zero_entry(_key: Hashable, entry: Tuple[bytes, bytearray]):
+    """Sobrescribe el texto plano al expulsarlo de la caché."""
+    plaintext = entry[1]
+    plaintext[:] = bytes(len(plaintext))
+
+
 class EncryptionService:
     """Servicio de cifrado simétrico usando Fernet."""
 
-    def __init__(self, master_key: Optional[str] = None):
+    def __init__(
+        self,
+        master_key: Optional[str] = None,
+        previous_keys: Optional[List[str]] = None
+    ):
         """
         Args:
             master_key: Clave opcional. Si no se pasa, usa settings.master_key
+            previous_keys: Claves antiguas válidas solo para descifrar.
+                Si no se pasan, usa settings.master_key_previous
         """
         self._master_key = master_key
-        self._cipher: Optional[Fernet] = None
+        self._previous_keys = previous_keys
+        self._cipher: Optional[MultiFernet] = None
         self._initialized = False
+        # cache_id -> (sha256 del ciphertext, texto plano)
+        self._plaintext_cache: TTLCache[Tuple[bytes, bytearray]] = TTLCache(
+            max_size=settings.key_cache_size,
+            default_ttl=settings.key_cache_ttl,
+            on_evict=_zero_entry
+        )
 
     def _ensure_initialized(self):
         """Inicializa el cipher solo cuando se necesita."""
@@ -28,7 +54,11 @@ class EncryptionService:
             key = self._master_key or settings.master_key
             if not key:
                 raise ValueError("No master key provided")
-            self._cipher = Fernet(key.encode())
+            previous = self._previous_keys
+            if previous is None:
+                previous = settings.previous_master_keys
+            # Cifra con la primera clave; descifra con cualquiera (rotación)
+            self._cipher = _build_multifernet(key, previous)
             self._initialized = True
         except Exception as e:
             logger.error(f"Failed to initialize encryption: {e}")
@@ -38,7 +68,7 @@ class EncryptionService:
             ) from e
 
     @property
-    def cipher(self) -> Fernet:
+    def cipher(self) -> MultiFernet:
         """Retorna el cipher inicializado."""
         self._ensure_initialized()
         if self._cipher is None:
@@ -60,11 +90,40 @@ class EncryptionService:
         except InvalidToken:
             raise ValueError("Invalid encrypted token")
 
+    def decrypt_cached(self, cache_id: str, encrypted_text: str) -> str:
+        """
+        Descifra usando la caché en memoria.
+
+        Args:
+            cache_id: Identificador estable del secreto (p.ej. id de AIConfig)
+            encrypted_text: Texto cifrado; si cambia, la entrada se descarta
+        """
+        digest = hashlib.sha256(encrypted_text.encode()).digest()
+        entry = self._plaintext_cache.get(cache_id)
+        if entry is not None and entry[0] == digest:
+            return entry[1].decode()
+
+        plaintext = self.decrypt(encrypted_text)
+        self._plaintext_cache.set(
+            cache_id, (digest, bytearray(plaintext.encode())))
+        return plaintext
+
+    def invalidate(self, cache_id: str):
+        """Descarta (y sobrescribe) el texto plano cacheado de un secreto."""
+        self._plaintext_cache.pop(cache_id)
+
+    def clear_cache(self):
+        """Descarta todos los textos planos cacheados."""
+        self._plaintext_cache.clear()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Contadores de la caché de descifrado."""
+        return self._plaintext_cache.stats()
+
     def rotate_key(self, encrypted_text: str, old_key: str) -> str:
         """Re-cifra con clave actual después de descifrar con clave antigua."""
-        old_cipher = Fernet(old_key.encode())
-        plaintext = old_cipher.decrypt(encrypted_text.encode()).decode()
-        return self.encrypt(plaintext)
+        rotator = MultiFernet([self.cipher, Fernet(old_key.encode())])
+        return rotator.rotate(encrypted_text.encode()).decode()
 
     def validate(self, encrypted_text: str) -> bool:
         """Valida si el texto puede descifrarse."""
@@ -75,6 +134,26 @@ class EncryptionService:
             return False
 
 
+def rotate_tokens(
+    tokens: Sequence[str],
+    master_key: str,
+    previous_keys: Sequence[str]
+) -> List[Optional[str]]:
+    """
+    Re-cifra un lote de tokens con master_key (usado por la rotación masiva).
+    Retorna None para los tokens que ninguna clave puede descifrar.
+    Es una función de módulo para poder ejecutarse en un ProcessPoolExecutor.
+    """
+    rotator = _build_multifernet(master_key, previous_keys)
+    rotated: List[Optional[str]] = []
+    for token in tokens:
+        try:
+            rotated.append(rotator.rotate(token.encode()).decode())
+        except InvalidToken:
+            rotated.append(None)
+    return rotated
+
+
 def generate_master_key() -> str:
     """Genera una MASTER_KEY válida para Fernet."""
     return Fernet.generate_key().decode()
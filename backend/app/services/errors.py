@@ -0,0 +1,66 @@
+"""
+Errores del servicio de IA con el código HTTP que deben producir.
+"""
+from typing import Dict, Mapping, Optional
+
+
+class AIServiceError(Exception):
+    """Error base del servicio de IA."""
+
+    status_code = 502
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    def headers(self) -> Optional[Dict[str, str]]:
+        """Cabeceras HTTP para la respuesta de error."""
+        if self.retry_after is None:
+            return None
+        return {"Retry-After": str(max(1, round(self.retry_after)))}
+
+
+class ProviderOverloadedError(AIServiceError):
+    """La cola de admisión del proveedor está llena o se agotó la espera."""
+
+    status_code = 503
+
+
+class ProviderHTTPError(AIServiceError):
+    """El proveedor respondió con un código distinto de 200."""
+
+    def __init__(
+        self,
+        message: str,
+        status: int,
+        headers: Optional[Mapping[str, str]] = None,
+        retry_after: Optional[float] = None
+    ):
+        super().__init__(message, retry_after=retry_after)
+        self.status = status
+        self.response_headers = headers or {}
+
+    @property
+    def status_code(self) -> int:
+        # Los límites del proveedor se propagan tal cual; el resto es un 502
+        if self.status == 429:
+            return 429
+        if self.status in (503, 529):
+            return 503
+        return 502
+
+
+class ProviderUnavailableError(AIServiceError):
+    """No se pudo conectar con el proveedor o la respuesta se cortó."""
+
+
+class CircuitOpenError(AIServiceError):
+    """El circuito del proveedor/modelo está abierto por fallos recientes."""
+
+    status_code = 503
+
+
+class GenerationQueueFullError(AIServiceError):
+    """La cola de generaciones en segundo plano está llena."""
+
+    status_code = 503
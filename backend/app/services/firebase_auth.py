@@ -0,0 +1,152 @@
+"""
+Verificación local de ID tokens de Firebase (RS256) sin llamar a la API REST.
+Los certificados públicos de Google se cachean según su Cache-Control max-age.
+"""
+import asyncio
+import re
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from jose import jwk, jwt
+from jose.backends.base import Key
+from jose.exceptions import JOSEError
+
+from app.core.config import settings
+from app.core.logger import logger
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class InvalidFirebaseToken(ValueError):
+    """El token no es un ID token de Firebase válido."""
+
+
+class FirebaseTokenVerifier:
+    """Valida firma, aud, iss y exp de ID tokens usando certificados cacheados."""
+
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        certs_url: Optional[str] = None,
+        leeway: Optional[int] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            project_id: Proyecto Firebase. Si no se pasa, usa settings.firebase_project_id
+            certs_url: Endpoint de certificados. Si no se pasa, usa settings.firebase_certs_url
+            leeway: Tolerancia de reloj en segundos para exp/iat
+            transport: Transporte httpx para descargar los certificados (tests)
+        """
+        self._project_id = project_id
+        self._certs_url = certs_url
+        self._leeway = leeway
+        self._keys: Dict[str, Key] = {}
+        self._expires_at = 0.0
+        self._last_fetch = 0.0
+        self._lock = asyncio.Lock()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def project_id(self) -> str:
+        return self._project_id or settings.firebase_project_id
+
+    @property
+    def certs_url(self) -> str:
+        return self._certs_url or settings.firebase_certs_url
+
+    @property
+    def leeway(self) -> int:
+        return settings.firebase_clock_skew if self._leeway is None else self._leeway
+
+    async def _fetch_keys(self):
+        """Descarga los certificados y programa el refresco por max-age."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10.0, transport=self._transport)
+
+        self._last_fetch = time.monotonic()
+        response = await self._client.get(self.certs_url)
+        response.raise_for_status()
+
+        keys = {
+            kid: jwk.construct(cert, "RS256")
+            for kid, cert in response.json().items()
+        }
+        match = _MAX_AGE_RE.search(response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else 3600
+
+        self._keys = keys
+        self._expires_at = time.monotonic() + max_age
+        logger.info(
+            "Loaded %d Firebase signing keys (max-age=%ds)", len(keys), max_age)
+
+    def _needs_refresh(self, kid: str) -> bool:
+        now = time.monotonic()
+        if now >= self._expires_at:
+            return True
+        # Un kid desconocido puede indicar rotación: refrescar como mucho 1/min
+        return kid not in self._keys and now - self._last_fetch > 60
+
+    async def _get_key(self, kid: str) -> Key:
+        """Retorna la clave del kid, refrescando si caducó o es desconocido."""
+        if self._needs_refresh(kid):
+            async with self._lock:
+                if self._needs_refresh(kid):
+                    try:
+                        await self._fetch_keys()
+                    except (httpx.HTTPError, ValueError, JOSEError) as e:
+                        # Con certificados previos se sigue operando
+                        logger.error("Error fetching Firebase certs: %s", e)
+                        if not self._keys:
+                            raise
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise InvalidFirebaseToken("Unknown signing key")
+        return key
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Verifica el token y retorna sus claims."""
+        if not self.project_id:
+            raise RuntimeError("FIREBASE_PROJECT_ID not configured")
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except JOSEError as e:
+            raise InvalidFirebaseToken("Malformed token") from e
+
+        if header.get("alg") != "RS256" or not header.get("kid"):
+            raise InvalidFirebaseToken("Unexpected token header")
+
+        key = await self._get_key(header["kid"])
+
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=f"https://securetoken.google.com/{self.project_id}",
+                options={"leeway": self.leeway, "verify_at_hash": False}
+            )
+        except JOSEError as e:
+            raise InvalidFirebaseToken(str(e)) from e
+
+        if not claims.get("sub"):
+            raise InvalidFirebaseToken("Token has no subject")
+        if claims.get("auth_time", 0) > time.time() + self.leeway:
+            raise InvalidFirebaseToken("Token auth_time is in the future")
+
+        return claims
+
+    async def aclose(self):
+        """Cierra el cliente HTTP de certificados."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Instancia global (lazy)
+firebase_verifier = FirebaseTokenVerifier()
@@ -0,0 +1,111 @@
+"""
+Pool de workers en proceso para generaciones en segundo plano: la llamada
+al proveedor ya no depende de la petición HTTP que la pidió, y el número de
+llamadas simultáneas lo fija el pool y no el de clientes conectados.
+"""
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import Histogram
+from app.services.errors import GenerationQueueFullError
+
+# Prioridades (menor = antes)
+HIGH = 0      # hay un cliente siguiendo el stream
+NORMAL = 1    # el cliente consultará el resultado más tarde
+LOW = 2       # tareas de mantenimiento
+
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class GenerationPool:
+    """Cola con prioridades (FIFO dentro de cada una) y N workers."""
+
+    def __init__(self):
+        self._queue: "asyncio.PriorityQueue[Tuple[int, int, float, Job]]" = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queued: Dict[int, int] = {p: 0 for p in PRIORITY_NAMES}
+        self._wait_times: Dict[int, Histogram] = {p: Histogram() for p in PRIORITY_NAMES}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        if self._workers:
+            return
+        connections = settings.db_pool_size + settings.db_max_overflow
+        if settings.generation_workers >= connections:
+            logger.warning(
+                "GENERATION_WORKERS (%d) >= database pool (%d): requests may wait for connections",
+                settings.generation_workers, connections)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"generation-worker-{i}")
+            for i in range(settings.generation_workers)
+        ]
+        logger.info("Generation pool ready (%d workers)", len(self._workers))
+
+    async def stop(self):
+        """Cancela los workers; lo encolado se pierde (queda como 'streaming' en la BD)."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def check(self):
+        """Rechaza de inmediato (503) si la cola está llena."""
+        if self._queue.qsize() >= settings.generation_max_queue:
+            self.rejected += 1
+            raise GenerationQueueFullError("Generation queue is full", retry_after=1)
+
+    def submit(self, job: Job, priority: int = NORMAL):
+        """Encola un trabajo; usar check() antes de comprometer recursos."""
+        self._queued[priority] += 1
+        self._queue.put_nowait((priority, next(self._order), time.monotonic(), job))
+
+    async def _worker(self):
+        while True:
+            priority, _, queued_at, job = await self._queue.get()
+            self._queued[priority] -= 1
+            self._wait_times[priority].observe(time.monotonic() - queued_at)
+            self.active += 1
+            try:
+                await job()
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error("Background generation failed: %s", e)
+            finally:
+                self.active -= 1
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._workers),
+            "active": self.active,
+            "queue_depth": self._queue.qsize(),
+            "max_queue": settings.generation_max_queue,
+            "queued": {PRIORITY_NAMES[p]: n for p, n in self._queued.items()},
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_seconds": {
+                PRIORITY_NAMES[p]: histogram.snapshot()
+                for p, histogram in self._wait_times.items()
+            }
+        }
+
+
+generation_pool = GenerationPool()
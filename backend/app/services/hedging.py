@@ -0,0 +1,49 @@
+"""
+Hedging de streams: si el primer token tarda más que el percentil habitual
+del proveedor, se lanza la misma petición a otro proveedor y gana el primero.
+"""
+from typing import Any, Dict
+
+from app.core.config import settings
+from app.core.metrics import RollingWindow
+
+
+class HedgeTracker:
+    """TTFT reciente por proveedor y coste de los hedges lanzados."""
+
+    def __init__(self):
+        self._ttft: Dict[str, RollingWindow] = {}
+        self.launched = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        # Tokens de entrada (estimados) enviados a la petición perdedora
+        self.wasted_tokens = 0
+
+    def observe_ttft(self, provider: str, seconds: float):
+        window = self._ttft.get(provider)
+        if window is None:
+            window = RollingWindow(settings.ai_ttft_window)
+            self._ttft[provider] = window
+        window.observe(seconds)
+
+    def delay(self, provider: str) -> float:
+        """Espera antes de lanzar el hedge, según el TTFT del proveedor."""
+        window = self._ttft.get(provider)
+        if window is None or len(window) < settings.ai_hedge_min_samples:
+            return settings.ai_hedge_default_delay
+        return min(
+            settings.ai_hedge_max_delay,
+            max(settings.ai_hedge_min_delay, window.quantile(settings.ai_hedge_percentile))
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "launched": self.launched,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "wasted_tokens": self.wasted_tokens,
+            "ttft": {
+                provider: {**window.snapshot(), "hedge_delay": round(self.delay(provider), 3)}
+                for provider, window in self._ttft.items()
+            }
+        }
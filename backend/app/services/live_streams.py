@@ -0,0 +1,242 @@
+"""
+Generaciones en curso reanudables: la respuesta la produce una tarea propia
+y los clientes la siguen desde un anillo acotado de fragmentos numerados
+(campo `id:` de SSE). Un cliente que pierde la conexión vuelve a engancharse
+con Last-Event-ID sin pagar otra generación.
+"""
+import asyncio
+import uuid
+from collections import deque
+from itertools import islice
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.core import json_codec
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.streaming import SSEFrameEncoder, stream_stats
+
+
+RESET = "reset"
+CONTENT = "content"
+FINAL = "final"
+
+# (tipo, número de secuencia, texto o payload final)
+LiveEvent = Tuple[str, int, Any]
+
+
+def sse_data(payload: Dict[str, Any]) -> bytes:
+    """Frame SSE con un JSON arbitrario (done, error, reset)."""
+    return b"data: " + json_codec.dumps(payload) + b"\n\n"
+
+
+class LiveStream:
+    """
+    Fragmentos de una generación con su número de secuencia. Se retienen
+    los últimos stream_resume_buffer_chars caracteres; si un cliente pide
+    algo anterior recibe el contenido completo en un frame `reset`.
+    """
+
+    def __init__(
+        self,
+        message_id: str,
+        chat_id: str,
+        profile_id: uuid.UUID,
+        cancel_on_detach: bool = True
+    ):
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.profile_id = profile_id
+        # False en generaciones en segundo plano: siguen sin clientes conectados
+        self.cancel_on_detach = cancel_on_detach
+        self.cancel_requested = False
+        self.task: Optional[asyncio.Task] = None
+        # Contenido completo mientras la generación sigue (lo aporta el productor)
+        self.content: Optional[Callable[[], str]] = None
+        self.final: Optional[Dict[str, Any]] = None
+        self.subscribers = 0
+        self._chunks: Deque[str] = deque()
+        self._chars = 0
+        self._first_seq = 0
+        self._next_seq = 0
+        self._wake = asyncio.Event()
+        self._detach_timer: Optional[asyncio.TimerHandle] = None
+        self._frames = SSEFrameEncoder(chat_id)
+
+    @property
+    def done(self) -> bool:
+        return self.final is not None
+
+    @property
+    def buffered_chars(self) -> int:
+        return self._chars
+
+    def can_resume(self, last_event_id: int) -> bool:
+        """Si se puede continuar desde last_event_id sin ir a la base de datos."""
+        return not self.done or last_event_id + 1 >= self._first_seq
+
+    def publish(self, text: str):
+        self._chunks.append(text)
+        self._chars += len(text)
+        self._next_seq += 1
+        while self._chars > settings.stream_resume_buffer_chars and len(self._chunks) > 1:
+            self._chars -= len(self._chunks.popleft())
+            self._first_seq += 1
+        self._notify()
+
+    def close(self, final: Dict[str, Any]):
+        """Fin de la generación: frame final para los clientes y sin más contenido."""
+        self.final = final
+        self.content = None
+        self._cancel_detach_timer()
+        self._notify()
+
+    def _notify(self):
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    def _cancel_detach_timer(self):
+        if self._detach_timer is not None:
+            self._detach_timer.cancel()
+            self._detach_timer = None
+
+    def _detach(self):
+        """El último cliente se fue: cancelar si nadie vuelve a tiempo."""
+        if self.done or not self.cancel_on_detach:
+            return
+        timeout = settings.stream_detach_timeout
+        if timeout <= 0:
+            self._abandon()
+        else:
+            self._detach_timer = asyncio.get_running_loop().call_later(timeout, self._abandon)
+
+    def _abandon(self):
+        self._detach_timer = None
+        if self.subscribers == 0 and not self.done and self.task is not None:
+            logger.info("Cancelling stream %s: no client reconnected", self.message_id)
+            self.task.cancel()
+
+    def cancel(self):
+        """Cancelación pedida por el cliente (también si aún está en cola)."""
+        self.cancel_requested = True
+        if self.task is not None and not self.done:
+            self.task.cancel()
+
+    def follow(self, last_event_id: int = -1) -> AsyncIterator[LiveEvent]:
+        """
+        Eventos desde last_event_id + 1 y después en directo: (RESET, seq,
+        contenido completo), (CONTENT, seq, texto) y (FINAL, seq, payload).
+        El punto de partida se fija aquí, de forma síncrona, para no competir
+        con el cierre.
+        """
+        reset: Optional[str] = None
+        seq = last_event_id
+        if last_event_id + 1 < self._first_seq and self.content is not None:
+            # Lo pedido ya salió del anillo: se reenvía todo lo generado
+            reset = self.content()
+            seq = self._next_seq - 1
+        elif last_event_id + 1 < self._first_seq:
+            seq = self._first_seq - 1
+        if last_event_id >= 0:
+            stream_stats.resumes += 1
+        return self._follow(seq, reset)
+
+    async def _follow(self, seq: int, reset: Optional[str]) -> AsyncIterator[LiveEvent]:
+        self.subscribers += 1
+        self._cancel_detach_timer()
+        try:
+            if reset is not None:
+                yield RESET, seq, reset
+            while True:
+                if seq + 1 < self._next_seq:
+                    # Lo pendiente va en un solo evento (cliente lento = eventos mayores)
+                    start = max(seq + 1, self._first_seq) - self._first_seq
+                    text = "".join(islice(self._chunks, start, None))
+                    seq = self._next_seq - 1
+                    yield CONTENT, seq, text
+                    continue
+                if self.final is not None:
+                    yield FINAL, seq, self.final
+                    return
+                await self._wake.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self._detach()
+
+    async def subscribe(self, last_event_id: int = -1) -> AsyncIterator[bytes]:
+        """Frames SSE (con `id:`) de follow()."""
+        events = self.follow(last_event_id)
+        try:
+            async for kind, seq, payload in events:
+                if kind == CONTENT:
+                    yield self._frames.content(payload, seq)
+                elif kind == RESET:
+                    yield b"id: %d\n" % seq + sse_data(
+                        {"reset": True, "content": payload, "chat_id": self.chat_id})
+                else:
+                    yield sse_data(payload)
+        finally:
+            await events.aclose()
+
+
+class LiveStreamRegistry:
+    """Generaciones en curso y terminadas hace menos de stream_resume_grace."""
+
+    def __init__(self):
+        self._streams: Dict[str, LiveStream] = {}
+
+    def open(
+        self,
+        message_id: str,
+        chat_id: str,
+        profile_id: uuid.UUID,
+        cancel_on_detach: bool = True
+    ) -> LiveStream:
+        """Registra la generación; los clientes pueden suscribirse ya."""
+        live = LiveStream(message_id, chat_id, profile_id, cancel_on_detach)
+        self._streams[message_id] = live
+        return live
+
+    def launch(self, live: LiveStream, producer: Callable[[LiveStream], Awaitable[None]]) -> asyncio.Task:
+        """Lanza la tarea productora; al terminar se programa el desalojo."""
+        live.task = asyncio.create_task(producer(live))
+        live.task.add_done_callback(lambda _: self._finished(live))
+        return live.task
+
+    async def run(self, live: LiveStream, producer: Callable[[LiveStream], Awaitable[None]]):
+        """Como launch(), esperando a que termine (para el pool de generación)."""
+        task = self.launch(live, producer)
+        try:
+            await asyncio.wait([task])
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+    def _finished(self, live: LiveStream):
+        task = live.task
+        if task is not None and not task.cancelled() and task.exception() is not None:
+            logger.error("Stream %s failed: %s", live.message_id, task.exception())
+        if not live.done:
+            # El productor no cerró el stream: no dejar clientes esperando
+            live.close({"error": "Stream ended unexpectedly"})
+        asyncio.get_running_loop().call_later(
+            settings.stream_resume_grace, self._evict, live)
+
+    def _evict(self, live: LiveStream):
+        if self._streams.get(live.message_id) is live:
+            del self._streams[live.message_id]
+
+    def get(self, message_id: str) -> Optional[LiveStream]:
+        return self._streams.get(message_id)
+
+    def stats(self) -> Dict[str, Any]:
+        streams = list(self._streams.values())
+        return {
+            "running": sum(1 for s in streams if not s.done),
+            "detached": sum(1 for s in streams if not s.done and s.subscribers == 0),
+            "retained": sum(1 for s in streams if s.done),
+            "buffered_chars": sum(s.buffered_chars for s in streams)
+        }
+
+
+live_streams = LiveStreamRegistry()
@@ -0,0 +1,121 @@
+"""
+Persistencia incremental de las respuestas en streaming: el mensaje se crea
+antes del primer token y se actualiza por tramos, de modo que si el worker
+muere a mitad de respuesta se conserva lo generado hasta el último tramo.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Set
+
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import db
+from app.db.models import Message
+from app.services.streaming import stream_stats
+
+STREAMING = "streaming"
+COMPLETE = "complete"
+TRUNCATED = "truncated"
+FAILED = "failed"
+
+# Guardados finales en curso (referencia fuerte hasta que terminen)
+_final_saves: Set[asyncio.Task] = set()
+
+
+class StreamingMessageWriter:
+    """
+    Acumula los fragmentos en una lista y guarda el contenido con un UPDATE
+    cada stream_checkpoint_seconds o stream_checkpoint_chars nuevos. Cada
+    escritura usa su propia sesión: la del request se cierra antes de que
+    empiece el cuerpo de la respuesta.
+    """
+
+    def __init__(self, message_id: uuid.UUID):
+        self.message_id = message_id
+        self._parts: List[str] = []
+        self._chars = 0
+        self._saved_chars = 0
+        self._saved_at = time.monotonic()
+        self._pending: Optional[asyncio.Task] = None
+
+    @property
+    def chars(self) -> int:
+        return self._chars
+
+    @property
+    def content(self) -> str:
+        return "".join(self._parts)
+
+    def append(self, text: str):
+        """Añade un fragmento; lanza un checkpoint en segundo plano si toca."""
+        self._parts.append(text)
+        self._chars += len(text)
+        if self._pending is not None and not self._pending.done():
+            # Un checkpoint a la vez; el siguiente recogerá lo acumulado
+            return
+        if (
+            self._chars - self._saved_chars >= settings.stream_checkpoint_chars
+            or time.monotonic() - self._saved_at >= settings.stream_checkpoint_seconds
+        ):
+            self._pending = asyncio.create_task(self._checkpoint())
+
+    async def _write(self, **values: Any):
+        session = await db.get_session()
+        try:
+            await session.execute(
+                update(Message).where(Message.id == self.message_id).values(**values))
+            await session.commit()
+        finally:
+            await session.close()
+
+    async def _checkpoint(self):
+        chars = self._chars
+        self._saved_at = time.monotonic()
+        try:
+            await self._write(content=self.content)
+            self._saved_chars = chars
+            stream_stats.checkpoints += 1
+        except (SQLAlchemyError, OSError) as e:
+            # No cortar el stream; el siguiente checkpoint o el final lo reintentan
+            logger.warning("Checkpoint of message %s failed: %s", self.message_id, e)
+
+    async def finish(self, status: str, tokens_used: Optional[int] = None, **values: Any) -> str:
+        """
+        Escribe el contenido final y el estado (más columnas en `values`, p.ej.
+        el proveedor que acabó respondiendo); espera al checkpoint en curso.
+        El guardado va en su propia tarea: si quien espera se cancela (timer
+        de desconexión, `cancel` por WebSocket, cierre del pool), termina igual
+        y el mensaje no se queda en 'streaming'.
+        """
+        content = self.content
+        task = asyncio.ensure_future(self._finish(content, status, tokens_used, **values))
+        _final_saves.add(task)
+        task.add_done_callback(_final_saves.discard)
+        await asyncio.shield(task)
+        return content
+
+    async def _finish(self, content: str, status: str, tokens_used: Optional[int], **values: Any):
+        if self._pending is not None:
+            await asyncio.wait([self._pending])
+        await self._write(content=content, status=status, tokens_used=tokens_used, **values)
+
+
+async def close_abandoned_streams(session: AsyncSession) -> int:
+    """
+    Marca como truncados los mensajes que siguen en 'streaming' desde hace
+    más de stream_abandoned_after (el worker que los escribía murió).
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.stream_abandoned_after)
+    result = await session.execute(
+        update(Message)
+        .where(Message.status == STREAMING, Message.created_at < cutoff)
+        .values(status=TRUNCATED)
+    )
+    await session.commit()
+    return result.rowcount
@@ -0,0 +1,26 @@
+"""
+Cursores opacos para paginación por keyset: codifican la clave de orden
+(fecha, id) de la última fila servida, de modo que la página siguiente es un
+rango del índice y no un OFFSET que recorre lo ya visto.
+"""
+import base64
+import uuid
+from datetime import datetime
+from typing import Tuple
+
+from app.core import json_codec
+
+
+def encode_cursor(moment: datetime, row_id: uuid.UUID) -> str:
+    raw = json_codec.dumps([moment.isoformat(), str(row_id)])
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Lanza ValueError si el cursor no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        moment, row_id = json_codec.loads(raw)
+        return datetime.fromisoformat(moment), uuid.UUID(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,129 @@
+"""
+Resolución de perfiles con sus configuraciones de IA en una sola consulta,
+con caché en memoria por firebase_uid.
+"""
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.models import AIConfig, Profile
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Copia inmutable de una fila de ai_configs."""
+    id: uuid.UUID
+    provider_name: str
+    selected_model: str
+    encrypted_key: str
+    custom_params: Dict[str, Any]
+    is_active: bool
+
+
+@dataclass(frozen=True)
+class ProfileSnapshot:
+    """Copia inmutable de un perfil y sus configuraciones (sin sesión ORM)."""
+    id: uuid.UUID
+    firebase_uid: str
+    email: str
+    display_name: Optional[str]
+    avatar_url: Optional[str]
+    ui_config: Dict[str, Any]
+    configs: Tuple[ConfigSnapshot, ...] = field(default_factory=tuple)
+
+    def get_config(self, provider_name: str) -> Optional[ConfigSnapshot]:
+        """Config del proveedor, activa o no."""
+        for config in self.configs:
+            if config.provider_name == provider_name:
+                return config
+        return None
+
+    def active_config(self, provider_name: str) -> Optional[ConfigSnapshot]:
+        """Config activa del proveedor."""
+        config = self.get_config(provider_name)
+        return config if config is not None and config.is_active else None
+
+    def fallback_chain(self, provider_name: str, model: str) -> List[Tuple[ConfigSnapshot, str]]:
+        """
+        Configs (y modelo) a probar en orden: la del proveedor pedido y
+        después las de custom_params["fallback_providers"] que estén activas.
+        Cada entrada es "proveedor" o {"provider": ..., "model": ...}.
+        """
+        primary = self.active_config(provider_name)
+        if primary is None:
+            return []
+
+        chain = [(primary, model)]
+        seen = {provider_name}
+        fallbacks = primary.custom_params.get("fallback_providers")
+        for entry in fallbacks if isinstance(fallbacks, list) else []:
+            if isinstance(entry, dict):
+                name, fallback_model = entry.get("provider"), entry.get("model")
+            else:
+                name, fallback_model = entry, None
+            if not isinstance(name, str) or name in seen:
+                continue
+            config = self.active_config(name)
+            if config is None:
+                continue
+            seen.add(name)
+            chain.append((config, fallback_model or config.selected_model))
+        return chain
+
+
+# firebase_uid -> ProfileSnapshot
+profile_cache: TTLCache[ProfileSnapshot] = TTLCache(
+    max_size=settings.profile_cache_size,
+    default_ttl=settings.profile_cache_ttl
+)
+
+
+async def load_profile(db: AsyncSession, firebase_uid: str) -> Optional[ProfileSnapshot]:
+    """Carga perfil + configs con un LEFT JOIN, usando la caché si es posible."""
+    cached = profile_cache.get(firebase_uid)
+    if cached is not None:
+        return cached
+
+    result = await db.execute(
+        select(Profile, AIConfig)
+        .outerjoin(AIConfig, AIConfig.profile_id == Profile.id)
+        .where(Profile.firebase_uid == firebase_uid)
+        .order_by(AIConfig.created_at)
+    )
+    rows = result.all()
+
+    if not rows:
+        return None
+
+    profile = rows[0][0]
+    snapshot = ProfileSnapshot(
+        id=profile.id,
+        firebase_uid=profile.firebase_uid,
+        email=profile.email,
+        display_name=profile.display_name,
+        avatar_url=profile.avatar_url,
+        ui_config=profile.ui_config or {},
+        configs=tuple(
+            ConfigSnapshot(
+                id=config.id,
+                provider_name=config.provider_name,
+                selected_model=config.selected_model,
+                encrypted_key=config.encrypted_key,
+                custom_params=config.custom_params or {},
+                is_active=config.is_active
+            )
+            for _, config in rows if config is not None
+        )
+    )
+    profile_cache.set(firebase_uid, snapshot)
+    return snapshot
+
+
+def invalidate_profile(firebase_uid: str):
+    """Descarta el perfil cacheado tras modificar el perfil o sus configs."""
+    profile_cache.pop(firebase_uid)
@@ -0,0 +1,12 @@
+# Provider adapters
+from app.services.providers.base import ProviderAdapter, ProviderRequest
+from app.services.providers.openai_compat import OpenAICompatibleAdapter
+from app.services.providers.registry import ProviderRegistry, default_registry
+
+__all__ = [
+    "OpenAICompatibleAdapter",
+    "ProviderAdapter",
+    "ProviderRegistry",
+    "ProviderRequest",
+    "default_registry"
+]
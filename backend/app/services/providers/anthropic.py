@@ -0,0 +1,77 @@
+"""
+Adaptador para la Messages API de Anthropic.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.providers.base import ProviderAdapter, ProviderRequest
+from app.services.sse import SSEEvent
+
+# Tipos de error de Anthropic -> código HTTP equivalente (decide reintentos)
+_ERROR_STATUS = {
+    "overloaded_error": 529,
+    "rate_limit_error": 429,
+    "api_error": 500,
+    "timeout_error": 504
+}
+
+
+class AnthropicAdapter(ProviderAdapter):
+    """Claude: el mensaje system va aparte y max_tokens es obligatorio."""
+
+    def build_request(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        api_key: str,
+        stream: bool,
+        **kwargs
+    ) -> ProviderRequest:
+        system_message = None
+        anthropic_messages = []
+
+        for msg in messages:
+            if msg["role"] == "system":
+                system_message = msg["content"]
+            else:
+                anthropic_messages.append({
+                    "role": msg["role"],
+                    "content": msg["content"]
+                })
+
+        payload = {
+            "model": model,
+            "messages": anthropic_messages,
+            "max_tokens": kwargs.get("max_tokens", 4096)
+        }
+        if stream:
+            payload["stream"] = True
+        if system_message:
+            payload["system"] = system_message
+
+        return ProviderRequest(
+            url=f"{self.base_url}/messages",
+            headers={
+                "x-api-key": api_key,
+                "Content-Type": "application/json",
+                "anthropic-version": "2023-06-01"
+            },
+            payload=payload
+        )
+
+    def parse_response(self, data: Dict[str, Any]) -> str:
+        return data["content"][0]["text"]
+
+    def parse_stream_event(self, event: Dict[str, Any]) -> str:
+        if event.get("type") != "content_block_delta":
+            return ""
+        return event.get("delta", {}).get("text") or ""
+
+    def stream_error(
+        self,
+        event: SSEEvent,
+        payload: Dict[str, Any]
+    ) -> Optional[Tuple[int, str]]:
+        if event.event != "error" and payload.get("type") != "error":
+            return None
+        error = payload.get("error") or {}
+        return _ERROR_STATUS.get(error.get("type"), 502), error.get("message") or "unknown error"
@@ -0,0 +1,92 @@
+"""
+Interfaz común de los adaptadores de proveedores de IA.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import json_codec
+from app.core.logger import logger
+from app.services.errors import ProviderHTTPError
+from app.services.sse import SSEEvent
+
+
+@dataclass
+class ProviderRequest:
+    """Petición HTTP ya construida para un proveedor."""
+    url: str
+    headers: Dict[str, str]
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+
+class ProviderAdapter(ABC):
+    """
+    Traduce entre el formato interno (mensajes estilo OpenAI) y la API de un
+    proveedor: construye la petición y extrae texto y uso de las respuestas.
+    El transporte (pool, reintentos, métricas) lo pone AIService.
+    Un adaptador sin build_request, parse_response o parse_stream_event no
+    se puede instanciar: falla al registrarse, no en la primera petición.
+    """
+
+    def __init__(self, name: str, display_name: str, base_url: str):
+        self.name = name
+        self.display_name = display_name
+        self.base_url = base_url.rstrip("/")
+
+    @abstractmethod
+    def build_request(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        api_key: str,
+        stream: bool,
+        **kwargs
+    ) -> ProviderRequest:
+        """Petición de chat (con o sin streaming)."""
+
+    @abstractmethod
+    def parse_response(self, data: Dict[str, Any]) -> str:
+        """Texto de una respuesta sin streaming."""
+
+    def parse_usage(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Uso de tokens tal como lo reporta el proveedor."""
+        return data.get("usage", {})
+
+    def decode_event(self, event: SSEEvent) -> Optional[Dict[str, Any]]:
+        """
+        JSON de un evento SSE; None si no lleva datos útiles ([DONE],
+        JSON inválido). Lanza ProviderHTTPError si el evento es un error.
+        """
+        if event.data == b"[DONE]":
+            return None
+        try:
+            payload = json_codec.loads(event.data)
+        except ValueError:
+            logger.warning(
+                "Malformed %s stream event: %r", self.name, event.data[:200])
+            return None
+        if not isinstance(payload, dict):
+            return None
+
+        error = self.stream_error(event, payload)
+        if error is not None:
+            status, message = error
+            raise ProviderHTTPError(
+                f"{self.display_name} stream error: {message}", status=status)
+        return payload
+
+    def stream_error(
+        self,
+        event: SSEEvent,
+        payload: Dict[str, Any]
+    ) -> Optional[Tuple[int, str]]:
+        """(status equivalente, mensaje) si el evento notifica un error."""
+        error = payload.get("error")
+        if event.event != "error" and not error:
+            return None
+        message = error.get("message") if isinstance(error, dict) else error
+        return 502, str(message or event.text[:200])
+
+    @abstractmethod
+    def parse_stream_event(self, event: Dict[str, Any]) -> str:
+        """Texto de un evento de streaming ("" si no aporta texto)."""
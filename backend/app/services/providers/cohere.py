@@ -0,0 +1,47 @@
+"""
+Adaptador para la Chat API v2 de Cohere.
+"""
+from typing import Any, Dict, List
+
+from app.services.providers.base import ProviderAdapter, ProviderRequest
+
+
+class CohereAdapter(ProviderAdapter):
+    """Cohere v2: mensajes estilo OpenAI y eventos content-delta."""
+
+    def build_request(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        api_key: str,
+        stream: bool,
+        **kwargs
+    ) -> ProviderRequest:
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": msg["role"], "content": msg["content"]}
+                for msg in messages
+            ],
+            "stream": stream
+        }
+        if kwargs.get("max_tokens") is not None:
+            payload["max_tokens"] = kwargs["max_tokens"]
+
+        return ProviderRequest(
+            url=f"{self.base_url}/chat",
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            payload=payload
+        )
+
+    def parse_response(self, data: Dict[str, Any]) -> str:
+        return data.get("message", {}).get("content", [{}])[0].get("text", "")
+
+    def parse_stream_event(self, event: Dict[str, Any]) -> str:
+        if event.get("type") != "content-delta":
+            return ""
+        return event.get("delta", {}).get(
+            "message", {}).get("content", {}).get("text") or ""
@@ -0,0 +1,64 @@
+"""
+Adaptador para la API de Google Gemini (generateContent).
+"""
+from typing import Any, Dict, List
+
+from app.services.providers.base import ProviderAdapter, ProviderRequest
+
+
+class GoogleAdapter(ProviderAdapter):
+    """Gemini: roles user/model, systemInstruction y API key en la URL."""
+
+    def build_request(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        api_key: str,
+        stream: bool,
+        **kwargs
+    ) -> ProviderRequest:
+        google_contents = []
+        system_instruction = None
+
+        for msg in messages:
+            if msg["role"] == "system":
+                system_instruction = msg["content"]
+            else:
+                role = "user" if msg["role"] == "user" else "model"
+                google_contents.append({
+                    "role": role,
+                    "parts": [{"text": msg["content"]}]
+                })
+
+        payload = {
+            "contents": google_contents,
+            "generationConfig": {
+                "maxOutputTokens": kwargs.get("max_tokens", 4096),
+                "temperature": kwargs.get("temperature", 0.7)
+            }
+        }
+        if system_instruction:
+            payload["systemInstruction"] = {
+                "parts": [{"text": system_instruction}]}
+
+        if stream:
+            url = f"{self.base_url}/models/{model}:streamGenerateContent?key={api_key}&alt=sse"
+        else:
+            url = f"{self.base_url}/models/{model}:generateContent?key={api_key}"
+
+        return ProviderRequest(
+            url=url,
+            headers={"Content-Type": "application/json"},
+            payload=payload
+        )
+
+    def parse_response(self, data: Dict[str, Any]) -> str:
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+
+    def parse_usage(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return data.get("usageMetadata", {})
+
+    def parse_stream_event(self, event: Dict[str, Any]) -> str:
+        candidates = event.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
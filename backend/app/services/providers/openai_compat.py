@@ -0,0 +1,60 @@
+"""
+Adaptador para APIs compatibles con OpenAI (/chat/completions).
+Lo comparten OpenAI, Mistral, Groq, OpenRouter y endpoints propios
+(vLLM, Ollama, LM Studio...) registrados desde el catálogo.
+"""
+from typing import Any, Dict, List, Optional
+
+from app.services.providers.base import ProviderAdapter, ProviderRequest
+
+
+class OpenAICompatibleAdapter(ProviderAdapter):
+    """Chat completions estilo OpenAI con cabeceras opcionales extra."""
+
+    def __init__(
+        self,
+        name: str,
+        display_name: str,
+        base_url: str,
+        extra_headers: Optional[Dict[str, str]] = None,
+        max_tokens_field: str = "max_tokens"
+    ):
+        super().__init__(name, display_name, base_url)
+        self.extra_headers = extra_headers or {}
+        # OpenAI usa max_completion_tokens (los modelos o1/o3/gpt-5 rechazan
+        # max_tokens); el resto de compatibles, max_tokens
+        self.max_tokens_field = max_tokens_field
+
+    def build_request(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        api_key: str,
+        stream: bool,
+        **kwargs
+    ) -> ProviderRequest:
+        headers = {"Content-Type": "application/json", **self.extra_headers}
+        # Los servidores locales suelen funcionar sin API key
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": stream
+        }
+        if kwargs.get("max_tokens") is not None:
+            payload[self.max_tokens_field] = kwargs["max_tokens"]
+
+        return ProviderRequest(
+            url=f"{self.base_url}/chat/completions",
+            headers=headers,
+            payload=payload
+        )
+
+    def parse_response(self, data: Dict[str, Any]) -> str:
+        return data["choices"][0]["message"]["content"]
+
+    def parse_stream_event(self, event: Dict[str, Any]) -> str:
+        choices = event.get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content") or ""
@@ -0,0 +1,94 @@
+"""
+Registro de adaptadores por nombre de proveedor (lookup O(1)).
+"""
+from typing import Any, Dict, Iterable, Iterator, List
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.providers.anthropic import AnthropicAdapter
+from app.services.providers.base import ProviderAdapter
+from app.services.providers.cohere import CohereAdapter
+from app.services.providers.google import GoogleAdapter
+from app.services.providers.openai_compat import OpenAICompatibleAdapter
+
+
+class ProviderRegistry:
+    """Adaptadores integrados más los OpenAI-compatibles del catálogo."""
+
+    def __init__(self, adapters: Iterable[ProviderAdapter] = ()):
+        self._adapters: Dict[str, ProviderAdapter] = {}
+        self._builtin = set()
+        for adapter in adapters:
+            self.register(adapter)
+            self._builtin.add(adapter.name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._adapters
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._adapters)
+
+    def __len__(self) -> int:
+        return len(self._adapters)
+
+    def get(self, name: str) -> ProviderAdapter:
+        adapter = self._adapters.get(name)
+        if adapter is None:
+            raise ValueError(f"Provider '{name}' not supported")
+        return adapter
+
+    def register(self, adapter: ProviderAdapter):
+        """Registra (o reemplaza) el adaptador de adapter.name."""
+        self._adapters[adapter.name] = adapter
+
+    def register_catalog(self, rows: Iterable[Any]) -> List[str]:
+        """
+        Registra como OpenAI-compatibles las filas de ai_providers_catalog
+        con base_url que no sean proveedores integrados.
+        Retorna los nombres registrados.
+        """
+        registered = []
+        for row in rows:
+            if not row.base_url or not row.is_active or row.name in self._builtin:
+                continue
+            self.register(OpenAICompatibleAdapter(
+                name=row.name,
+                display_name=row.display_name or row.name,
+                base_url=row.base_url
+            ))
+            registered.append(row.name)
+        if registered:
+            logger.info("Registered catalog providers: %s", ", ".join(registered))
+        self.apply_overrides()
+        return registered
+
+    def apply_overrides(self):
+        """Aplica settings.ai_base_urls sobre los adaptadores registrados."""
+        for name, base_url in settings.ai_base_urls.items():
+            adapter = self._adapters.get(name)
+            if adapter is not None:
+                adapter.base_url = base_url.rstrip("/")
+
+
+def default_registry() -> ProviderRegistry:
+    """Registro con los proveedores integrados."""
+    registry = ProviderRegistry([
+        OpenAICompatibleAdapter(
+            "openai", "OpenAI", "https://api.openai.com/v1",
+            max_tokens_field="max_completion_tokens"
+        ),
+        AnthropicAdapter("anthropic", "Anthropic", "https://api.anthropic.com/v1"),
+        GoogleAdapter("google", "Google", "https://generativelanguage.googleapis.com/v1beta"),
+        OpenAICompatibleAdapter("mistral", "Mistral", "https://api.mistral.ai/v1"),
+        CohereAdapter("cohere", "Cohere", "https://api.cohere.ai/v2"),
+        OpenAICompatibleAdapter("groq", "Groq", "https://api.groq.com/openai/v1"),
+        OpenAICompatibleAdapter(
+            "openrouter", "OpenRouter", "https://openrouter.ai/api/v1",
+            extra_headers={
+                "HTTP-Referer": "https://sonorakit.dev",
+                "X-Title": "SonoraKit"
+            }
+        )
+    ])
+    registry.apply_overrides()
+    return registry
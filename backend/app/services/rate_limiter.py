@@ -0,0 +1,302 @@
+"""
+Rate limiting con token buckets por usuario y por IP.
+Backend en memoria (por defecto) o Redis (RESP) para varias máquinas.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Resultado de consumir de un bucket."""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # segundos hasta volver a tener el bucket lleno
+    retry_after: float  # segundos hasta poder repetir (0 si allowed)
+
+    def headers(self) -> Dict[str, str]:
+        """Cabeceras X-RateLimit-* (y Retry-After si se rechazó)."""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after))
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def _result(capacity: int, rate: float, tokens: float, cost: float, allowed: bool) -> RateLimitResult:
+    return RateLimitResult(
+        allowed=allowed,
+        limit=capacity,
+        remaining=max(0, int(tokens)),
+        reset_after=(capacity - tokens) / rate,
+        retry_after=0.0 if allowed else (cost - tokens) / rate
+    )
+
+
+class RateLimitBackend:
+    """Interfaz de almacenamiento de buckets."""
+
+    async def consume(self, key: str, capacity: int, rate: float, cost: float = 1) -> RateLimitResult:
+        """Consume `cost` tokens del bucket `key` (rate = tokens/segundo)."""
+        raise NotImplementedError
+
+    async def close(self):
+        """Libera recursos del backend."""
+
+
+class MemoryBackend(RateLimitBackend):
+    """Buckets en memoria del proceso: [tokens, timestamp] por clave, con LRU."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def consume(self, key: str, capacity: int, rate: float, cost: float = 1) -> RateLimitResult:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(capacity), now]
+            self._buckets[key] = bucket
+            # Las claves inactivas más antiguas se descartan primero
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        bucket[0], bucket[1] = tokens, now
+        return _result(capacity, rate, tokens, cost, allowed)
+
+
+# Token bucket atómico; usa el reloj de Redis para que todas las máquinas coincidan
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """Buckets en un servidor compatible con el protocolo Redis (RESP2)."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        parsed = urlparse(url)
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or 6379
+        self._password = unquote(parsed.password) if parsed.password else None
+        self._username = unquote(parsed.username) if parsed.username else None
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._ssl = parsed.scheme == "rediss"
+        self._prefix = prefix
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self._host, self._port, ssl=self._ssl or None)
+        if self._password:
+            auth = [self._username, self._password] if self._username else [self._password]
+            await self._command("AUTH", *auth)
+        if self._db:
+            await self._command("SELECT", str(self._db))
+
+    async def _command(self, *args: str):
+        """Envía un comando RESP y lee la respuesta."""
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg.encode()
+            payload.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._writer.write(b"".join(payload))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = await self._reader.readexactly(size + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            size = int(rest)
+            if size < 0:
+                return None
+            return [await self._read_reply() for _ in range(size)]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    async def consume(self, key: str, capacity: int, rate: float, cost: float = 1) -> RateLimitResult:
+        # Con timeout: un Redis colgado sin cerrar el socket no debe retener
+        # el lock (y con él todas las peticiones) más de lo que cuesta un comando
+        timeout = settings.rate_limit_redis_timeout
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await asyncio.wait_for(self._connect(), timeout)
+                allowed, tokens = await asyncio.wait_for(self._command(
+                    "EVAL", _TOKEN_BUCKET_LUA, "1", self._prefix + key,
+                    str(capacity), repr(rate), repr(float(cost))
+                ), timeout)
+            except Exception:
+                # Conexión en estado desconocido: se reabre en la próxima llamada
+                await self.close()
+                raise
+        return _result(capacity, rate, float(tokens), cost, bool(allowed))
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+class RateLimiter:
+    """Aplica límites sobre un backend; si el backend falla, deja pasar."""
+
+    def __init__(self, backend: RateLimitBackend):
+        self.backend = backend
+        self.allowed = 0
+        self.rejected = 0
+        self.backend_errors = 0
+
+    async def hit(self, key: str, limit: int, window: float, cost: float = 1) -> Optional[RateLimitResult]:
+        """Consume del bucket `key` que admite `limit` peticiones por `window` segundos."""
+        if not settings.rate_limit_enabled or limit <= 0 or window <= 0:
+            return None
+        try:
+            result = await self.backend.consume(key, limit, limit / window, cost)
+        except (OSError, RuntimeError, EOFError, ValueError, asyncio.TimeoutError) as e:
+            self.backend_errors += 1
+            logger.error("Rate limit backend error: %s", e)
+            return None
+
+        if result.allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "backend_errors": self.backend_errors
+        }
+
+
+def create_backend() -> RateLimitBackend:
+    """Backend según settings.rate_limit_backend."""
+    if settings.rate_limit_backend == "redis":
+        return RedisBackend(settings.rate_limit_redis_url)
+    return MemoryBackend(max_keys=settings.rate_limit_max_keys)
+
+
+def client_ip(scope: Scope) -> str:
+    """IP del cliente (cabecera del proxy de confianza o peer del socket)."""
+    header = settings.rate_limit_ip_header.lower().encode()
+    if header:
+        for name, value in scope.get("headers", []):
+            if name == header:
+                return value.decode().split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI: bucket por IP en todas las rutas /api y cabeceras
+    X-RateLimit-* en la respuesta (las del bucket de usuario si se aplicó).
+    """
+
+    exempt_prefixes: Tuple[str, ...] = ("/api/v1/health",)
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or scope.get("method") == "OPTIONS"
+            or not path.startswith("/api/")
+            or path.startswith(self.exempt_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        result = await self.limiter.hit(
+            f"ip:{client_ip(scope)}",
+            settings.rate_limit_ip_requests,
+            settings.rate_limit_ip_window
+        )
+        if result is not None and not result.allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers=result.headers()
+            )
+            await response(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        state["rate_limit"] = result
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                current = state.get("rate_limit")
+                if current is not None:
+                    headers = list(message.get("headers", []))
+                    existing = {name.lower() for name, _ in headers}
+                    for name, value in current.headers().items():
+                        if name.lower().encode() not in existing:
+                            headers.append((name.lower().encode(), value.encode()))
+                    message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+# Instancia global
+rate_limiter = RateLimiter(create_backend())
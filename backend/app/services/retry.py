@@ -0,0 +1,219 @@
+"""
+Reintentos de llamadas a proveedores de IA con backoff exponencial y jitter,
+respetando las cabeceras Retry-After y de rate limit de cada proveedor.
+"""
+import asyncio
+import random
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncGenerator, Awaitable, Callable, Mapping, Optional, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.errors import ProviderHTTPError, ProviderUnavailableError
+
+T = TypeVar("T")
+
+# 529 = Anthropic "overloaded"
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504, 529})
+
+# Duraciones estilo OpenAI/Groq: "1s", "6m0s", "250ms", "1h2m3.5s"
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        return None
+    return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+
+
+def _parse_timestamp(value: str) -> Optional[float]:
+    """Segundos hasta una fecha RFC 3339 (Anthropic) o HTTP-date."""
+    try:
+        moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            moment = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, moment.timestamp() - time.time())
+
+
+def _parse_reset(value: str) -> Optional[float]:
+    """Reset como duración, época (s o ms) o fecha."""
+    seconds = _parse_duration(value)
+    if seconds is None:
+        return _parse_timestamp(value)
+    # OpenRouter envía x-ratelimit-reset como época en milisegundos
+    if seconds > 1e12:
+        return max(0.0, seconds / 1000 - time.time())
+    if seconds > 1e9:
+        return max(0.0, seconds - time.time())
+    return seconds
+
+
+def retry_after_from_headers(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Segundos de espera que pide el proveedor, o None si no lo indica.
+    Orden: retry-after-ms, retry-after y los reset de los límites agotados.
+    """
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value:
+        seconds = _parse_duration(value)
+        if seconds is None:
+            seconds = _parse_timestamp(value)
+        if seconds is not None:
+            return max(0.0, seconds)
+
+    # Solo cuentan los límites agotados (remaining == 0)
+    waits = []
+    for prefix in ("x-ratelimit", "anthropic-ratelimit"):
+        for kind in ("requests", "tokens", "input-tokens", "output-tokens"):
+            if prefix == "x-ratelimit":
+                remaining = headers.get(f"{prefix}-remaining-{kind}")
+                reset = headers.get(f"{prefix}-reset-{kind}")
+            else:
+                remaining = headers.get(f"{prefix}-{kind}-remaining")
+                reset = headers.get(f"{prefix}-{kind}-reset")
+            if reset and remaining is not None and remaining.strip() == "0":
+                seconds = _parse_reset(reset)
+                if seconds is not None:
+                    waits.append(seconds)
+
+    if headers.get("x-ratelimit-remaining", "").strip() == "0":
+        seconds = _parse_reset(headers.get("x-ratelimit-reset", ""))
+        if seconds is not None:
+            waits.append(seconds)
+
+    return max(waits) if waits else None
+
+
+class RetryPolicy:
+    """Backoff exponencial con full jitter y presupuesto total por llamada."""
+
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        budget: Optional[float] = None,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep
+    ):
+        """
+        Args:
+            max_attempts: Intentos totales (1 = sin reintentos)
+            base_delay: Espera base del primer reintento en segundos
+            max_delay: Tope de la espera calculada por backoff
+            budget: Segundos totales máximos desde el primer intento
+            sleep: Función de espera (inyectable para pruebas)
+        """
+        self.max_attempts = max_attempts or settings.ai_retry_max_attempts
+        self.base_delay = settings.ai_retry_base_delay if base_delay is None else base_delay
+        self.max_delay = settings.ai_retry_max_delay if max_delay is None else max_delay
+        self.budget = settings.ai_retry_budget if budget is None else budget
+        self._sleep = sleep
+
+    def backoff(self, attempt: int) -> float:
+        """Espera del reintento `attempt` (0 = primer reintento)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def next_delay(self, error: Exception, attempt: int, started: float) -> Optional[float]:
+        """Espera antes del siguiente intento, o None si no se debe reintentar."""
+        if attempt + 1 >= self.max_attempts:
+            return None
+
+        if isinstance(error, ProviderHTTPError):
+            if error.status not in RETRYABLE_STATUS:
+                return None
+            delay = error.retry_after
+            if delay is None:
+                delay = self.backoff(attempt)
+        elif isinstance(error, httpx.TransportError):
+            delay = self.backoff(attempt)
+        else:
+            return None
+
+        if time.monotonic() - started + delay > self.budget:
+            return None
+        return delay
+
+    @staticmethod
+    def _final_error(provider: str, error: Exception) -> Exception:
+        if isinstance(error, httpx.TransportError):
+            return ProviderUnavailableError(f"{provider} request failed: {error!r}")
+        return error
+
+    async def run(self, provider: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Ejecuta `call` reintentando errores transitorios."""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except (ProviderHTTPError, httpx.TransportError) as e:
+                delay = self.next_delay(e, attempt, started)
+                if delay is None:
+                    raise self._final_error(provider, e) from e
+                logger.warning(
+                    "%s call failed (%r), retry %d in %.2fs",
+                    provider, e, attempt + 1, delay)
+                await self._sleep(delay)
+                attempt += 1
+
+    async def stream(
+        self,
+        provider: str,
+        factory: Callable[[], AsyncGenerator[str, None]]
+    ) -> AsyncGenerator[str, None]:
+        """
+        Reintenta el streaming solo hasta recibir el primer fragmento;
+        después un fallo ya no se puede repetir sin duplicar contenido.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            stream = factory()
+            try:
+                first = await stream.__anext__()
+                break
+            except StopAsyncIteration:
+                return
+            except (ProviderHTTPError, httpx.TransportError) as e:
+                await stream.aclose()
+                delay = self.next_delay(e, attempt, started)
+                if delay is None:
+                    raise self._final_error(provider, e) from e
+                logger.warning(
+                    "%s stream failed before first chunk (%r), retry %d in %.2fs",
+                    provider, e, attempt + 1, delay)
+                await self._sleep(delay)
+                attempt += 1
+
+        try:
+            yield first
+            async for chunk in stream:
+                yield chunk
+        except httpx.TransportError as e:
+            raise self._final_error(provider, e) from e
+        finally:
+            await stream.aclose()
@@ -0,0 +1,159 @@
+"""
+Decodificador incremental de text/event-stream sobre bytes crudos.
+Sigue el algoritmo de la especificación WHATWG: eventos multilínea,
+comentarios, campos event/id/retry y fines de línea CR, LF o CRLF.
+"""
+from typing import AsyncIterable, AsyncIterator, List, Optional
+
+_BOM = b"\xef\xbb\xbf"
+
+
+class SSEError(ValueError):
+    """El stream no es un text/event-stream válido."""
+
+
+class SSEEvent:
+    """Evento despachado; data se mantiene en bytes para decodificar JSON sin copias."""
+
+    __slots__ = ("event", "data", "id", "retry")
+
+    def __init__(self, event: str, data: bytes, id: str, retry: Optional[int]):
+        self.event = event
+        self.data = data
+        self.id = id
+        self.retry = retry
+
+    @property
+    def text(self) -> str:
+        return self.data.decode("utf-8", errors="replace")
+
+    def __repr__(self) -> str:
+        return f"SSEEvent(event={self.event!r}, data={self.data[:80]!r}, id={self.id!r})"
+
+
+class SSEDecoder:
+    """Se alimenta con feed(chunk) a medida que llegan bytes y flush() al EOF."""
+
+    def __init__(self, max_buffer: int = 4 * 1024 * 1024):
+        """
+        Args:
+            max_buffer: Bytes máximos de una línea o evento sin terminar
+        """
+        self.max_buffer = max_buffer
+        self.last_event_id = ""
+        self.retry: Optional[int] = None
+        self._buffer = b""
+        self._started = False
+        self._event = b""
+        self._data: List[bytes] = []
+        self._data_size = 0
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """Procesa un fragmento y retorna los eventos completos."""
+        if not chunk:
+            return []
+
+        data = self._buffer + chunk
+        if not self._started:
+            if len(data) < len(_BOM) and _BOM.startswith(data):
+                self._buffer = data
+                return []
+            self._started = True
+            if data.startswith(_BOM):
+                data = data[len(_BOM):]
+
+        # Un \r final puede ser la primera mitad de un \r\n
+        hold = b""
+        if data.endswith(b"\r"):
+            data, hold = data[:-1], b"\r"
+        if b"\r" in data:
+            data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        lines = data.split(b"\n")
+        self._buffer = lines.pop() + hold
+        if len(self._buffer) > self.max_buffer:
+            raise SSEError("SSE line exceeds the maximum buffer size")
+
+        events = []
+        for line in lines:
+            if line.startswith(b"data: "):
+                # Camino rápido: la inmensa mayoría de líneas
+                value = line[6:]
+                self._data.append(value)
+                self._data_size += len(value) + 1
+                if self._data_size > self.max_buffer:
+                    raise SSEError("SSE event exceeds the maximum buffer size")
+                continue
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """
+        Fin del stream. Retorna los eventos que completa un \r final (ya no
+        puede llegar su \n). Una última línea sin salto se procesa, pero el
+        evento sin línea en blanco final se descarta (como exige la
+        especificación).
+        """
+        events = []
+        if self._buffer.endswith(b"\r"):
+            events = self.feed(b"\n")
+        line = self._buffer
+        self._buffer = b""
+        if line:
+            self._process_line(line)
+        self._reset()
+        return events
+
+    def _reset(self):
+        self._event = b""
+        self._data = []
+        self._data_size = 0
+
+    def _process_line(self, line: bytes) -> Optional[SSEEvent]:
+        if not line:
+            return self._dispatch()
+        if line[0] == 0x3A:  # ":" -> comentario / keep-alive
+            return None
+
+        field, colon, value = line.partition(b":")
+        if colon and value[:1] == b" ":
+            value = value[1:]
+
+        if field == b"data":
+            self._data.append(value)
+            self._data_size += len(value) + 1
+            if self._data_size > self.max_buffer:
+                raise SSEError("SSE event exceeds the maximum buffer size")
+        elif field == b"event":
+            self._event = value
+        elif field == b"id":
+            if b"\x00" not in value:
+                self.last_event_id = value.decode("utf-8", errors="replace")
+        elif field == b"retry":
+            if value.isdigit():
+                self.retry = int(value)
+        return None
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        if not self._data:
+            # Sin data no hay evento (solo se descarta el tipo)
+            self._event = b""
+            return None
+        data = self._data[0] if len(self._data) == 1 else b"\n".join(self._data)
+        event_type = self._event.decode("utf-8", errors="replace") if self._event else "message"
+        self._event = b""
+        self._data = []
+        self._data_size = 0
+        return SSEEvent(event_type, data, self.last_event_id, self.retry)
+
+
+async def iter_events(chunks: AsyncIterable[bytes]) -> AsyncIterator[SSEEvent]:
+    """Eventos de un stream de bytes, incluidos los que completa flush() al EOF."""
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.flush():
+        yield event
@@ -0,0 +1,144 @@
+"""
+Agrupación de deltas del proveedor en menos frames SSE hacia el cliente.
+
+El primer delta se envía en cuanto llega (no empeora el tiempo al primer
+token); después se acumula hasta llenar coalesce_bytes o hasta que pasen
+coalesce_ms desde el último frame, lo que ocurra antes.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core import json_codec
+from app.core.config import settings
+
+
+class StreamStats:
+    """Deltas recibidos frente a frames enviados al cliente."""
+
+    def __init__(self):
+        self.streams = 0
+        self.deltas = 0
+        self.frames = 0
+        self.bytes = 0
+        # Streams cortados por desconexión del cliente
+        self.cancelled = 0
+        self.truncated_chars = 0
+        # Guardados parciales de respuestas en curso
+        self.checkpoints = 0
+        # Reconexiones con Last-Event-ID
+        self.resumes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streams": self.streams,
+            "deltas": self.deltas,
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "deltas_per_frame": round(self.deltas / self.frames, 2) if self.frames else 0.0,
+            "cancelled": self.cancelled,
+            "truncated_chars": self.truncated_chars,
+            "checkpoints": self.checkpoints,
+            "resumes": self.resumes
+        }
+
+
+stream_stats = StreamStats()
+
+
+class SSEFrameEncoder:
+    """Frames `data: {"content": ..., "chat_id": ...}` con prefijo precalculado."""
+
+    PREFIX = b'data: {"content": '
+
+    def __init__(self, chat_id: str):
+        self._suffix = b', "chat_id": ' + json_codec.dumps(chat_id) + b'}\n\n'
+
+    def content(self, text: str, event_id: Optional[int] = None) -> bytes:
+        frame = self.PREFIX + json_codec.dumps(text) + self._suffix
+        if event_id is not None:
+            # Permite reanudar el stream con Last-Event-ID
+            frame = b"id: %d\n" % event_id + frame
+        stream_stats.frames += 1
+        stream_stats.bytes += len(frame)
+        return frame
+
+
+async def coalesce(
+    deltas: AsyncIterator[str],
+    max_bytes: Optional[int] = None,
+    window_ms: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    Agrupa los deltas de `deltas`. La lectura del upstream va en una tarea
+    aparte para poder vaciar el buffer al cumplirse la ventana aunque el
+    proveedor esté callado; el coste por frame es una espera, no una por delta.
+    """
+    max_bytes = settings.stream_coalesce_bytes if max_bytes is None else max_bytes
+    window = (settings.stream_coalesce_ms if window_ms is None else window_ms) / 1000
+    stream_stats.streams += 1
+
+    if window <= 0:
+        # Agrupación desactivada: un frame por delta
+        async for delta in deltas:
+            stream_stats.deltas += 1
+            yield delta
+        return
+
+    loop = asyncio.get_running_loop()
+    buffer: List[str] = []
+    size = 0
+    done = False
+    error: Optional[BaseException] = None
+    ready = asyncio.Event()
+
+    async def pump():
+        nonlocal size, done, error
+        try:
+            async for delta in deltas:
+                if not delta:
+                    continue
+                buffer.append(delta)
+                size += len(delta)
+                stream_stats.deltas += 1
+                # Avisar al pasar de vacío a con datos o al llenar el buffer
+                if len(buffer) == 1 or (max_bytes and size >= max_bytes):
+                    ready.set()
+        except Exception as e:
+            error = e
+        finally:
+            done = True
+            ready.set()
+
+    reader = asyncio.create_task(pump())
+    last_flush: Optional[float] = None
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+
+            if buffer and last_flush is not None and not done and not (max_bytes and size >= max_bytes):
+                delay = last_flush + window - loop.time()
+                if delay > 0:
+                    # Un temporizador del loop (más barato que wait_for); antes
+                    # solo despierta si se llena el buffer o acaba el stream
+                    timer = loop.call_later(delay, ready.set)
+                    await ready.wait()
+                    timer.cancel()
+                    ready.clear()
+
+            if buffer:
+                text = "".join(buffer)
+                buffer.clear()
+                size = 0
+                last_flush = loop.time()
+                yield text
+
+            if done and not buffer:
+                if error is not None:
+                    raise error
+                return
+    finally:
+        # Cerrar el upstream también si el consumidor se va (cliente desconectado)
+        if not reader.done():
+            reader.cancel()
+            await asyncio.wait([reader])
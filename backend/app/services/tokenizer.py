@@ -0,0 +1,214 @@
+"""
+Conteo aproximado de tokens por familia de modelo, sin llamar al proveedor.
+
+Con tiktoken instalado y sus vocabularios en caché local (TIKTOKEN_CACHE_DIR)
+los modelos de OpenAI se cuentan con su BPE real; el resto, o todos si no hay
+BPE, con una heurística por familia (caracteres ASCII por token más un peso
+por carácter no ASCII) que se recalibra con el `usage` que devuelven los
+proveedores. Los conteos BPE de textos largos se cachean por (familia,
+hash, longitud): el historial de un chat se vuelve a contar en cada turno.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.logger import logger
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken es opcional
+    tiktoken = None
+
+# Tokens extra por mensaje (rol y separadores) y por respuesta (cebado)
+MESSAGE_OVERHEAD = 3
+REPLY_PRIMING = 3
+
+
+class TokenFamily:
+    """Parámetros de conteo de una familia de modelos."""
+
+    def __init__(
+        self,
+        name: str,
+        chars_per_token: float,
+        non_ascii_tokens: float,
+        encoding: Optional[str] = None
+    ):
+        self.name = name
+        # Caracteres ASCII por token (texto en inglés/código)
+        self.chars_per_token = chars_per_token
+        # Tokens por carácter no ASCII (acentos ~0.5, CJK ~1)
+        self.non_ascii_tokens = non_ascii_tokens
+        # Codificación tiktoken si existe para la familia
+        self.encoding = encoding
+
+
+FAMILIES: Dict[str, TokenFamily] = {
+    family.name: family for family in (
+        TokenFamily("o200k", 4.2, 0.6, "o200k_base"),
+        TokenFamily("cl100k", 4.0, 0.7, "cl100k_base"),
+        TokenFamily("claude", 3.6, 0.8),
+        TokenFamily("gemini", 4.2, 0.6),
+        TokenFamily("mistral", 3.6, 0.8),
+        TokenFamily("llama", 4.0, 0.7),
+        TokenFamily("command", 4.0, 0.7),
+        TokenFamily("default", 4.0, 0.75),
+    )
+}
+
+# Prefijo del id de modelo -> familia (el primero que coincide)
+MODEL_PREFIXES: Tuple[Tuple[str, str], ...] = (
+    ("gpt-4o", "o200k"), ("gpt-4.1", "o200k"), ("gpt-5", "o200k"), ("chatgpt-4o", "o200k"),
+    ("o1", "o200k"), ("o3", "o200k"), ("o4", "o200k"),
+    ("gpt-4", "cl100k"), ("gpt-3.5", "cl100k"), ("text-embedding", "cl100k"),
+    ("claude", "claude"),
+    ("gemini", "gemini"), ("gemma", "gemini"),
+    ("mistral", "mistral"), ("mixtral", "mistral"), ("codestral", "mistral"),
+    ("open-mistral", "mistral"), ("ministral", "mistral"), ("pixtral", "mistral"),
+    ("llama", "llama"), ("meta-llama", "llama"),
+    ("command", "command"),
+)
+
+# Familia por proveedor cuando el id de modelo no dice nada
+PROVIDER_FAMILIES: Dict[str, str] = {
+    "openai": "o200k",
+    "anthropic": "claude",
+    "google": "gemini",
+    "mistral": "mistral",
+    "groq": "llama",
+    "cohere": "command",
+}
+
+
+class Tokenizer:
+    """Conteo de tokens con caché, BPE opcional y calibración por familia."""
+
+    def __init__(self):
+        self._cache: TTLCache[int] = TTLCache(
+            max_size=settings.tokenizer_cache_size,
+            default_ttl=settings.tokenizer_cache_ttl
+        )
+        self._encodings: Dict[str, Any] = {}
+        self._families: Dict[Tuple[str, str], TokenFamily] = {}
+        # Corrección multiplicativa de la heurística según el `usage` real
+        self._scale: Dict[str, float] = {}
+        self.counted = 0
+        self.bpe_counted = 0
+        self.calibrations = 0
+
+    async def startup(self):
+        """Carga los vocabularios BPE (en un hilo: leen disco o red)."""
+        if tiktoken is None or not settings.tokenizer_bpe:
+            return
+        for family in FAMILIES.values():
+            if family.encoding is None or family.encoding in self._encodings:
+                continue
+            try:
+                self._encodings[family.encoding] = await asyncio.to_thread(
+                    tiktoken.get_encoding, family.encoding)
+            except Exception as e:
+                # Sin vocabulario local ni red: heurística para esta familia
+                logger.warning("Tokenizer %s unavailable, using heuristics: %s", family.encoding, e)
+        if self._encodings:
+            logger.info("Tokenizer BPE ready (%s)", ", ".join(sorted(self._encodings)))
+
+    def family(self, provider: str = "", model: str = "") -> TokenFamily:
+        key = (provider, model)
+        family = self._families.get(key)
+        if family is None:
+            # "anthropic/claude-3.5-sonnet" (OpenRouter) -> "claude-3.5-sonnet"
+            name = model.rsplit("/", 1)[-1].lower()
+            family_name = next(
+                (f for prefix, f in MODEL_PREFIXES if name.startswith(prefix)),
+                PROVIDER_FAMILIES.get(provider, "default"))
+            family = FAMILIES[family_name]
+            if len(self._families) < 10000:
+                self._families[key] = family
+        return family
+
+    def _heuristic(self, text: str, family: TokenFamily) -> int:
+        # encode("ascii", "ignore") cuenta los ASCII en C, sin recorrer en Python
+        ascii_chars = len(text.encode("ascii", "ignore"))
+        estimate = ascii_chars / family.chars_per_token + (len(text) - ascii_chars) * family.non_ascii_tokens
+        return int(estimate * self._scale.get(family.name, 1.0) + 0.5)
+
+    def count_many(self, texts: Sequence[str], provider: str = "", model: str = "") -> List[int]:
+        """Tokens de cada texto; los no cacheados se codifican en un solo lote."""
+        family = self.family(provider, model)
+        encoding = self._encodings.get(family.encoding) if family.encoding else None
+        min_chars = settings.tokenizer_cache_min_chars
+        counts: List[int] = [0] * len(texts)
+        missing: List[int] = []
+
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            if encoding is None:
+                # La heurística cuesta lo mismo que el hash: sin caché
+                counts[i] = self._heuristic(text, family)
+                continue
+            if len(text) >= min_chars:
+                cached = self._cache.get((family.name, hash(text), len(text)))
+                if cached is not None:
+                    counts[i] = cached
+                    continue
+            missing.append(i)
+
+        if missing:
+            # tiktoken reparte el lote entre hilos sin el GIL
+            encoded = encoding.encode_ordinary_batch([texts[i] for i in missing])
+            for i, tokens in zip(missing, encoded):
+                counts[i] = len(tokens)
+                if len(texts[i]) >= min_chars:
+                    self._cache.set((family.name, hash(texts[i]), len(texts[i])), counts[i])
+            self.bpe_counted += len(missing)
+
+        self.counted += len(texts)
+        return counts
+
+    def count(self, text: str, provider: str = "", model: str = "") -> int:
+        return self.count_many([text], provider, model)[0]
+
+    def count_messages(self, messages: Iterable[Dict[str, str]], provider: str = "", model: str = "") -> int:
+        """Tokens de entrada de una conversación, con el coste fijo por mensaje."""
+        contents = [m.get("content") or "" for m in messages]
+        return (
+            sum(self.count_many(contents, provider, model))
+            + MESSAGE_OVERHEAD * len(contents)
+            + REPLY_PRIMING
+        )
+
+    def calibrate(self, provider: str, model: str, messages: List[Dict[str, str]], reported: int):
+        """Ajusta la heurística de la familia con los prompt_tokens de un `usage`."""
+        family = self.family(provider, model)
+        if reported <= 0 or (family.encoding and family.encoding in self._encodings):
+            return
+        contents = [m.get("content") or "" for m in messages]
+        fixed = MESSAGE_OVERHEAD * len(contents) + REPLY_PRIMING
+        scale = self._scale.get(family.name, 1.0)
+        raw = sum(self._heuristic(c, family) for c in contents) / scale
+        if raw < 50 or reported <= fixed:
+            # Muestras pequeñas: el redondeo pesa más que la señal
+            return
+        observed = (reported - fixed) / raw
+        # Media móvil exponencial, acotada para que un `usage` raro no la dispare
+        scale += settings.tokenizer_calibration_rate * (observed - scale)
+        self._scale[family.name] = min(2.0, max(0.5, scale))
+        self.calibrations += 1
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bpe": sorted(self._encodings),
+            "counted": self.counted,
+            "bpe_counted": self.bpe_counted,
+            "calibrations": self.calibrations,
+            "scale": {name: round(scale, 3) for name, scale in self._scale.items()},
+            "cache": self._cache.stats()
+        }
+
+
+tokenizer = Tokenizer()
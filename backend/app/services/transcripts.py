@@ -0,0 +1,61 @@
+"""
+Exportación de chats completos en streaming: los mensajes se leen con un
+cursor del servidor por lotes y se codifican según llegan, así la memoria
+no crece con el tamaño del chat.
+"""
+import uuid
+from typing import Any, AsyncIterator, Dict
+
+from sqlalchemy import Row, select
+
+from app.core import json_codec
+from app.core.config import settings
+from app.db.database import db
+from app.db.models import Message
+
+COLUMNS = (
+    Message.id, Message.role, Message.content, Message.provider_name,
+    Message.model_id, Message.status, Message.created_at
+)
+
+
+def _encode(row: Row) -> bytes:
+    return json_codec.dumps({
+        "id": str(row.id),
+        "role": row.role,
+        "content": row.content,
+        "provider_name": row.provider_name,
+        "model_id": row.model_id,
+        "status": row.status,
+        "created_at": row.created_at.isoformat()
+    })
+
+
+async def stream_transcript(chat: Dict[str, Any], chat_id: uuid.UUID, ndjson: bool = False) -> AsyncIterator[bytes]:
+    """
+    Mensajes del chat en orden cronológico, en lotes de transcript_batch_rows
+    (un fragmento por lote): un JSON {"chat": ..., "messages": [...]} o NDJSON
+    con un mensaje por línea. Usa su propia sesión: la del request se cierra
+    antes de que empiece el cuerpo de la respuesta.
+    """
+    session = await db.get_session()
+    try:
+        result = await session.stream(
+            select(*COLUMNS)
+            .where(Message.chat_id == chat_id)
+            .order_by(Message.created_at.asc(), Message.id.asc())
+            .execution_options(yield_per=settings.transcript_batch_rows)
+        )
+        if ndjson:
+            async for rows in result.partitions():
+                yield b"".join(_encode(row) + b"\n" for row in rows)
+            return
+
+        yield b'{"chat":' + json_codec.dumps(chat) + b',"messages":['
+        separator = b""
+        async for rows in result.partitions():
+            yield separator + b",".join(_encode(row) for row in rows)
+            separator = b","
+        yield b"]}"
+    finally:
+        await session.close()
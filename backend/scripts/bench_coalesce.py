@@ -0,0 +1,115 @@
+"""Micro-benchmark de la emisión de frames SSE hacia el cliente.
+
+Compara un frame por delta con json.dumps (implementación anterior de
+generate()) con la agrupación de app/services/streaming.py, simulando un
+proveedor rápido que envía deltas pequeños a ritmo constante.
+Mide CPU por token de la etapa de emisión (descontando la del proveedor
+simulado), frames por respuesta y latencia añadida al primer token.
+
+Uso:
+  python scripts/bench_coalesce.py [--tokens 5000] [--rate 2000] [--window-ms 30]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import AsyncIterator, List
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.streaming import SSEFrameEncoder, coalesce  # noqa: E402
+
+CHAT_ID = "3f2b7c1e-9a4d-4c52-8e0f-6b1d2a7c9e10"
+
+
+async def provider(tokens: int, rate: float) -> AsyncIterator[str]:
+    """Deltas de ~4 caracteres a `rate` tokens/s, en ráfagas de 10 ms."""
+    per_tick = max(1, int(rate / 100))
+    sent = 0
+    while sent < tokens:
+        for _ in range(min(per_tick, tokens - sent)):
+            yield f" t{sent % 100}"
+            sent += 1
+        await asyncio.sleep(0.01)
+
+
+async def baseline(tokens: int, rate: float) -> List[bytes]:
+    """Solo el proveedor simulado, para descontar su coste."""
+    async for _ in provider(tokens, rate):
+        pass
+    return []
+
+
+async def legacy(tokens: int, rate: float) -> List[bytes]:
+    frames = []
+    async for chunk in provider(tokens, rate):
+        frames.append(
+            f"data: {json.dumps({'content': chunk, 'chat_id': CHAT_ID})}\n\n".encode())
+    return frames
+
+
+async def coalesced(tokens: int, rate: float, window_ms: float, max_bytes: int) -> List[bytes]:
+    encoder = SSEFrameEncoder(CHAT_ID)
+    frames = []
+    async for text in coalesce(provider(tokens, rate), max_bytes, window_ms):
+        frames.append(encoder.content(text))
+    return frames
+
+
+async def cpu_time(run, rounds: int):
+    """Mejor tiempo de CPU de `rounds` ejecuciones y los frames emitidos."""
+    best = None
+    frames: List[bytes] = []
+    for _ in range(rounds):
+        started = time.process_time()
+        frames = await run()
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, frames
+
+
+async def measure(name: str, run, tokens: int, base: float, rounds: int):
+    cpu, frames = await cpu_time(run, rounds)
+    size = sum(len(f) for f in frames)
+    print(f"  {name:<18} {len(frames):>6} frames  {size / 1e3:>8.1f} kB  "
+          f"{max(0.0, cpu - base) / tokens * 1e6:>6.2f} µs CPU/token")
+
+
+async def first_frame_latency(window_ms: float) -> float:
+    """Tiempo desde el primer delta hasta que sale el primer frame."""
+    async def one() -> AsyncIterator[str]:
+        yield "hola"
+        await asyncio.sleep(1)
+
+    started = time.perf_counter()
+    frames = coalesce(one(), 1024, window_ms)
+    await frames.__anext__()
+    elapsed = time.perf_counter() - started
+    await frames.aclose()
+    return elapsed
+
+
+async def main(args: argparse.Namespace):
+    print(f"📦 {args.tokens} tokens a {args.rate:.0f} tokens/s, "
+          f"ventana {args.window_ms} ms, {args.max_bytes} bytes")
+    base, _ = await cpu_time(lambda: baseline(args.tokens, args.rate), args.rounds)
+    await measure("frame por delta", lambda: legacy(args.tokens, args.rate),
+                  args.tokens, base, args.rounds)
+    await measure("agrupado", lambda: coalesced(
+        args.tokens, args.rate, args.window_ms, args.max_bytes),
+        args.tokens, base, args.rounds)
+    latency = await first_frame_latency(args.window_ms)
+    print(f"  primer frame tras {latency * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de agrupación de frames SSE")
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=2000)
+    parser.add_argument("--window-ms", type=float, default=30)
+    parser.add_argument("--max-bytes", type=int, default=1024)
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
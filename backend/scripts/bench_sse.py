@@ -0,0 +1,133 @@
+"""Micro-benchmark del parseo de streams SSE de proveedores.
+
+Compara el parser anterior (aiter_lines + json.loads por línea) con
+SSEDecoder sobre aiter_bytes, con orjson y con json estándar.
+Mide tokens (deltas) por segundo de CPU en un solo núcleo.
+
+Uso:
+  python scripts/bench_sse.py [--events 100000] [--chunk-size 4096] [--rounds 3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import AsyncIterator, Callable, Awaitable
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.core import json_codec  # noqa: E402
+from app.services.providers.openai_compat import OpenAICompatibleAdapter  # noqa: E402
+from app.services.sse import iter_events  # noqa: E402
+
+adapter = OpenAICompatibleAdapter("openai", "OpenAI", "http://localhost")
+
+
+def build_stream(events: int) -> bytes:
+    """Stream estilo OpenAI: un delta por token y [DONE] al final."""
+    frames = []
+    for i in range(events):
+        chunk = {
+            "id": "chatcmpl-9xYzAbCdEfGhIjKlMnOpQrStUv",
+            "object": "chat.completion.chunk",
+            "created": 1718000000,
+            "model": "gpt-4o-2024-08-06",
+            "system_fingerprint": "fp_abc123",
+            "choices": [{
+                "index": 0,
+                "delta": {"content": f" tok{i % 100}"},
+                "logprobs": None,
+                "finish_reason": None
+            }]
+        }
+        frames.append(f"data: {json.dumps(chunk)}\n\n")
+    frames.append("data: [DONE]\n\n")
+    return "".join(frames).encode()
+
+
+def response_for(body: bytes, chunk_size: int) -> httpx.Response:
+    async def chunks() -> AsyncIterator[bytes]:
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+    return httpx.Response(200, content=chunks())
+
+
+async def legacy_parser(response: httpx.Response) -> int:
+    """Implementación anterior de _openai_stream."""
+    tokens = 0
+    async for line in response.aiter_lines():
+        if line.startswith("data: "):
+            data = line[6:]
+            if data == "[DONE]":
+                continue
+            try:
+                chunk = json.loads(data)
+                content = chunk.get("choices", [{}])[0].get(
+                    "delta", {}).get("content", "")
+                if content:
+                    tokens += 1
+            except json.JSONDecodeError:
+                continue
+    return tokens
+
+
+async def sse_parser(response: httpx.Response) -> int:
+    """Implementación actual de AIService._stream."""
+    tokens = 0
+    async for event in iter_events(response.aiter_bytes()):
+        payload = adapter.decode_event(event)
+        if payload is None:
+            continue
+        if adapter.parse_stream_event(payload):
+            tokens += 1
+    return tokens
+
+
+async def measure(
+    parser: Callable[[httpx.Response], Awaitable[int]],
+    body: bytes,
+    chunk_size: int,
+    rounds: int
+) -> float:
+    """Mejor resultado en tokens por segundo de CPU."""
+    best = 0.0
+    for _ in range(rounds):
+        response = response_for(body, chunk_size)
+        started = time.process_time()
+        tokens = await parser(response)
+        elapsed = time.process_time() - started
+        best = max(best, tokens / elapsed if elapsed else 0.0)
+    return best
+
+
+async def main(args: argparse.Namespace):
+    body = build_stream(args.events)
+    print(f"📦 {args.events} eventos, {len(body) / 1e6:.1f} MB, "
+          f"fragmentos de {args.chunk_size} bytes")
+
+    results = {"aiter_lines + json": await measure(legacy_parser, body, args.chunk_size, args.rounds)}
+
+    orjson_module = json_codec.orjson
+    json_codec.orjson = None
+    results["SSEDecoder + json"] = await measure(sse_parser, body, args.chunk_size, args.rounds)
+    json_codec.orjson = orjson_module
+    if orjson_module is not None:
+        results["SSEDecoder + orjson"] = await measure(sse_parser, body, args.chunk_size, args.rounds)
+    else:
+        print("⚠️  orjson no instalado; se omite esa variante")
+
+    baseline = results["aiter_lines + json"]
+    for name, rate in results.items():
+        print(f"  {name:<22} {rate:>12,.0f} tokens/s por núcleo  (x{rate / baseline:.2f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del parser SSE")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""Micro-benchmark del conteo de tokens sobre historiales largos.
+
+Compara la estimación anterior (caracteres / 4) con app/services/tokenizer.py:
+heurística por familia y, si tiktoken está instalado con sus vocabularios en
+caché, BPE en frío y con la caché de conteos caliente (el caso de volver a
+contar el historial de un chat en cada turno).
+Mide tokens contados por segundo y, con BPE, el error de cada estimación.
+
+Uso:
+  python scripts/bench_tokenizer.py [--messages 2000] [--chars 600] [--model gpt-4o]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Callable, List
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.tokenizer import Tokenizer  # noqa: E402
+
+SAMPLES = [
+    "The quick brown fox jumps over the lazy dog while the server streams tokens. ",
+    "¿Podrías explicar cómo funciona la compactación de conversaciones largas? ",
+    "def count(items):\n    return sum(len(item) for item in items if item)\n",
+    "La configuración se guarda cifrada con Fernet y se descifra al vuelo. ",
+    "東京の天気は晴れです。明日は雨が降るかもしれません。",
+    '{"role": "assistant", "content": "Claro, aquí tienes un ejemplo:"} ',
+]
+
+
+def history(messages: int, chars: int, seed: int = 7) -> List[str]:
+    """Mensajes de longitud parecida a `chars` mezclando idiomas y código."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(messages):
+        parts: List[str] = []
+        size = 0
+        target = rng.randint(chars // 2, chars * 3 // 2)
+        while size < target:
+            part = rng.choice(SAMPLES)
+            parts.append(part)
+            size += len(part)
+        texts.append("".join(parts))
+    return texts
+
+
+def best_of(run: Callable[[], List[int]], rounds: int):
+    best = None
+    counts: List[int] = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        counts = run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, counts
+
+
+def report(name: str, elapsed: float, counts: List[int], reference: List[int] = None):
+    total = sum(counts)
+    line = f"  {name:<22} {total:>9} tokens  {total / elapsed / 1e6:>7.2f} M tokens/s"
+    if reference:
+        error = sum(abs(a - b) for a, b in zip(counts, reference)) / max(1, sum(reference))
+        line += f"  error {error * 100:>5.1f}%"
+    print(line)
+
+
+async def main(args: argparse.Namespace):
+    texts = history(args.messages, args.chars)
+    chars = sum(len(t) for t in texts)
+    print(f"📦 {len(texts)} mensajes, {chars / 1e6:.2f} M caracteres, modelo {args.model}")
+
+    tokenizer = Tokenizer()
+    family = tokenizer.family(args.provider, args.model)
+    await tokenizer.startup()
+    bpe = family.encoding in tokenizer.stats()["bpe"]
+
+    reference = None
+    if bpe:
+        def cold() -> List[int]:
+            tokenizer.clear_cache()
+            return tokenizer.count_many(texts, args.provider, args.model)
+
+        elapsed, reference = best_of(cold, args.rounds)
+        report("BPE (sin caché)", elapsed, reference)
+        elapsed, counts = best_of(
+            lambda: tokenizer.count_many(texts, args.provider, args.model), args.rounds)
+        report("BPE (caché caliente)", elapsed, counts, reference)
+    else:
+        print(f"  (sin BPE para la familia {family.name}: instala tiktoken y su vocabulario)")
+
+    elapsed, counts = best_of(lambda: [len(t) // 4 for t in texts], args.rounds)
+    report("caracteres / 4", elapsed, counts, reference)
+
+    # Sin startup(): solo heurística
+    heuristic = Tokenizer()
+    elapsed, counts = best_of(
+        lambda: heuristic.count_many(texts, args.provider, args.model), args.rounds)
+    report(f"heurística {family.name}", elapsed, counts, reference)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del conteo de tokens")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--chars", type=int, default=600)
+    parser.add_argument("--provider", default="openai")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--rounds", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+"""Proveedor de IA falso (API compatible con OpenAI) que inyecta fallos.
+
+Sirve para probar reintentos, colas y streaming sin gastar cuota real.
+
+Uso:
+  python scripts/fake_provider.py [--port 9911]
+  AI_BASE_URLS='{"openai": "http://127.0.0.1:9911/v1"}' uvicorn app.main:app
+
+Inyectar fallos (se aplican a las próximas N peticiones):
+  curl -X POST localhost:9911/ctl -d '{"fail": 2, "status": 429, "retry_after": "1"}'
+  curl -X POST localhost:9911/ctl -d '{"fail": 1, "drop": true}'
+  curl -X POST localhost:9911/ctl -d '{"delay": 0.5}'
+  curl -X POST localhost:9911/ctl -d '{"tokens": 500, "token_delay": 0.05}'
+"""
+import argparse
+import asyncio
+import json
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_STATE = {
+    "fail": 0,            # peticiones que fallarán
+    "status": 503,        # código de los fallos
+    "retry_after": None,  # cabecera Retry-After de los fallos
+    "drop": False,        # cortar la conexión en lugar de responder
+    "delay": 0.0,         # espera antes de responder
+    "tokens": 5,          # deltas por respuesta en streaming
+    "token_delay": 0.01,  # espera entre deltas
+    "calls": 0,
+    "aborted": 0          # streams que el cliente cortó antes del final
+}
+WORDS = ["Hola", " desde", " el", " proveedor", " falso"]
+
+app = FastAPI()
+state = dict(DEFAULT_STATE)
+
+
+@app.post("/ctl")
+async def control(request: Request):
+    """Actualiza los fallos inyectados y reinicia el contador de llamadas."""
+    state.update(DEFAULT_STATE)
+    state.update(await request.json())
+    return state
+
+
+@app.get("/ctl")
+async def get_control():
+    return state
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    state["calls"] += 1
+    body = await request.json()
+
+    if state["fail"] > 0:
+        state["fail"] -= 1
+        if state["drop"]:
+            # Cabeceras enviadas y conexión cortada: error de transporte
+            async def broken():
+                raise ConnectionResetError("fake provider dropped the connection")
+                yield b""
+
+            return StreamingResponse(broken())
+        headers = {"retry-after": str(state["retry_after"])} if state["retry_after"] else {}
+        return JSONResponse(
+            {"error": {"message": "injected failure"}},
+            status_code=state["status"],
+            headers=headers
+        )
+
+    await asyncio.sleep(state["delay"])
+
+    if not body.get("stream"):
+        return {
+            "choices": [{"message": {"role": "assistant", "content": "".join(WORDS)}}],
+            "usage": {"total_tokens": len(WORDS)}
+        }
+
+    async def generate():
+        finished = False
+        try:
+            for i in range(state["tokens"]):
+                chunk = {"choices": [{"delta": {"content": WORDS[i % len(WORDS)]}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(state["token_delay"])
+            yield "data: [DONE]\n\n"
+            finished = True
+        finally:
+            if not finished:
+                state["aborted"] += 1
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Proveedor de IA falso")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9911)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
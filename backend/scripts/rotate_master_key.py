@@ -0,0 +1,152 @@
+"""Script para rotar la MASTER_KEY de todas las filas de ai_configs.
+
+Procedimiento sin downtime:
+  1. Desplegar con MASTER_KEY=<nueva> y MASTER_KEY_PREVIOUS=<anterior>;
+     el servicio cifra con la nueva y descifra con ambas.
+  2. Ejecutar este script (reanudable si se interrumpe).
+  3. Quitar MASTER_KEY_PREVIOUS y volver a desplegar.
+
+Uso:
+  python scripts/rotate_master_key.py [--batch-size 500] [--workers 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, select, update  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.database import Database  # noqa: E402
+from app.db.models import AIConfig  # noqa: E402
+from app.services.encryption import rotate_tokens  # noqa: E402
+
+DEFAULT_STATE_FILE = ".rotation_state.json"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Re-cifra ai_configs.encrypted_key con la MASTER_KEY actual")
+    parser.add_argument("--new-key", default=settings.master_key,
+                        help="Clave destino (por defecto MASTER_KEY)")
+    parser.add_argument("--old-keys", default=settings.master_key_previous,
+                        help="Claves anteriores separadas por coma "
+                             "(por defecto MASTER_KEY_PREVIOUS)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--state-file", default=DEFAULT_STATE_FILE,
+                        help="Fichero de progreso para reanudar")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignora el progreso guardado y empieza de cero")
+    return parser.parse_args()
+
+
+def load_state(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"last_id": None, "rotated": 0, "failed": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def split(items: list, parts: int) -> list:
+    size = max(1, -(-len(items) // parts))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def rotate_all(args: argparse.Namespace):
+    """Recorre ai_configs por keyset (id) y re-cifra cada lote."""
+    old_keys = [k.strip() for k in args.old_keys.split(",") if k.strip()]
+    if not args.new_key or not old_keys:
+        raise SystemExit("❌ Se necesitan --new-key y al menos una --old-keys")
+
+    state = {"last_id": None, "rotated": 0, "failed": 0} if args.restart \
+        else load_state(args.state_file)
+    if state["last_id"]:
+        print(f"↪️  Reanudando desde id > {state['last_id']}")
+
+    # Solo se sobrescribe si el valor no cambió desde la lectura
+    table = AIConfig.__table__
+    write_back = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .where(table.c.encrypted_key == bindparam("b_old"))
+        .values(encrypted_key=bindparam("b_new"))
+    )
+
+    db = Database()
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    processed = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            while True:
+                session = await db.get_session()
+                try:
+                    query = select(AIConfig.id, AIConfig.encrypted_key) \
+                        .order_by(AIConfig.id).limit(args.batch_size)
+                    if state["last_id"]:
+                        query = query.where(
+                            AIConfig.id > uuid.UUID(state["last_id"]))
+                    rows = (await session.execute(query)).all()
+                    if not rows:
+                        break
+
+                    batch_started = time.perf_counter()
+                    tokens = [row.encrypted_key for row in rows]
+                    chunks = await asyncio.gather(*(
+                        loop.run_in_executor(
+                            pool, rotate_tokens, chunk, args.new_key, old_keys)
+                        for chunk in split(tokens, args.workers)
+                    ))
+                    rotated = [token for chunk in chunks for token in chunk]
+
+                    params = [
+                        {"b_id": row.id, "b_old": row.encrypted_key, "b_new": new}
+                        for row, new in zip(rows, rotated) if new is not None
+                    ]
+                    if params:
+                        await session.execute(write_back, params)
+                    await session.commit()
+                finally:
+                    await session.close()
+
+                failed = sum(1 for token in rotated if token is None)
+                processed += len(rows)
+                state["last_id"] = str(rows[-1].id)
+                state["rotated"] += len(params)
+                state["failed"] += failed
+                save_state(args.state_file, state)
+
+                batch_rate = len(rows) / (time.perf_counter() - batch_started)
+                print(f"🔁 {len(rows)} filas ({failed} sin descifrar) "
+                      f"- {batch_rate:.0f} filas/s")
+    finally:
+        await db.close()
+
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed else 0.0
+    print(f"✅ Rotación completa: {state['rotated']} re-cifradas, "
+          f"{state['failed']} fallidas, {rate:.0f} filas/s")
+    if state["failed"]:
+        print("⚠️  Hay filas que ninguna clave pudo descifrar; no se modificaron")
+    if os.path.exists(args.state_file):
+        os.remove(args.state_file)
+
+
+if __name__ == "__main__":
+    asyncio.run(rotate_all(parse_args()))
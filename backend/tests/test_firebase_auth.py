@@ -0,0 +1,170 @@
+"""
+Verificación local de ID tokens (FIREBASE_AUTH_MODE=local) con un par de
+claves RSA generado aquí y los certificados servidos por httpx.MockTransport.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import HTTPException
+from jose import jwt
+
+from app.api.routes import auth
+from app.services.firebase_auth import FirebaseTokenVerifier, InvalidFirebaseToken
+
+PROJECT = "demo-project"
+CERTS_URL = "https://certs.test/securetoken"
+
+
+class SigningKey:
+    """Clave privada para firmar tokens y su certificado X.509 en PEM."""
+
+    def __init__(self, kid: str):
+        self.kid = kid
+        private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_pem = private.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ).decode()
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+        now = datetime.now(timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(private.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=1))
+            .sign(private, hashes.SHA256())
+        )
+        self.cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+
+    def sign(self, **overrides: Any) -> str:
+        now = int(time.time())
+        claims = {
+            "iss": f"https://securetoken.google.com/{PROJECT}",
+            "aud": PROJECT,
+            "sub": "user-1",
+            "email": "user@example.com",
+            "auth_time": now - 10,
+            "iat": now - 10,
+            "exp": now + 3600,
+            **overrides
+        }
+        return jwt.encode(claims, self.private_pem, algorithm="RS256", headers={"kid": self.kid})
+
+
+@pytest.fixture(scope="module")
+def keys() -> Dict[str, SigningKey]:
+    return {kid: SigningKey(kid) for kid in ("a", "b")}
+
+
+class CertsEndpoint:
+    """Endpoint de certificados falso que cuenta las descargas."""
+
+    def __init__(self, served: List[SigningKey]):
+        self.served = served
+        self.fetches = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        assert str(request.url) == CERTS_URL
+        self.fetches += 1
+        return httpx.Response(
+            200,
+            json={key.kid: key.cert_pem for key in self.served},
+            headers={"Cache-Control": "public, max-age=3600"}
+        )
+
+
+def make_verifier(endpoint: CertsEndpoint) -> FirebaseTokenVerifier:
+    return FirebaseTokenVerifier(
+        project_id=PROJECT,
+        certs_url=CERTS_URL,
+        leeway=0,
+        transport=httpx.MockTransport(endpoint.handler)
+    )
+
+
+def verify(verifier: FirebaseTokenVerifier, token: str) -> Dict[str, Any]:
+    return asyncio.run(verifier.verify(token))
+
+
+def test_valid_token(keys):
+    endpoint = CertsEndpoint([keys["a"]])
+    verifier = make_verifier(endpoint)
+
+    claims = verify(verifier, keys["a"].sign())
+    assert claims["sub"] == "user-1"
+    assert claims["email"] == "user@example.com"
+    # Los certificados quedan cacheados por su max-age
+    verify(verifier, keys["a"].sign(sub="user-2"))
+    assert endpoint.fetches == 1
+
+
+@pytest.mark.parametrize("overrides", [
+    {"aud": "other-project"},
+    {"iss": "https://securetoken.google.com/other-project"},
+    {"iss": "https://accounts.google.com"},
+    {"exp": int(time.time()) - 60},
+    {"sub": ""},
+    {"auth_time": int(time.time()) + 3600},
+])
+def test_rejected_claims(keys, overrides):
+    verifier = make_verifier(CertsEndpoint([keys["a"]]))
+    with pytest.raises(InvalidFirebaseToken):
+        verify(verifier, keys["a"].sign(**overrides))
+
+
+def test_signature_from_another_key(keys):
+    # kid "a" firmado con la clave privada de "b"
+    forged = jwt.encode(
+        {"aud": PROJECT, "iss": f"https://securetoken.google.com/{PROJECT}", "sub": "x",
+         "exp": int(time.time()) + 3600},
+        keys["b"].private_pem, algorithm="RS256", headers={"kid": "a"})
+    verifier = make_verifier(CertsEndpoint([keys["a"], keys["b"]]))
+    with pytest.raises(InvalidFirebaseToken):
+        verify(verifier, forged)
+
+
+def test_unknown_kid_triggers_one_refresh(keys):
+    endpoint = CertsEndpoint([keys["a"]])
+    verifier = make_verifier(endpoint)
+    verify(verifier, keys["a"].sign())
+    assert endpoint.fetches == 1
+
+    # Dentro del minuto siguiente a una descarga no se vuelve a pedir
+    with pytest.raises(InvalidFirebaseToken):
+        verify(verifier, keys["b"].sign())
+    assert endpoint.fetches == 1
+
+    # Pasado ese minuto, un kid desconocido (rotación) refresca una vez
+    endpoint.served = [keys["a"], keys["b"]]
+    verifier._last_fetch -= 61
+    assert verify(verifier, keys["b"].sign())["sub"] == "user-1"
+    assert endpoint.fetches == 2
+    verify(verifier, keys["b"].sign())
+    assert endpoint.fetches == 2
+
+
+def test_verify_locally_maps_errors(keys, monkeypatch):
+    monkeypatch.setattr(auth, "firebase_verifier", make_verifier(CertsEndpoint([keys["a"]])))
+
+    user = asyncio.run(auth._verify_locally(keys["a"].sign()))
+    assert user == {
+        "uid": "user-1",
+        "email": "user@example.com",
+        "display_name": None,
+        "avatar_url": None
+    }
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(auth._verify_locally(keys["a"].sign(exp=int(time.time()) - 60)))
+    assert error.value.status_code == 401
@@ -0,0 +1,47 @@
+"""
+Los snapshots de métricas se sirven en /health: deben ser JSON válido
+incluso con observaciones por encima del último bucket.
+"""
+import json
+
+from starlette.responses import JSONResponse
+
+from app.core.metrics import LATENCY_BUCKETS, Histogram
+
+
+def test_quantiles_within_buckets():
+    histogram = Histogram()
+    for value in (0.004, 0.02, 0.02, 0.3, 4.0):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["p50"] == 0.025
+    assert snapshot["p99"] == 5.0
+    assert snapshot["buckets"]["le_inf"] == 5
+
+
+def test_snapshot_with_overflow_is_json():
+    histogram = Histogram()
+    for _ in range(95):
+        histogram.observe(0.2)
+    for _ in range(5):
+        histogram.observe(40.0)
+    assert histogram.quantile(0.99) == float("inf")
+
+    snapshot = histogram.snapshot()
+    assert snapshot["p50"] == 0.25
+    # Sin cota finita: null, no inf
+    assert snapshot["p99"] is None
+    assert snapshot["buckets"][f"le_{LATENCY_BUCKETS[-1]}"] == 95
+    assert snapshot["buckets"]["le_inf"] == 100
+
+    json.dumps(snapshot, allow_nan=False)
+    body = json.loads(JSONResponse({"wait_seconds": snapshot}).body)
+    assert body["wait_seconds"]["p99"] is None
+
+
+def test_all_observations_overflow():
+    histogram = Histogram()
+    histogram.observe(120.0)
+    snapshot = histogram.snapshot()
+    assert snapshot["p50"] is None and snapshot["p99"] is None
+    json.dumps(snapshot, allow_nan=False)
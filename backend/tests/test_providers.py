@@ -0,0 +1,37 @@
+"""
+max_tokens debe llegar al cuerpo de la petición de todos los adaptadores:
+la compactación depende de él para acotar el tamaño del resumen.
+"""
+from typing import Any, Callable, Dict
+
+import pytest
+
+from app.services.providers.registry import default_registry
+
+MESSAGES = [
+    {"role": "system", "content": "Eres útil."},
+    {"role": "user", "content": "Hola"}
+]
+
+# Dónde pone cada proveedor integrado el límite de tokens de salida
+MAX_TOKENS_FIELDS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "openai": lambda payload: payload.get("max_completion_tokens"),
+    "anthropic": lambda payload: payload.get("max_tokens"),
+    "google": lambda payload: payload.get("generationConfig", {}).get("maxOutputTokens"),
+    "mistral": lambda payload: payload.get("max_tokens"),
+    "cohere": lambda payload: payload.get("max_tokens"),
+    "groq": lambda payload: payload.get("max_tokens"),
+    "openrouter": lambda payload: payload.get("max_tokens"),
+}
+
+
+def test_every_builtin_adapter_is_covered():
+    assert set(default_registry()) == set(MAX_TOKENS_FIELDS)
+
+
+@pytest.mark.parametrize("provider", sorted(MAX_TOKENS_FIELDS))
+@pytest.mark.parametrize("stream", [False, True])
+def test_max_tokens_reaches_request_body(provider: str, stream: bool):
+    adapter = default_registry().get(provider)
+    request = adapter.build_request("model", MESSAGES, "key", stream=stream, max_tokens=321)
+    assert MAX_TOKENS_FIELDS[provider](request.payload) == 321
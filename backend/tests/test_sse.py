@@ -0,0 +1,70 @@
+"""
+SSEDecoder frente a los casos de la especificación WHATWG, con el stream
+troceado en todos los puntos posibles.
+"""
+import asyncio
+from typing import List, Tuple
+
+import pytest
+
+from app.services.sse import SSEDecoder, iter_events
+
+Parsed = List[Tuple[str, bytes, str]]
+
+
+def decode(body: bytes, split: int = 0) -> Parsed:
+    """Eventos (tipo, data, id) de body, en dos fragmentos si split > 0."""
+    decoder = SSEDecoder()
+    chunks = [body[:split], body[split:]] if split else [body]
+    events = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    events.extend(decoder.flush())
+    return [(event.event, event.data, event.id) for event in events]
+
+
+CASES = [
+    (b"data: a\n\n", [("message", b"a", "")]),
+    (b"data: a\r\n\r\n", [("message", b"a", "")]),
+    (b"data: a\r\r", [("message", b"a", "")]),
+    (b"data: a\n\r", [("message", b"a", "")]),
+    (b"data: a\r\n\r", [("message", b"a", "")]),
+    (b"\xef\xbb\xbfdata: a\n\n", [("message", b"a", "")]),
+    (b"event: x\ndata: 1\ndata: 2\nid: 7\n\n", [("x", b"1\n2", "7")]),
+    (b": ping\n\ndata:b\n\n", [("message", b"b", "")]),
+    (b"data: a\n\ndata: b\r\rdata: c\r\n\r\n", [
+        ("message", b"a", ""), ("message", b"b", ""), ("message", b"c", "")]),
+    # Sin línea en blanco final el evento se descarta
+    (b"data: a\n", []),
+    (b"data: a\r", []),
+    (b"data: a", []),
+    (b"event: x\n\n", []),
+]
+
+
+@pytest.mark.parametrize("body,expected", CASES)
+def test_decode_at_every_split(body: bytes, expected: Parsed):
+    for split in range(len(body) + 1):
+        assert decode(body, split) == expected, split
+
+
+def test_byte_by_byte():
+    body = b"data: a\r\rdata: b\r\n\r"
+    decoder = SSEDecoder()
+    events = []
+    for i in range(len(body)):
+        events.extend(decoder.feed(body[i:i + 1]))
+    events.extend(decoder.flush())
+    assert [event.data for event in events] == [b"a", b"b"]
+
+
+def test_iter_events_dispatches_trailing_cr():
+    async def chunks():
+        yield b"data: a\n\n"
+        yield b"data: b\r"
+        yield b"\r"
+
+    async def collect():
+        return [event.data async for event in iter_events(chunks())]
+
+    assert asyncio.run(collect()) == [b"a", b"b"]
@@ -0,0 +1,7 @@
+-- =====================================================
+-- SONORAKIT PVM - Proveedor que generó cada mensaje
+-- =====================================================
+
+-- Con fallback el proveedor de la respuesta puede no ser el del chat
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS provider_name TEXT;
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS model_id TEXT;
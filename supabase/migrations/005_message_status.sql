@@ -0,0 +1,6 @@
+-- =====================================================
+-- SONORAKIT PVM - Estado de los mensajes en streaming
+-- =====================================================
+
+-- 'truncated': el cliente se desconectó y se guardó la respuesta parcial
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'complete';
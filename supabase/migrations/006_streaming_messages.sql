@@ -0,0 +1,8 @@
+-- =====================================================
+-- SONORAKIT PVM - Respuestas en streaming persistidas por tramos
+-- =====================================================
+
+-- El mensaje del asistente se crea con status 'streaming' y se completa
+-- con UPDATEs; al arrancar se cierran los que quedaron a medias
+CREATE INDEX IF NOT EXISTS idx_messages_streaming
+    ON messages(created_at) WHERE status = 'streaming';
@@ -0,0 +1,10 @@
+-- =====================================================
+-- SONORAKIT PVM - Contexto armado en el servidor
+-- =====================================================
+
+-- Los últimos N mensajes de un chat se leen en orden inverso por este
+-- índice; cubre también las búsquedas solo por chat_id
+CREATE INDEX IF NOT EXISTS idx_messages_chat_created
+    ON messages(chat_id, created_at);
+
+DROP INDEX IF EXISTS idx_messages_chat_id;
@@ -0,0 +1,36 @@
+-- =====================================================
+-- SONORAKIT PVM - Compactación de chats largos
+-- =====================================================
+
+-- Resúmenes de los mensajes antiguos de un chat; el contexto usa el más
+-- reciente (mayor covered_until) en lugar de esos mensajes
+CREATE TABLE IF NOT EXISTS chat_checkpoints (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    chat_id UUID NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
+
+    summary TEXT NOT NULL,
+    covered_until TIMESTAMPTZ NOT NULL,
+    messages_covered INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER DEFAULT 0,
+
+    -- Modelo que generó el resumen
+    provider_name TEXT,
+    model_id TEXT,
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+
+    -- Idempotencia: un solo resumen por tramo
+    CONSTRAINT uq_chat_checkpoints_chat_covered UNIQUE (chat_id, covered_until)
+);
+
+ALTER TABLE chat_checkpoints ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view checkpoints of own chats"
+    ON chat_checkpoints FOR SELECT
+    USING (
+        EXISTS (
+            SELECT 1 FROM chats
+            WHERE chats.id = chat_checkpoints.chat_id
+            AND chats.user_id = auth.uid()
+        )
+    );
@@ -0,0 +1,16 @@
+-- =====================================================
+-- SONORAKIT PVM - Paginación por keyset
+-- =====================================================
+
+-- GET /chat/history: chats del usuario por (updated_at, id) descendente.
+-- En este esquema el dueño del chat es user_id (profile_id en el modelo de
+-- SQLAlchemy sobre Neon); el nombre del índice es el mismo en ambos
+CREATE INDEX IF NOT EXISTS idx_chats_profile_updated_id
+    ON chats(user_id, updated_at DESC, id DESC);
+
+-- GET /chat/{chat_id}/messages: páginas por (created_at, id); sustituye al
+-- índice (chat_id, created_at) de 007, que queda cubierto por este
+CREATE INDEX IF NOT EXISTS idx_messages_chat_created_id
+    ON messages(chat_id, created_at, id);
+
+DROP INDEX IF EXISTS idx_messages_chat_created;